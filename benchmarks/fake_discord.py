@@ -0,0 +1,227 @@
+import asyncio
+import itertools
+import time
+from collections import Counter
+from typing import Optional, Dict, List, Any
+
+import discord
+
+_ids = itertools.count(10 ** 17)
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+class FakeREST:
+    """Discord REST APIの呼び出しを数え、指定した遅延を加える"""
+
+    def __init__(self, latency: float = 0.03):
+        self.latency = latency
+        self.calls: Counter = Counter()  # ルート: 呼び出し回数
+        self.late_acks = 0  # 受信から3秒を過ぎてから応答したインタラクションの数
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    async def call(self, route: str):
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, bot: bool = False):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.bot = bot
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, channel: 'FakeTextChannel', embeds: List[discord.Embed]):
+        self.id = next_id()
+        self.channel = channel
+        self.embeds = embeds
+
+
+class FakeTextChannel:
+    def __init__(self, rest: FakeREST, guild: 'FakeGuild'):
+        self.id = next_id()
+        self.rest = rest
+        self.guild = guild
+        self.mention = f"<#{self.id}>"
+        self.messages: List[FakeMessage] = []
+
+    async def send(self, content: Optional[str] = None, *, embed: Optional[discord.Embed] = None, file=None, view=None):
+        await self.rest.call('POST /channels/{channel_id}/messages')
+        message = FakeMessage(self, [embed] if embed else [])
+        self.messages.append(message)
+        return message
+
+
+class FakeCategory:
+    def __init__(self, guild: 'FakeGuild'):
+        self.id = next_id()
+        self.guild = guild
+
+    @property
+    def voice_channels(self) -> List['FakeVoiceChannel']:
+        return [
+            channel for channel in self.guild.bot.channels.values()
+            if isinstance(channel, FakeVoiceChannel) and channel.category_id == self.id
+        ]
+
+
+class FakeVoiceChannel:
+    def __init__(self, rest: FakeREST, guild: 'FakeGuild', name: str, user_limit: Optional[int], category_id: Optional[int] = None, overwrites=None):
+        self.id = next_id()
+        self.rest = rest
+        self.guild = guild
+        self.name = name
+        self.user_limit = user_limit
+        self.category_id = category_id
+        self.overwrites = dict(overwrites or {})
+        self.mention = f"<#{self.id}>"
+        self.members: List[FakeUser] = []
+
+    def overwrites_for(self, target) -> discord.PermissionOverwrite:
+        return self.overwrites.get(target, discord.PermissionOverwrite())
+
+    async def edit(self, *, name: Optional[str] = None, user_limit: Optional[int] = None, overwrites=None, sync_permissions: bool = False):
+        await self.rest.call('PATCH /channels/{channel_id}')
+        if name is not None:
+            self.name = name
+        if user_limit is not None:
+            self.user_limit = user_limit
+        if overwrites is not None:
+            self.overwrites = dict(overwrites)
+        if sync_permissions:
+            self.overwrites = {}
+
+    async def delete(self):
+        await self.rest.call('DELETE /channels/{channel_id}')
+        self.guild.bot.channels.pop(self.id, None)
+
+
+class FakeGuild:
+    def __init__(self, bot: 'FakeBot'):
+        self.id = next_id()
+        self.name = f"guild{self.id}"
+        self.bot = bot
+        self.rest = bot.rest
+        self.default_role = object()  # @everyone（権限の上書きのキーとしてだけ使う）
+        self.me = bot.user
+
+    def add_text_channel(self) -> FakeTextChannel:
+        channel = FakeTextChannel(self.rest, self)
+        self.bot.channels[channel.id] = channel
+        return channel
+
+    def add_category(self) -> FakeCategory:
+        category = FakeCategory(self)
+        self.bot.channels[category.id] = category
+        return category
+
+    async def create_voice_channel(self, name: str, *, category=None, user_limit: Optional[int] = None, overwrites=None, **kwargs):
+        await self.rest.call('POST /guilds/{guild_id}/channels')
+        channel = FakeVoiceChannel(self.rest, self, name, user_limit, category.id if category else None, overwrites)
+        self.bot.channels[channel.id] = channel
+        return channel
+
+
+# Discordはインタラクションの受信から3秒以内に応答がないと失敗扱いにする
+ACK_DEADLINE = 3.0
+
+
+class FakeResponse:
+    """interaction.response の代わり（送信内容を記録する）"""
+
+    def __init__(self, rest: FakeREST):
+        self.rest = rest
+        self.created = time.monotonic()
+        self._done = False
+        self.content: Optional[str] = None
+        self.view: Optional[discord.ui.View] = None
+        self.modal: Optional[discord.ui.Modal] = None
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self):
+        if self._done:
+            raise discord.InteractionResponded(None)
+        if time.monotonic() - self.created > ACK_DEADLINE:
+            self.rest.late_acks += 1
+        await self.rest.call('POST /interactions/{interaction_id}/callback')
+        self._done = True
+
+    async def defer(self, **kwargs):
+        await self._respond()
+
+    async def send_message(self, content: Optional[str] = None, *, view=None, embed=None, **kwargs):
+        await self._respond()
+        self.content = content
+        self.view = view
+
+    async def send_modal(self, modal: discord.ui.Modal):
+        await self._respond()
+        self.modal = modal
+
+
+class FakeFollowup:
+    def __init__(self, rest: FakeREST):
+        self.rest = rest
+        self.contents: List[Optional[str]] = []
+        self.views: List[discord.ui.View] = []
+
+    async def send(self, content: Optional[str] = None, *, view=None, embed=None, **kwargs):
+        await self.rest.call('POST /webhooks/{application_id}/{token}')
+        self.contents.append(content)
+        if view is not None:
+            self.views.append(view)
+
+
+class FakeInteraction:
+    def __init__(self, bot: 'FakeBot', user: FakeUser, guild: FakeGuild, type=discord.InteractionType.component, data: Optional[Dict[str, Any]] = None):
+        self.id = next_id()
+        self.type = type
+        self.data = data or {}
+        self.client = bot
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id
+        self.response = FakeResponse(bot.rest)
+        self.followup = FakeFollowup(bot.rest)
+
+
+class FakeBot:
+    """Cogが使う範囲だけを実装したBotの代わり"""
+
+    def __init__(self, rest: FakeREST):
+        self.rest = rest
+        self.loop = asyncio.get_running_loop()
+        self.channels: Dict[int, Any] = {}
+        self.cogs: Dict[str, Any] = {}
+        self.user = FakeUser(next_id(), bot=True)
+        self.shard_count = None
+        self.shard_id = None
+        self.latency = 0.0
+        self.guilds: List[FakeGuild] = []
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    def get_cog(self, name: str):
+        return self.cogs.get(name)
+
+    def add_view(self, view, **kwargs):
+        pass
+
+    async def wait_until_ready(self):
+        return
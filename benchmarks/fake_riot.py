@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+from utils.helper import RANK_TIERS, DIVISIONS
+from utils.rate_limiter import parse_rate_limits
+
+# メソッドごとの制限の既定値（既定のベンチマークの負荷では超えない値。--riot-method-rate-limitで変更する）
+DEFAULT_METHOD_RATE_LIMITS = {
+    'account-v1.by-riot-id': '1000:60',
+    'account-v1.by-puuid': '1000:60',
+    'summoner-v4.by-puuid': '1600:60',
+    'league-v4.entries': '1000:60',
+    'tft-league-v1.entries': '1000:60'
+}
+
+
+class FakeRiotServer:
+    """Riot APIの代わりに使うローカルサーバー
+
+    アカウント・サモナー・リーグの各エンドポイントに遅延を付けて応答し、
+    X-App-Rate-Limit系とX-Method-Rate-Limit系のヘッダーを返す。
+    アプリ全体の制限を超えた場合は X-Rate-Limit-Type: application、メソッドの制限を超えた場合は method の429を返す。
+    error_rateの確率で、制限とは無関係な service の429を返す（Riot APIと同じくRetry-Afterを付けない）。
+    制限はRiot APIと同じく、ルーティング（asia / jp1）ごと・メソッドごとに最初のリクエストから始まる固定の期間で数える。
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.02,
+        rate_limit: str = '500:10,30000:600',
+        method_rate_limits: Optional[Dict[str, str]] = None,
+        error_rate: float = 0.0,
+        retry_after: float = 1.0,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.limits = parse_rate_limits(rate_limit)
+        self.method_rate_limits = dict(DEFAULT_METHOD_RATE_LIMITS, **(method_rate_limits or {}))
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.calls: Counter = Counter()  # エンドポイント: 呼び出し回数
+        self.throttled = 0
+        self.throttled_by_type: Counter = Counter()  # X-Rate-Limit-Type: 429を返した回数
+        # ルーティング、または (ルーティング, メソッド): 制限ごとの [期間の開始時刻, 使用回数]
+        self._windows: Dict[object, List[List[float]]] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ''
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_get('/riot/account/v1/accounts/by-riot-id/{name}/{tag}', self.account)
+        app.router.add_get('/riot/account/v1/accounts/by-puuid/{puuid}', self.account_by_puuid)
+        app.router.add_get('/lol/summoner/v4/summoners/by-puuid/{puuid}', self.summoner)
+        app.router.add_get('/lol/league/v4/entries/by-summoner/{summoner_id}', self.league)
+        app.router.add_get('/tft/league/v1/entries/by-summoner/{summoner_id}', self.tft_league)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def _counts(self, key, limits: List[Tuple[int, int]], now: float) -> List[List[float]]:
+        """制限ごとの [期間の開始時刻, 使用回数]（期間が過ぎていればリセット）"""
+        windows = self._windows.setdefault(key, [[now, 0] for _ in limits])
+        for (_, window), state in zip(limits, windows):
+            if now - state[0] >= window:
+                state[0], state[1] = now, 0
+        return windows
+
+    @staticmethod
+    def _count_header(windows: List[List[float]], limits: List[Tuple[int, int]]) -> str:
+        return ','.join(f"{used}:{window}" for (_, used), (_, window) in zip(windows, limits))
+
+    async def _respond(self, routing: str, endpoint: str, method: str, payload) -> web.Response:
+        self.calls[endpoint] += 1
+        await asyncio.sleep(max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter)))
+        now = time.monotonic()
+        method_limit = self.method_rate_limits.get(method, '')
+        method_limits = parse_rate_limits(method_limit)
+        app_windows = self._counts(routing, self.limits, now)
+        method_windows = self._counts((routing, method), method_limits, now)
+        if any(used >= limit for (_, used), (limit, _) in zip(app_windows, self.limits)):
+            limit_type = 'application'
+        elif any(used >= limit for (_, used), (limit, _) in zip(method_windows, method_limits)):
+            limit_type = 'method'
+        elif self.error_rate and self.random.random() < self.error_rate:
+            limit_type = 'service'
+        else:
+            limit_type = None
+        headers = {}
+        if limit_type != 'service':
+            # 制限の超過やリクエスト成功時は、現在の使用回数を返す
+            headers = {
+                'X-App-Rate-Limit': self.rate_limit,
+                'X-App-Rate-Limit-Count': self._count_header(app_windows, self.limits),
+                'X-Method-Rate-Limit': method_limit,
+                'X-Method-Rate-Limit-Count': self._count_header(method_windows, method_limits)
+            }
+        if limit_type is not None:
+            self.throttled += 1
+            self.throttled_by_type[limit_type] += 1
+            headers['X-Rate-Limit-Type'] = limit_type
+            if limit_type != 'service':
+                headers['Retry-After'] = str(self.retry_after)
+            return web.json_response(
+                {'status': {'message': 'Rate limit exceeded', 'status_code': 429}},
+                status=429,
+                headers=headers
+            )
+        for state in app_windows + method_windows:
+            state[1] += 1
+        headers['X-App-Rate-Limit-Count'] = self._count_header(app_windows, self.limits)
+        headers['X-Method-Rate-Limit-Count'] = self._count_header(method_windows, method_limits)
+        return web.json_response(payload, headers=headers)
+
+    async def account(self, request: web.Request) -> web.Response:
+        name, tag = request.match_info['name'], request.match_info['tag']
+        return await self._respond(
+            'asia', 'account', 'account-v1.by-riot-id',
+            {'puuid': f"puuid-{name.lower()}-{tag.lower()}", 'gameName': name, 'tagLine': tag}
+        )
+
+    async def account_by_puuid(self, request: web.Request) -> web.Response:
+        # puuid-<name>-<tag> 形式のPUUIDから名前を戻す
+        _, name, tag = request.match_info['puuid'].rsplit('-', 2)
+        return await self._respond(
+            'asia', 'account', 'account-v1.by-puuid',
+            {'puuid': request.match_info['puuid'], 'gameName': name, 'tagLine': tag}
+        )
+
+    async def summoner(self, request: web.Request) -> web.Response:
+        puuid = request.match_info['puuid']
+        return await self._respond('jp1', 'summoner', 'summoner-v4.by-puuid', {'id': f"summoner-{puuid}", 'puuid': puuid, 'summonerLevel': 100})
+
+    def _entry(self, summoner_id: str, queue_type: str):
+        rng = random.Random(summoner_id)
+        return {
+            'queueType': queue_type,
+            'tier': rng.choice(RANK_TIERS),
+            'rank': rng.choice(DIVISIONS),
+            'leaguePoints': rng.randint(0, 99)
+        }
+
+    async def league(self, request: web.Request) -> web.Response:
+        return await self._respond('jp1', 'league', 'league-v4.entries', [self._entry(request.match_info['summoner_id'], 'RANKED_SOLO_5x5')])
+
+    async def tft_league(self, request: web.Request) -> web.Response:
+        return await self._respond('jp1', 'tft-league', 'tft-league-v1.entries', [self._entry(request.match_info['summoner_id'], 'RANKED_TFT')])
@@ -0,0 +1,253 @@
+"""募集作成フローのベンチマーク
+
+Discordと Riot API の代わりにプロセス内の偽物を使い、
+サモナー名入力 → 人数選択 → ロール選択 → タイトル入力 → create_recruitment を並行して実行する。
+
+    python -m benchmarks.recruitment_bench --recruitments 500 --concurrency 50
+    python -m benchmarks.recruitment_bench --max-p99-ms 800 --max-riot-calls 3  # 超えたら終了コード1
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import discord
+
+SIZE_LABELS = {
+    'ranked': ["Duo", "Flex", "Unlimited"],
+    'normal': ["Duo", "Trio", "Squad", "Flex", "Unlimited"],
+    'tft': ["Duo", "Unlimited"]
+}
+ROLES = ["top", "jungle", "mid", "bot", "support", "fill"]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="募集作成フローのオフラインベンチマーク")
+    parser.add_argument('--recruitments', type=int, default=200, help="作成する募集の数")
+    parser.add_argument('--concurrency', type=int, default=20, help="同時に進行するフローの数")
+    parser.add_argument('--mode', choices=['ranked', 'normal', 'tft', 'mixed'], default='mixed')
+    parser.add_argument('--riot-accounts', type=int, default=None, help="使うRiotアカウントの数（少なくするとキャッシュが効く。既定は募集数と同じ）")
+    parser.add_argument('--riot-latency', type=float, default=0.05, help="Riot APIの応答遅延（秒）")
+    parser.add_argument('--riot-rate-limit', default='500:10,30000:600', help="Riot APIのアプリ制限")
+    parser.add_argument(
+        '--riot-method-rate-limit', action='append', default=[], metavar='METHOD=LIMITS',
+        help="Riot APIのメソッドごとの制限（例: league-v4.entries=100:60。複数指定可）"
+    )
+    parser.add_argument('--riot-error-rate', type=float, default=0.0, help="制限とは無関係に429を返す割合")
+    parser.add_argument('--discord-latency', type=float, default=0.03, help="Discord REST APIの応答遅延（秒）")
+    parser.add_argument('--vc-pool-max', type=int, default=5, help="待機させる募集用VCの上限（0で無効）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="結果をJSONで出力")
+    parser.add_argument('--log-level', default='ERROR', help="Botのログの出力レベル")
+    # 回帰チェック用の上限・下限
+    parser.add_argument('--max-p99-ms', type=float, default=None)
+    parser.add_argument('--min-throughput', type=float, default=None, help="1秒あたりの募集数の下限")
+    parser.add_argument('--max-riot-calls', type=float, default=None, help="募集1件あたりのRiot API呼び出し数の上限")
+    parser.add_argument('--max-errors', type=int, default=0)
+    return parser.parse_args(argv)
+
+
+def configure_environment(args: argparse.Namespace, workdir: str):
+    """Botのモジュールを読み込む前に、ベンチマーク用の設定にする"""
+    os.environ['RIOT_API_KEY'] = 'benchmark'
+    os.environ['RIOT_APP_RATE_LIMIT'] = args.riot_rate_limit
+    os.environ['RECRUITMENT_DB'] = os.path.join(workdir, 'recruitment.sqlite3')
+    os.environ['ASSET_CACHE_DIR'] = os.path.join(workdir, 'assets')
+    os.environ['VC_POOL_MAX'] = str(args.vc_pool_max)
+    os.environ.pop('RIOT_CACHE_DB', None)
+    os.environ.pop('ASSET_BASE_URL', None)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def modal_submit(bot, user, guild, modal, value: str):
+    """モーダルの送信を表すInteraction"""
+    from benchmarks.fake_discord import FakeInteraction
+    data = {'custom_id': modal.custom_id, 'components': [{'components': [{'value': value}]}]}
+    return FakeInteraction(bot, user, guild, discord.InteractionType.modal_submit, data)
+
+
+async def run_flow(bot, cog, guild, user, game_mode: str, riot_id: str, size_label: str, role: str) -> bool:
+    """1人分の募集作成フローを実行し、募集が作成できたかを返す"""
+    from benchmarks.fake_discord import FakeInteraction
+    from cogs.recruitment import SummonerModal
+    from utils.flow import FlowState
+
+    interaction = modal_submit(bot, user, guild, SummonerModal(FlowState(game_mode)), riot_id)
+    await cog.on_interaction(interaction)
+    if not interaction.followup.views:
+        return False
+    team_size_view = interaction.followup.views[-1]
+    button = next(item for item in team_size_view.children if item.label == size_label)
+
+    interaction = FakeInteraction(bot, user, guild, data={'custom_id': button.custom_id})
+    await cog.on_interaction(interaction)
+    if game_mode == 'tft':
+        title_modal = interaction.response.modal
+    else:
+        select = interaction.response.view.children[0]
+        interaction = FakeInteraction(bot, user, guild, data={'custom_id': select.custom_id, 'values': [role]})
+        await cog.on_interaction(interaction)
+        title_modal = interaction.response.modal
+
+    interaction = modal_submit(bot, user, guild, title_modal, f"ベンチマーク {user.id}")
+    await cog.on_interaction(interaction)
+    return "募集を作成しました！" in interaction.followup.contents
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    from benchmarks.fake_discord import FakeBot, FakeGuild, FakeREST, FakeUser, next_id
+    from benchmarks.fake_riot import FakeRiotServer
+    from cogs.recruitment import RecruitmentCog, STAGE_SECONDS
+    from cogs.stats import StatsCog
+    from utils import riot_api
+
+    riot = FakeRiotServer(
+        latency=args.riot_latency,
+        rate_limit=args.riot_rate_limit,
+        method_rate_limits=dict(value.split('=', 1) for value in args.riot_method_rate_limit),
+        error_rate=args.riot_error_rate,
+        seed=args.seed
+    )
+    url = await riot.start()
+    for region in list(riot_api._BASE_URLS):
+        riot_api._BASE_URLS[region] = url
+
+    rest = FakeREST(args.discord_latency)
+    bot = FakeBot(rest)
+    guild = FakeGuild(bot)
+    bot.guilds.append(guild)
+    cog = RecruitmentCog(bot)
+    bot.cogs['RecruitmentCog'] = cog
+    stats_cog = StatsCog(bot)
+    bot.cogs['StatsCog'] = stats_cog
+    cog.guild_configs.set(
+        guild.id,
+        ranked_channel_id=guild.add_text_channel().id,
+        normal_channel_id=guild.add_text_channel().id,
+        tft_channel_id=guild.add_text_channel().id,
+        vc_category_id=guild.add_category().id
+    )
+
+    rng = random.Random(args.seed)
+    accounts = args.riot_accounts or args.recruitments
+    jobs = []
+    for i in range(args.recruitments):
+        game_mode = rng.choice(['ranked', 'normal', 'tft']) if args.mode == 'mixed' else args.mode
+        jobs.append((
+            FakeUser(next_id()),
+            game_mode,
+            f"Player{i % accounts}#JP1",
+            rng.choice(SIZE_LABELS[game_mode]),
+            rng.choice(ROLES)
+        ))
+
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def worker(job):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                ok = await run_flow(bot, cog, guild, job[0], job[1], job[2], job[3], job[4])
+            except Exception as e:
+                print(f"フローの実行中にエラー: {e!r}", file=sys.stderr)
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    riot_api_before = riot.total_calls
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(job) for job in jobs))
+    elapsed = time.perf_counter() - started
+
+    for reaper in cog.reapers.values():
+        reaper.stop()
+    cog.vc_pool.stop()
+    await cog.writes.flush()
+    await cog.store.close()
+    await stats_cog.analytics.close()
+    cog.guild_configs.close()
+    await riot_api.close_sessions()
+    await riot.stop()
+
+    created = len(latencies)
+    stages = {
+        stage: round(STAGE_SECONDS.total(stage=stage) / STAGE_SECONDS.count(stage=stage) * 1000, 1)
+        for stage in ('defer', 'vc_create', 'rank_lookup', 'message_send', 'total')
+        if STAGE_SECONDS.count(stage=stage)
+    }
+    return {
+        'recruitments': args.recruitments,
+        'concurrency': args.concurrency,
+        'created': created,
+        'errors': errors,
+        'late_acks': rest.late_acks,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_per_s': round(created / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 1) if latencies else 0.0,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'riot_calls_per_recruitment': round((riot.total_calls - riot_api_before) / max(created, 1), 2),
+        'riot_calls': dict(riot.calls),
+        'riot_429': riot.throttled,
+        'riot_429_by_type': dict(riot.throttled_by_type),
+        'discord_calls_per_recruitment': round(rest.total_calls / max(created, 1), 2),
+        'vc_pool': cog.vc_pool.stats(),
+        'discord_writes': cog.writes.stats(),
+        'create_recruitment_stage_mean_ms': stages
+    }
+
+
+def check_gates(args: argparse.Namespace, result: Dict[str, object]) -> List[str]:
+    """回帰チェックの条件を満たさなかった項目"""
+    failures = []
+    if args.max_p99_ms is not None and result['p99_ms'] > args.max_p99_ms:
+        failures.append(f"p99 {result['p99_ms']}ms > {args.max_p99_ms}ms")
+    if args.min_throughput is not None and result['throughput_per_s'] < args.min_throughput:
+        failures.append(f"スループット {result['throughput_per_s']}/s < {args.min_throughput}/s")
+    if args.max_riot_calls is not None and result['riot_calls_per_recruitment'] > args.max_riot_calls:
+        failures.append(f"Riot API呼び出し {result['riot_calls_per_recruitment']}回/件 > {args.max_riot_calls}回/件")
+    if result['late_acks']:
+        failures.append(f"3秒以内に応答できなかったインタラクション {result['late_acks']}件")
+    if result['errors'] > args.max_errors:
+        failures.append(f"エラー {result['errors']}件 > {args.max_errors}件")
+    return failures
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(args, workdir)
+        from utils.log import setup_logging
+        setup_logging(args.log_level)
+        result = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:32} {value}")
+    failures = check_gates(args, result)
+    for failure in failures:
+        print(f"基準を満たしていません: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
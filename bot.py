@@ -1,17 +1,63 @@
+import hashlib
+import json
+import logging
+import math
 import os
+import resource
+import time
 import discord
+from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
+from utils import riot_api, metrics
+from utils.log import setup_logging
 
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
+logger = logging.getLogger('bot')
+STARTED_AT = time.perf_counter()
+# 最後に同期したコマンド定義のハッシュの保存先
+COMMAND_HASH_PATH = os.getenv('COMMAND_HASH_PATH', 'data/command_tree.sha256')
+# メトリクスの公開先（METRICS_PORTを設定した場合のみ /metrics を公開）
+METRICS_PORT = os.getenv('METRICS_PORT')
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+
+# 軽量モード（デフォルト有効）: メンバーIntentとチャンク取得を無効にし、
+# メンバーキャッシュをVCにいるメンバーだけに限定する。BOT_LEAN_MODE=0で従来の設定に戻す
+LEAN_MODE = os.getenv('BOT_LEAN_MODE', '1') != '0'
 
 intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
 intents.voice_states = True
+if LEAN_MODE:
+    intents.members = False
+    member_cache_flags = discord.MemberCacheFlags.none()
+    member_cache_flags.voice = True
+else:
+    intents.members = True
+    member_cache_flags = discord.MemberCacheFlags.from_intents(intents)
+
+# コマンドはすべてスラッシュコマンドのため、message_contentは不要
+bot_options = dict(
+    command_prefix=commands.when_mentioned,
+    intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=not LEAN_MODE,
+    status=discord.Status.do_not_disturb  # 起動時のステータス設定（赤色のみ）
+)
+
+# シャード設定（SHARD_COUNTを指定するとAutoShardedBotで起動）
+# 複数プロセスで分ける場合は各プロセスにSHARD_IDS（例: "0,1"）を指定する
+SHARD_COUNT = os.getenv('SHARD_COUNT')
+SHARD_IDS = os.getenv('SHARD_IDS')
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        shard_count=int(SHARD_COUNT),
+        shard_ids=[int(i) for i in SHARD_IDS.split(',')] if SHARD_IDS else None,
+        **bot_options
+    )
+else:
+    bot = commands.Bot(**bot_options)
 
 ROLE_NAMES = {
     "top": "TOP",
@@ -27,65 +73,138 @@ GAME_TYPES = {
     "normal": "ノーマル"
 }
 
+loop_lag_monitor = metrics.LoopLagMonitor()
+
+def gateway_latencies():
+    """シャードごとのゲートウェイ遅延（未接続のシャードは除く）"""
+    latencies = bot.latencies if isinstance(bot, commands.AutoShardedBot) else [(bot.shard_id or 0, bot.latency)]
+    return {(str(shard_id),): latency for shard_id, latency in latencies if math.isfinite(latency)}
+
+metrics.gauge('discord_gateway_latency_seconds', 'ゲートウェイのハートビート遅延', ['shard']).set_function(gateway_latencies)
+metrics.gauge('discord_guilds', '参加しているサーバー数').set_function(lambda: len(bot.guilds))
+
+def command_tree_hash() -> str:
+    """グローバルコマンド定義のハッシュ"""
+    commands_data = sorted(
+        (command.to_dict() for command in bot.tree.get_commands()),
+        key=lambda data: (data.get('type', 1), data['name'])
+    )
+    return hashlib.sha256(json.dumps(commands_data, sort_keys=True).encode()).hexdigest()
+
+def save_command_tree_hash(digest: str):
+    directory = os.path.dirname(COMMAND_HASH_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(COMMAND_HASH_PATH, 'w') as f:
+        f.write(digest)
+
+async def sync_commands_if_changed():
+    """コマンド定義が前回の同期から変わっている場合のみグローバル同期する"""
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_PATH) as f:
+            if f.read().strip() == digest:
+                logger.info("コマンドに変更がないため同期をスキップしました")
+                return
+    except FileNotFoundError:
+        pass
+    logger.info("コマンドを同期中...")
+    await bot.tree.sync()
+    save_command_tree_hash(digest)
+    logger.info("コマンドを同期しました")
+
 @bot.event
-async def on_ready():
-    print(f'{bot.user} has connected to Discord!')
-    print(f"Bot ID: {bot.user.id}")
-    print(f"参加しているサーバー:")
-    for guild in bot.guilds:
-        print(f"- {guild.name} (ID: {guild.id})")
-    
+async def setup_hook():
+    """ログイン後、ゲートウェイ接続前に1回だけ実行される起動処理"""
+    loop_lag_monitor.start()
+    if METRICS_PORT:
+        await metrics.start_http_server(int(METRICS_PORT), METRICS_HOST)
+        logger.info("メトリクスを公開しました", extra={'url': f"http://{METRICS_HOST}:{METRICS_PORT}/metrics"})
     try:
-        # 起動時のステータス設定（赤色のみ）
-        await bot.change_presence(status=discord.Status.do_not_disturb)
-        print("ステータスを設定しました")
-        
+        # 設定の確認（不足していれば拡張機能を読み込まない）
+        riot_api.validate_config()
+
         # RecruitmentCogを読み込み
-        print("RecruitmentCogを読み込み中...")
         await bot.load_extension('cogs.recruitment')
-        print("Recruitment cog loaded successfully!")
-        
-        # Cogが正しく読み込まれたか確認
-        if 'RecruitmentCog' in [cog.__class__.__name__ for cog in bot.cogs.values()]:
-            print("RecruitmentCogが正常に読み込まれました")
-        else:
-            print("警告: RecruitmentCogが読み込まれていません")
-        
-        # コマンドを同期
-        print("コマンドを同期中...")
-        await bot.tree.sync()
-        print("Commands synced successfully!")
-        
-    except Exception as e:
-        print(f"Error during startup: {e}")
-        import traceback
-        print(traceback.format_exc())
+        logger.info("RecruitmentCogを読み込みました")
+        await bot.load_extension('cogs.shards')
+        await bot.load_extension('cogs.accounts')
+        await bot.load_extension('cogs.stats')
+
+        # コマンドを同期（変更があった場合のみ）
+        await sync_commands_if_changed()
+
+    except Exception:
+        logger.exception("起動処理中にエラーが発生しました")
         # エラーが発生した場合でもBotは継続して動作
-        if not any(cog.lower() == 'recruitment' for cog in bot.cogs):
-            print("Warning: RecruitmentCog failed to load. Some features may be unavailable.")
+        if bot.get_cog('RecruitmentCog') is None:
+            logger.warning("RecruitmentCogを読み込めなかったため、一部の機能が使えません")
+
+@bot.event
+async def on_ready():
+    """再接続のたびに呼ばれるため、ログ出力のみ行う"""
+    # 設定ごとの比較用（ru_maxrssはLinuxではKB単位）
+    logger.info("Discordに接続しました", extra={
+        'user': str(bot.user),
+        'bot_id': bot.user.id,
+        'guilds': len(bot.guilds),
+        'startup_seconds': round(time.perf_counter() - STARTED_AT, 1),
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'lean_mode': LEAN_MODE,
+        'shards': f"{bot.shard_ids if isinstance(bot, commands.AutoShardedBot) else bot.shard_id}/{bot.shard_count}" if bot.shard_count else None
+    })
+
+async def is_owner(interaction: discord.Interaction) -> bool:
+    return await interaction.client.is_owner(interaction.user)
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    """チェックに通らなかった場合（オーナー以外の実行など）は、実行した本人にだけ知らせる"""
+    if isinstance(error, app_commands.CheckFailure):
+        message = "このコマンドを実行する権限がありません。"
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+        return
+    logger.error(
+        "コマンドの実行中にエラーが発生しました",
+        exc_info=error,
+        extra={'command': interaction.command.name if interaction.command else None}
+    )
 
 # 開発用: コマンドを特定のギルドにのみ同期
-@bot.command()
-@commands.is_owner()
-async def sync_guild(ctx):
-    print(f"ギルド {ctx.guild.name} のコマンドを同期中...")
+# 管理者以外にはコマンド一覧にも表示しない（実行できるのはその中のオーナーのみ）
+@bot.tree.command(name="sync_guild", description="このサーバーにコマンドを同期します（オーナーのみ）")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.check(is_owner)
+async def sync_guild(interaction: discord.Interaction):
+    logger.info("ギルドのコマンドを同期中...", extra={'guild_id': interaction.guild.id})
+    await interaction.response.defer(ephemeral=True)
     try:
-        bot.tree.copy_global_to(guild=ctx.guild)
-        synced = await bot.tree.sync(guild=ctx.guild)
-        await ctx.send(f"{len(synced)}個のコマンドを同期しました。")
+        bot.tree.copy_global_to(guild=interaction.guild)
+        synced = await bot.tree.sync(guild=interaction.guild)
+        await interaction.followup.send(f"{len(synced)}個のコマンドを同期しました。", ephemeral=True)
     except Exception as e:
-        await ctx.send(f"コマンド同期エラー: {e}")
+        await interaction.followup.send(f"コマンド同期エラー: {e}", ephemeral=True)
 
-# 開発用: グローバルにコマンドを同期
-@bot.command()
-@commands.is_owner()
-async def sync_global(ctx):
-    print("グローバルコマンドを同期中...")
+# 開発用: グローバルにコマンドを同期（権限の既定値はDMでは効かないため、サーバー内のみ）
+@bot.tree.command(name="sync_global", description="コマンドをグローバルに同期します（オーナーのみ）")
+@app_commands.guild_only()
+@app_commands.default_permissions(administrator=True)
+@app_commands.check(is_owner)
+async def sync_global(interaction: discord.Interaction):
+    logger.info("グローバルコマンドを同期中...")
+    await interaction.response.defer(ephemeral=True)
     try:
         synced = await bot.tree.sync()
-        await ctx.send(f"{len(synced)}個のコマンドをグローバルに同期しました。")
+        save_command_tree_hash(command_tree_hash())
+        await interaction.followup.send(f"{len(synced)}個のコマンドをグローバルに同期しました。", ephemeral=True)
     except Exception as e:
-        await ctx.send(f"コマンド同期エラー: {e}")
+        await interaction.followup.send(f"コマンド同期エラー: {e}", ephemeral=True)
 
 if __name__ == "__main__":
-    bot.run(TOKEN)
+    # LOG_FORMAT=json で1行1JSONの形式で出力する
+    setup_logging(os.getenv('LOG_LEVEL', 'INFO'), json_output=os.getenv('LOG_FORMAT') == 'json')
+    bot.run(TOKEN, log_handler=None)
@@ -0,0 +1,85 @@
+import os
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from typing import Optional
+
+from utils.accounts import AccountStore, LinkedAccount
+from utils.prefetch import RankPrefetcher
+from utils.riot_api import get_summoner_by_riot_id, RiotAPIError
+
+
+class AccountCog(commands.Cog):
+    """Riotアカウントの連携（任意）と、連携ユーザーのランク情報の先読み"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.accounts = AccountStore(os.getenv('RECRUITMENT_DB', 'data/recruitment.sqlite3'))
+        self.prefetcher = RankPrefetcher(
+            self.accounts,
+            budget_share=float(os.getenv('RANK_PREFETCH_BUDGET', '0.2')),  # 先読みに使うレート制限の割合
+            refresh_interval=float(os.getenv('RANK_PREFETCH_INTERVAL_MINUTES', '15')) * 60,
+            active_window=float(os.getenv('RANK_PREFETCH_ACTIVE_DAYS', '7')) * 24 * 60 * 60
+        )
+
+    async def cog_load(self):
+        self.prefetcher.start()
+
+    async def cog_unload(self):
+        self.prefetcher.stop()
+        await self.accounts.close()  # 未保存の変更を書き込む
+
+    def linked_account(self, user_id: int, game_mode: Optional[str] = None) -> Optional[LinkedAccount]:
+        """連携済みならアカウントを返し、利用時刻を更新する"""
+        return self.accounts.touch(user_id, game_mode)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        """募集用VCに参加した連携ユーザーを先読みの対象にする"""
+        if after.channel is None or before.channel == after.channel:
+            return
+        recruitment_cog = self.bot.get_cog("RecruitmentCog")
+        if recruitment_cog and recruitment_cog.registry.by_vc(after.channel.id):
+            self.accounts.touch(member.id)
+
+    @app_commands.command(name="link_account", description="Riotアカウントを連携して、募集時の入力を省略します")
+    @app_commands.describe(riot_id="サモナー名#タグ（例: Test#1234）")
+    async def link_account(self, interaction: discord.Interaction, riot_id: str):
+        """Discordアカウントと Riot ID を連携（PUUIDのみをこのBotに保存）"""
+        try:
+            name, tag = riot_id.split('#')
+        except ValueError:
+            await interaction.response.send_message("正しい形式で入力してください（例: Test#1234）", ephemeral=True)
+            return
+        await interaction.response.defer(ephemeral=True)
+        try:
+            account_info = await get_summoner_by_riot_id(name.strip(), tag.strip())
+        except RiotAPIError:
+            await interaction.followup.send("Riot APIから情報を取得できませんでした。しばらくしてから再度お試しください。", ephemeral=True)
+            return
+        if not account_info:
+            await interaction.followup.send("サモナーが見つかりませんでした。", ephemeral=True)
+            return
+        previous = self.accounts.get(interaction.user.id)
+        account = self.accounts.link(interaction.user.id, account_info)
+        if previous is not None and previous.puuid != account.puuid:
+            self.prefetcher.forget(previous.puuid)  # 前のアカウントの先読み結果は使わない
+        await interaction.followup.send(
+            f"{account.riot_id} を連携しました。次回から募集時のサモナー名の入力が不要になります。\n"
+            "連携を解除するには /unlink_account を使用してください。",
+            ephemeral=True
+        )
+
+    @app_commands.command(name="unlink_account", description="Riotアカウントの連携を解除します")
+    async def unlink_account(self, interaction: discord.Interaction):
+        account = self.accounts.get(interaction.user.id)
+        if account is None or not self.accounts.unlink(interaction.user.id):
+            await interaction.response.send_message("連携しているアカウントはありません。", ephemeral=True)
+            return
+        self.prefetcher.forget(account.puuid)
+        await interaction.response.send_message(f"{account.riot_id} の連携を解除しました。", ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(AccountCog(bot))
@@ -1,11 +1,34 @@
 import discord
 from discord import app_commands
-from discord.ext import commands, tasks
-from typing import Dict, Optional, List
+from discord.ext import commands
+from typing import Dict, Optional, List, Set, Tuple
 import asyncio
-from datetime import datetime, timedelta
-from utils.riot_api import get_summoner_by_riot_id, get_summoner_by_puuid, get_league_info, get_tft_league_info
-from utils.helper import RANK_EMOJIS, RANK_IMAGE_URLS
+import logging
+import os
+import time
+from utils.riot_api import get_summoner_by_riot_id, get_account_by_puuid, get_rank_entry, iter_rank_entries, init_sessions, close_sessions, RiotAPIError, start_ddragon_refresh, stop_ddragon_refresh, get_ddragon_version, DDRAGON_REFRESH_INTERVAL
+from utils.helper import RANK_EMOJIS, RANK_IMAGE_URLS, RANK_TIERS, party_rank_summary
+from utils.registry import Recruitment, RecruitmentRegistry
+from utils.store import RecruitmentStore
+from utils.reaper import DeadlineScheduler
+from utils.debounce import DebouncedEditor
+from utils.guild_config import GuildConfig, GuildConfigStore
+from utils.sharding import guild_shard_id, owns_guild
+from utils.assets import AssetCache
+from utils.matchmaking import MatchmakingIndex
+from utils.vc_pool import VoiceChannelPool, RECRUITMENT_VC_NAME
+from utils.write_queue import WriteQueue
+from utils.reconcile import ReconcileSummary, run_bounded, purge_messages
+from utils.flow import FlowState, TEAM_SIZES, STEP_ACCOUNT, STEP_SIZE, STEP_ROLE, STEP_TITLE, encode_flow_id, decode_flow_id
+from utils.cache import MISSING
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# 募集作成の各段階の所要時間と、VCの作成・削除の回数
+STAGE_SECONDS = metrics.histogram('recruitment_stage_seconds', '募集作成の段階ごとの所要時間', ['stage'])
+VC_OPERATIONS = metrics.counter('recruitment_vc_operations_total', '募集用VCの作成・再利用・削除の回数', ['operation', 'result'])
+RECRUITMENTS_CREATED = metrics.counter('recruitments_created_total', '作成された募集の数', ['game_mode', 'result'])
 
 class GameModeSelect(discord.ui.Select):
     def __init__(self):
@@ -17,141 +40,75 @@ class GameModeSelect(discord.ui.Select):
         super().__init__(placeholder="ゲームモードを選択", options=options, custom_id="game_mode_select")
 
     async def callback(self, interaction: discord.Interaction):
-        modal = SummonerModal()
-        modal.game_mode = self.values[0]
-        await interaction.response.send_modal(modal)
+        state = FlowState(self.values[0])
+        # アカウント連携済みならサモナー名の入力を省略
+        account_cog = interaction.client.get_cog("AccountCog")
+        account = account_cog.linked_account(interaction.user.id, state.game_mode) if account_cog else None
+        if account:
+            cog = interaction.client.get_cog("RecruitmentCog")
+            if cog:
+                cog.start_rank_lookup(account.puuid, state.game_mode)
+            await interaction.response.send_message(
+                f"連携済みのアカウント（{account.riot_id}）で募集します。\n募集人数を選択してください：",
+                view=team_size_view(state.with_puuid(account.puuid)),
+                ephemeral=True
+            )
+            return
 
-class SummonerModal(discord.ui.Modal, title="サモナー名を入力"):
-    summoner_input = discord.ui.TextInput(
-        label="サモナー名#タグ",
-        placeholder="例: Test#1234",
-        required=True
-    )
+        await interaction.response.send_modal(SummonerModal(state))
 
-    def __init__(self):
-        super().__init__()
-        self.game_mode = None
+# 募集作成フローのボタン・メニュー・モーダルは、選択済みの内容をcustom_idに持たせる。
+# 送信したViewやModalはBotに保持させず、操作はRecruitmentCog.on_interactionでまとめて処理する
+# （ユーザーごとのViewが溜まらず、再起動後も途中のフローを続けられる）
 
-    async def on_submit(self, interaction: discord.Interaction):
-        try:
-            name, tag = str(self.summoner_input.value).split('#')
-            account_info = await interaction.client.loop.run_in_executor(
-                None, lambda: get_summoner_by_riot_id(name.strip(), tag.strip())
-            )
-            
-            if not account_info:
-                await interaction.response.send_message("サモナーが見つかりませんでした。", ephemeral=True)
-                return
+def flow_view(*items: discord.ui.Item) -> discord.ui.View:
+    """募集作成フローのコンポーネントを並べたView（送信後は保持しない）"""
+    view = discord.ui.View(timeout=None)
+    for item in items:
+        view.add_item(item)
+    view.stop()
+    return view
 
-            await interaction.response.send_message("アカウントが見つかりました！", ephemeral=True)
-            # 次のステップ（人数選択）を表示
-            await self.show_team_size_selection(interaction, account_info)
-        except ValueError:
-            await interaction.response.send_message("正しい形式で入力してください（例: Test#1234）", ephemeral=True)
-        except Exception as e:
-            await interaction.response.send_message(f"エラーが発生しました: {e}", ephemeral=True)
-
-    async def show_team_size_selection(self, interaction: discord.Interaction, account_info: dict):
-        view = TeamSizeView(account_info, self.game_mode)
-        await interaction.followup.send("募集人数を選択してください：", view=view, ephemeral=True)
-
-class TeamSizeView(discord.ui.View):
-    def __init__(self, account_info: dict, game_mode: str):
-        super().__init__(timeout=None)
-        self.account_info = account_info
-        self.game_mode = game_mode
-        
-        # ゲームモードに応じてボタンを追加
-        if game_mode == 'ranked':
-            self.add_item(TeamSizeButton("Duo", 2))
-            self.add_item(TeamSizeButton("Flex", 5))
-            self.add_item(TeamSizeButton("Unlimited", None))
-        elif game_mode == 'normal':
-            self.add_item(TeamSizeButton("Duo", 2))
-            self.add_item(TeamSizeButton("Trio", 3))
-            self.add_item(TeamSizeButton("Squad", 4))
-            self.add_item(TeamSizeButton("Flex", 5))
-            self.add_item(TeamSizeButton("Unlimited", None))
-        else:  # TFT
-            self.add_item(TeamSizeButton("Duo", 2))
-            self.add_item(TeamSizeButton("Unlimited", None))
-
-class TeamSizeButton(discord.ui.Button):
-    def __init__(self, label: str, size: Optional[int]):
-        super().__init__(label=label, style=discord.ButtonStyle.primary, custom_id=f"size_{label.lower()}")
-        self.size = size
+def team_size_view(state: FlowState) -> discord.ui.View:
+    """ゲームモードに応じた人数選択のボタン"""
+    return flow_view(*(
+        discord.ui.Button(
+            label=label,
+            style=discord.ButtonStyle.primary,
+            custom_id=encode_flow_id(STEP_SIZE, state.with_size(index))
+        )
+        for index, (label, _) in enumerate(TEAM_SIZES[state.game_mode])
+    ))
 
-    async def callback(self, interaction: discord.Interaction):
-        try:
-            print(f"TeamSizeButton callback started - User: {interaction.user}, Size: {self.size}, Label: {self.label}")
-            print(f"View info - Account: {self.view.account_info}, Game mode: {self.view.game_mode}")
-            
-            if self.view.game_mode == 'tft':
-                # TFTの場合は直接タイトル入力へ
-                modal = TitleModal(
-                    self.view.account_info,
-                    self.view.game_mode,
-                    self.size,
-                    self.label,
-                    'none'  # TFTの場合はロールを'none'として扱う
-                )
-                await interaction.response.send_modal(modal)
-            else:
-                # それ以外の場合はロール選択へ
-                view = RoleSelectView(self.view.account_info, self.view.game_mode, self.size, self.label)
-                await interaction.response.send_message("ロールを選択してください：", view=view, ephemeral=True)
-            
-            print("TeamSizeButton callback completed successfully")
-        except Exception as e:
-            print(f"TeamSizeButton callback error: {e}")
-            import traceback
-            print(traceback.format_exc())
-            if not interaction.response.is_done():
-                await interaction.response.send_message("エラーが発生しました。もう一度お試しください。", ephemeral=True)
-            else:
-                await interaction.followup.send("エラーが発生しました。もう一度お試しください。", ephemeral=True)
+def role_select_view(state: FlowState) -> discord.ui.View:
+    """ロール選択のメニュー"""
+    options = [
+        discord.SelectOption(label="TOP", value="top"),
+        discord.SelectOption(label="JG", value="jungle"),
+        discord.SelectOption(label="MID", value="mid"),
+        discord.SelectOption(label="BOT", value="bot"),
+        discord.SelectOption(label="SUP", value="support"),
+        discord.SelectOption(label="Autofill", value="fill")
+    ]
+    return flow_view(discord.ui.Select(placeholder="ロールを選択", options=options, custom_id=encode_flow_id(STEP_ROLE, state)))
 
-class RoleSelectView(discord.ui.View):
-    def __init__(self, account_info: dict, game_mode: str, team_size: Optional[int], size_label: str):
-        try:
-            print(f"Initializing RoleSelectView - Game mode: {game_mode}, Team size: {team_size}, Size label: {size_label}")
-            print(f"Account info: {account_info}")
-            
-            super().__init__(timeout=None)
-            self.account_info = account_info
-            self.game_mode = game_mode
-            self.team_size = team_size
-            self.size_label = size_label
-            self.add_item(RoleSelect())
-            
-            print("RoleSelectView initialized successfully")
-        except Exception as e:
-            print(f"RoleSelectView initialization error: {e}")
-            import traceback
-            print(traceback.format_exc())
-            raise  # 元のエラーを再度発生させる
+def modal_value(interaction: discord.Interaction) -> str:
+    """送信されたモーダルの最初の入力欄の値"""
+    for row in interaction.data.get('components', []):
+        for component in row.get('components', []):
+            return component.get('value', '')
+    return ''
 
-class RoleSelect(discord.ui.Select):
-    def __init__(self):
-        options = [
-            discord.SelectOption(label="TOP", value="top"),
-            discord.SelectOption(label="JG", value="jungle"),
-            discord.SelectOption(label="MID", value="mid"),
-            discord.SelectOption(label="BOT", value="bot"),
-            discord.SelectOption(label="SUP", value="support"),
-            discord.SelectOption(label="Autofill", value="fill")
-        ]
-        super().__init__(placeholder="ロールを選択", options=options, custom_id="role_select")
+class SummonerModal(discord.ui.Modal, title="サモナー名を入力"):
+    summoner_input = discord.ui.TextInput(
+        label="サモナー名#タグ",
+        placeholder="例: Test#1234",
+        required=True
+    )
 
-    async def callback(self, interaction: discord.Interaction):
-        modal = TitleModal(
-            self.view.account_info,
-            self.view.game_mode,
-            self.view.team_size,
-            self.view.size_label,
-            self.values[0]
-        )
-        await interaction.response.send_modal(modal)
+    def __init__(self, state: FlowState):
+        super().__init__(custom_id=encode_flow_id(STEP_ACCOUNT, state))
+        self.stop()  # 送信後は保持しない
 
 # レーン表示用の定義を更新
 ROLE_EMOJIS = {
@@ -185,132 +142,519 @@ class TitleModal(discord.ui.Modal, title="募集タイトルを入力"):
         max_length=100
     )
 
-    def __init__(self, account_info: dict, game_mode: str, team_size: Optional[int], size_label: str, role: str):
-        super().__init__()
-        self.account_info = account_info
-        self.game_mode = game_mode
-        self.team_size = team_size
-        self.size_label = size_label
-        self.role = role
-
-    async def on_submit(self, interaction: discord.Interaction):
-        cog = interaction.client.get_cog("RecruitmentCog")
-        if not cog:
-            await interaction.response.send_message("エラーが発生しました。", ephemeral=True)
-            return
+    def __init__(self, state: FlowState):
+        super().__init__(custom_id=encode_flow_id(STEP_TITLE, state))
+        self.stop()  # 送信後は保持しない
 
-        await cog.create_recruitment(
-            interaction,
-            self.account_info,
-            self.game_mode,
-            self.team_size,
-            self.size_label,
-            self.role,
-            str(self.title_input)
-        )
+# 設定コマンド導入前に使っていたチャンネル（設定が1件もない場合に初期値として取り込む）
+LEGACY_CHANNEL_IDS = {
+    'recruitment': 1372707529049637018,
+    'ranked': 1368909351791890532,
+    'normal': 1368907113954279526,
+    'tft': 1368909399162224691
+}
+LEGACY_VC_CATEGORY_ID = 1369008978134171729
 
 class RecruitmentCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.vc_check.start()
-        self.active_vcs: Dict[int, datetime] = {}  # VC ID: 最後のアクティブ時間
-        self.recruitment_messages: Dict[int, int] = {}  # チャンネルID: メッセージID
-        self.active_recruitments: Dict[int, discord.Message] = {}  # VC ID: 募集メッセージ
-        
-        # 既存のチャンネルID
-        self.CHANNEL_IDS = {
-            'recruitment': 1372707529049637018,
-            'ranked': 1368909351791890532,
-            'normal': 1368907113954279526,
-            'tft': 1368909399162224691
-        }
-        
-        # VCカテゴリID
-        self.VC_CATEGORY_ID = 1369008978134171729
-
-    def cog_unload(self):
-        self.vc_check.cancel()
-
-    @tasks.loop(seconds=60)
-    async def vc_check(self):
-        """空のVCを定期的にチェックして削除"""
-        current_time = datetime.now()
-        for vc_id, last_active in list(self.active_vcs.items()):
-            if current_time - last_active > timedelta(minutes=1):
-                vc = self.bot.get_channel(vc_id)
-                if vc and len(vc.members) == 0:
-                    try:
-                        await vc.delete()
-                        del self.active_vcs[vc_id]
-                        # 関連する募集メッセージを更新
-                        await self.update_recruitment_message(vc_id)
-                    except:
-                        pass
+        # 募集状態の保存先（再起動後に復元する）
+        db_path = os.getenv('RECRUITMENT_DB', 'data/recruitment.sqlite3')
+        self.store = RecruitmentStore(db_path)
+        self.guild_configs = GuildConfigStore(db_path)  # サーバーごとのチャンネル設定
+        # 募集・検索用インデックス・VC参加者のランクはプロセス内で1つ（キーのIDはシャードをまたいで一意で、
+        # 1人1件の募集の制限もサーバーをまたぐため、シャードで分けない）。シャードごとなのは再接続で確認し直すreapersのみ
+        self.registry = RecruitmentRegistry(self.store)  # 進行中の募集（作成者・VC・メッセージから検索可能）
+        # 空きのある募集の検索用インデックス（/find）
+        self.matchmaking = MatchmakingIndex(role for role in ROLE_EMOJIS if role != 'fill')
+        metrics.gauge('recruitments_active', '進行中の募集の数').set_function(lambda: len(self.registry))
+        # 空になったVCを猶予時間後に削除するスケジューラ（シャードごと）
+        self.reapers: Dict[int, DeadlineScheduler] = {}
+        self.VC_EMPTY_GRACE = float(os.getenv('VC_EMPTY_GRACE', '60'))  # 空のVCを残しておく秒数
+        # VCの削除やメッセージの編集など、応答を待たせない書き込み（インタラクションへの応答を優先する）
+        self.writes = WriteQueue()
+        metrics.gauge('discord_write_backlog', '実行待ちのバックグラウンドの書き込み数', ['route']).set_function(
+            lambda: {(route,): count for route, count in self.writes.backlog().items()}
+        )
+        # 非表示で待機させておく募集用VC（VC_POOL_MAX=0で無効）
+        self.vc_pool = VoiceChannelPool(
+            min_size=int(os.getenv('VC_POOL_MIN', '1')),
+            max_size=int(os.getenv('VC_POOL_MAX', '5')),
+            writes=self.writes
+        )
+        self.vcs_in_flight: Set[int] = set()  # 作成・取得済みで、まだ募集に登録していないVC
+        # 起動時と/recruitment_reconcileで行う整合処理
+        self.RECONCILE_ON_STARTUP = os.getenv('RECONCILE_ON_STARTUP', '1') == '1'
+        self.RECONCILE_CONCURRENCY = int(os.getenv('RECONCILE_CONCURRENCY', '5'))  # 削除の同時実行数
+        self.RECONCILE_HISTORY_LIMIT = int(os.getenv('RECONCILE_HISTORY_LIMIT', '200'))  # 確認する投稿数（チャンネルごと）
+        metrics.gauge('recruitment_vc_pool_idle', '待機中の募集用VCの数').set_function(lambda: self.vc_pool.stats()['idle'])
+        # 募集メッセージの編集（参加者の出入りをまとめて1回の編集にする）
+        self.embed_editor = DebouncedEditor()
+        self.recruitment_embeds: Dict[int, discord.Embed] = {}  # メッセージID: 募集メッセージのEmbed
+        self.recruitment_messages: Dict[int, int] = {}  # チャンネルID: 募集開始パネルのメッセージID
+
+        # 先行して開始したランク情報の取得: (PUUID, ゲームモード): Task
+        self.rank_lookups: Dict[Tuple[str, str], asyncio.Future] = {}
+        self.RANK_LOOKUP_TIMEOUT = 3.0  # 募集作成時にランク情報を待つ最大秒数
+        self.RANK_LOOKUP_KEEP = 600  # 使われなかった取得結果を保持する秒数
+
+        # VC参加者のランク: VC ID: {ユーザーID: ランク情報}（取得中はMISSING）
+        self.party_ranks: Dict[int, Dict[int, object]] = {}
+        self.known_puuids: Dict[int, str] = {}  # 募集を作成したユーザーのPUUID（連携していないユーザー用）
+
+        # ランク紋章などのローカルコピー（ASSET_BASE_URLを設定するとblobsを配信するURLを使う）
+        self.assets = AssetCache(os.getenv('ASSET_CACHE_DIR', 'data/assets'))
+        self.ASSET_BASE_URL = os.getenv('ASSET_BASE_URL')
+        self.asset_task: Optional[asyncio.Task] = None
+        self.background_tasks: Set[asyncio.Task] = set()  # 状態の復元・参加者のランク取得（アンロード時に取り消す）
+
+    async def cog_load(self):
+        self.setup_persistent_views()
+        init_sessions()  # Riot APIのキャッシュの保存先を開く
+        start_ddragon_refresh()  # DDragonバージョンはバックグラウンドで取得
+        self.asset_task = self.bot.loop.create_task(self.refresh_assets())
+        # キャッシュが揃ってから状態を復元する（on_readyは再接続のたびに発火するため使わない）
+        self.spawn(self.restore_state())
+
+    def spawn(self, coro) -> asyncio.Task:
+        """バックグラウンドのタスクを開始し、終わるまで参照を保持する"""
+        task = self.bot.loop.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    async def cog_unload(self):
+        for task in list(self.background_tasks):
+            task.cancel()
+        for reaper in self.reapers.values():
+            reaper.stop()
+        self.vc_pool.stop()
+        await self.embed_editor.flush()
+        await self.writes.flush()
+        await self.store.close()  # 未保存の変更を書き込む
+        self.guild_configs.close()
+        stop_ddragon_refresh()
+        if self.asset_task:
+            self.asset_task.cancel()
+        await self.assets.close()
+        await close_sessions()  # Riot APIの共有セッションを閉じる
+
+    async def refresh_assets(self):
+        """DDragonのバージョンが変わったらアセットを取得し直す"""
+        while True:
+            try:
+                version = await get_ddragon_version()
+                if version != self.assets.version:
+                    await self.assets.prepare(version)
+            except Exception as e:
+                logger.warning("アセットの準備中にエラー", extra={'error': repr(e)})
+            await asyncio.sleep(DDRAGON_REFRESH_INTERVAL)
+
+    def rank_thumbnail(self, tier: str) -> Tuple[str, Optional[discord.File]]:
+        """ランク画像のURLと、添付する場合はそのファイル
+
+        添付ファイルのURLは元のメッセージが削除されると使えなくなるため、他の募集の添付は使い回さず毎回添付する。
+        """
+        crest = self.assets.rank_crest(tier) if tier != 'UNRANKED' else None
+        if crest is None:
+            # ローカルにない場合は従来の外部URLを使用
+            return RANK_IMAGE_URLS.get(tier, RANK_IMAGE_URLS['UNRANKED']), None
+        if self.ASSET_BASE_URL:
+            return f"{self.ASSET_BASE_URL.rstrip('/')}/{crest['sha256']}", None
+        filename = f"rank_{tier.lower()}.png"
+        return f"attachment://{filename}", discord.File(crest['path'], filename=filename)
 
-    async def update_recruitment_message(self, vc_id: int):
-        """VCが削除された時に関連する募集メッセージを更新"""
-        # 実装予定: メッセージのタイトルを"募集終了"に変更
+    async def restore_state(self):
+        """保存済みの募集とパネルを1回で復元"""
+        await self.bot.wait_until_ready()
+        restored = 0
+        for recruitment in self.store.load_recruitments():
+            # 他のプロセスが担当するシャードの募集には触れない
+            if not owns_guild(self.bot, recruitment.guild_id):
+                continue
+            # Botの停止中にVCが削除されていた募集は破棄
+            if recruitment.vc_id is None or self.bot.get_channel(recruitment.vc_id) is None:
+                self.store.delete(recruitment)
+                continue
+            self.registry.restore(recruitment)
+            restored += 1
+            self.arm_reaper(recruitment)
+            self.index_recruitment(recruitment)
+        self.recruitment_messages.update(self.store.load_panels())
+        logger.info("募集を復元しました", extra={'restored': restored})
+        self.migrate_legacy_config()
+        if self.RECONCILE_ON_STARTUP:
+            await self.reconcile_all()
+        self.restore_vc_pool()
+
+    def restore_vc_pool(self):
+        """再起動前の待機中のVCを取り込み、足りない分を作成"""
+        in_use = [recruitment.vc_id for recruitment in self.registry if recruitment.vc_id is not None]
+        for config in self.guild_configs.all():
+            if not owns_guild(self.bot, config.guild_id):
+                continue
+            category = self.bot.get_channel(config.vc_category_id) if config.vc_category_id else None
+            if category is None:
+                continue
+            self.vc_pool.adopt(category, exclude=in_use)
+            self.vc_pool.rebalance(category.guild, category)
+        logger.info("待機中のVCを取り込みました", extra=self.vc_pool.stats())
+
+    def reaper_for(self, guild_id: int) -> DeadlineScheduler:
+        """サーバーを担当するシャードのスケジューラを取得"""
+        shard_id = guild_shard_id(self.bot, guild_id)
+        reaper = self.reapers.get(shard_id)
+        if reaper is None:
+            reaper = DeadlineScheduler(self.reap_vc)
+            reaper.start()
+            self.reapers[shard_id] = reaper
+        return reaper
+
+    def arm_reaper(self, recruitment: Recruitment):
+        """VCが空なら、最後に人がいた時刻から猶予時間後に削除を予約"""
+        vc = self.bot.get_channel(recruitment.vc_id)
+        if vc is not None and len(vc.members) == 0:
+            remaining = recruitment.last_active + self.VC_EMPTY_GRACE - time.time()
+            self.reaper_for(recruitment.guild_id).schedule(recruitment.vc_id, remaining)
 
     @commands.Cog.listener()
-    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
-        """VCの状態変更を監視"""
-        if before.channel != after.channel:
-            if before.channel and before.channel.id in self.active_vcs:
-                if len(before.channel.members) == 0:
-                    self.active_vcs[before.channel.id] = datetime.now()
-            if after.channel and after.channel.id in self.active_vcs:
-                self.active_vcs[after.channel.id] = datetime.now()
+    async def on_shard_resumed(self, shard_id: int):
+        """切断中にVCイベントを取りこぼした可能性があるため、そのシャードの募集を確認し直す"""
+        for recruitment in self.registry:
+            if recruitment.vc_id is not None and guild_shard_id(self.bot, recruitment.guild_id) == shard_id:
+                self.arm_reaper(recruitment)
 
     @commands.Cog.listener()
-    async def on_ready(self):
-        """Bot起動時の処理"""
-        print("RecruitmentCog is ready!")
-        await self.setup_persistent_views()  # 永続的なViewを再登録
+    async def on_resumed(self):
+        """再接続時の確認（AutoShardedBotはon_shard_resumedも発火するため、そちらだけで処理する）"""
+        if isinstance(self.bot, commands.AutoShardedBot):
+            return
+        await self.on_shard_resumed(self.bot.shard_id or 0)
+
+    async def reap_vc(self, vc_id: int):
+        """猶予時間が過ぎた空のVCを削除し、募集を終了する"""
+        recruitment = self.registry.by_vc(vc_id)
+        if recruitment is None:
+            return
+        vc = self.bot.get_channel(vc_id)
+        if vc is not None:
+            if len(vc.members) > 0:
+                return
+            try:
+                retired = await self.writes.submit('vc_retire', lambda: self.retire_vc(vc), key=vc.id, bucket=vc.id)
+            except discord.NotFound:
+                retired = True
+            except discord.HTTPException as e:
+                # 削除に失敗した場合は猶予時間後に再試行
+                logger.warning("VCの削除に失敗しました", extra={'vc_id': vc_id, 'error': str(e)})
+                self.reaper_for(recruitment.guild_id).schedule(vc_id, self.VC_EMPTY_GRACE)
+                return
+            if not retired:
+                # 実行待ちの間に誰かが参加した（募集は続ける。空になれば改めて削除を予約する）
+                return
+        # 削除を待つ間にVCの削除イベントからend_recruitmentで終了済みなら何もしない
+        if not self.registry.remove(recruitment):
+            return
+        self.matchmaking.remove(recruitment.owner_id)
+        self.party_ranks.pop(vc_id, None)
+        self.record_end(recruitment)
+        # 関連する募集メッセージを更新
+        await self.update_recruitment_message(recruitment)
+
+    async def update_recruitment_message(self, recruitment: Recruitment):
+        """VCが削除された時に関連する募集メッセージを「募集終了」に変更"""
+        self.schedule_embed_update(recruitment)
+
+    def schedule_embed_update(self, recruitment: Recruitment):
+        """募集メッセージの参加者表示の更新を依頼（短時間の変更はまとめて反映）"""
+        if recruitment.channel_id is None or recruitment.message_id is None:
+            return
+        self.embed_editor.request(
+            recruitment.channel_id,
+            recruitment.message_id,
+            lambda: self.writes.submit(
+                'message_edit',
+                lambda: self.edit_recruitment_embed(recruitment),
+                key=recruitment.message_id,
+                bucket=recruitment.channel_id  # メッセージの編集はチャンネルごとにレート制限される
+            )
+        )
+
+    async def edit_recruitment_embed(self, recruitment: Recruitment):
+        """現在のVCの状態で募集メッセージを編集"""
+        channel = self.bot.get_channel(recruitment.channel_id)
+        if channel is None:
+            return
+        message = channel.get_partial_message(recruitment.message_id)
+        embed = self.recruitment_embeds.get(recruitment.message_id)
+        if embed is None:
+            # 再起動後などEmbedを保持していない場合のみ取得
+            fetched = await message.fetch()
+            if not fetched.embeds:
+                return
+            embed = fetched.embeds[0]
+            self.recruitment_embeds[recruitment.message_id] = embed
+
+        closed = self.registry.by_message(recruitment.message_id) is not recruitment
+        vc = None if closed else self.bot.get_channel(recruitment.vc_id)
+        members = [m for m in vc.members if not m.bot] if vc else []
+
+        if closed:
+            embed.title = f"【募集終了】{recruitment.title}"
+            embed.color = discord.Color.dark_grey()
+            self._set_field(embed, "ボイスチャンネル", "募集終了")
+            self._set_field(embed, "残り枠", "-")
+        else:
+            if recruitment.team_size:
+                remaining = max(recruitment.team_size - len(members), 0)
+                self._set_field(embed, "残り枠", f"{remaining}人" if remaining else "満員")
+            else:
+                self._set_field(embed, "残り枠", "制限なし")
+        self._set_field(embed, "参加者", " ".join(m.mention for m in members) if members else "まだいません")
+        if not closed and members:
+            summary = self.party_rank_display(recruitment, members)
+            if summary:
+                self._set_field(embed, "パーティのランク", summary)
 
-    async def setup_persistent_views(self):
-        """永続的なViewを再登録"""
         try:
-            # 募集チャンネルを取得
-            recruitment_channel = self.bot.get_channel(self.CHANNEL_IDS['recruitment'])
-            if not recruitment_channel:
-                print("警告: 募集チャンネルが見つかりません。")
+            await message.edit(embed=embed)
+        except discord.NotFound:
+            closed = True
+        if closed:
+            self.recruitment_embeds.pop(recruitment.message_id, None)
+
+    def index_recruitment(self, recruitment: Recruitment):
+        """検索用インデックスに現在の空き状況を反映（募集メッセージがある募集のみ）"""
+        if recruitment.message_id is None:
+            return
+        vc = self.bot.get_channel(recruitment.vc_id)
+        if vc is None:
+            return
+        self.matchmaking.update(recruitment, sum(1 for m in vc.members if not m.bot))
+
+    def puuid_for(self, user_id: int) -> Optional[str]:
+        """ユーザーのPUUID（アカウント連携済みか、このBotで募集を作成したことがある場合のみ）"""
+        account_cog = self.bot.get_cog("AccountCog")
+        account = account_cog.accounts.get(user_id) if account_cog else None
+        if account:
+            return account.puuid
+        return self.known_puuids.get(user_id)
+
+    def refresh_party_ranks(self, recruitment: Recruitment):
+        """VC参加者のうち、ランク未取得のメンバーの取得をまとめて開始"""
+        vc = self.bot.get_channel(recruitment.vc_id)
+        if vc is None:
+            return
+        ranks = self.party_ranks.setdefault(recruitment.vc_id, {})
+        member_ids = {m.id for m in vc.members if not m.bot}
+        for user_id in [user_id for user_id in ranks if user_id not in member_ids]:
+            del ranks[user_id]
+        missing: Dict[str, int] = {}  # PUUID: ユーザーID
+        for user_id in member_ids - ranks.keys():
+            puuid = self.puuid_for(user_id)
+            if puuid:
+                missing[puuid] = user_id
+                ranks[user_id] = MISSING
+        if missing:
+            self.spawn(self._fetch_party_ranks(recruitment, missing))
+
+    async def _fetch_party_ranks(self, recruitment: Recruitment, missing: Dict[str, int]):
+        """取得できた順に反映し、募集メッセージを少しずつ更新する"""
+        try:
+            async for puuid, entry in iter_rank_entries(missing, recruitment.game_mode):
+                ranks = self.party_ranks.get(recruitment.vc_id)
+                if ranks is None:
+                    return  # 募集が終了した
+                if missing[puuid] in ranks:
+                    ranks[missing[puuid]] = entry
+                    self.schedule_embed_update(recruitment)
+        finally:
+            # 取得できなかったメンバーは次の入退室時に再取得する
+            ranks = self.party_ranks.get(recruitment.vc_id, {})
+            for user_id in missing.values():
+                if ranks.get(user_id, None) is MISSING:
+                    del ranks[user_id]
+
+    def party_rank_display(self, recruitment: Recruitment, members: List[discord.Member]) -> Optional[str]:
+        """VC参加者の平均ランクと範囲（ランクを取得できたメンバーがいなければNone）"""
+        ranks = self.party_ranks.get(recruitment.vc_id, {})
+        entries = [ranks[m.id] for m in members if ranks.get(m.id, MISSING) is not MISSING]
+        if not entries:
+            return None
+        summary = party_rank_summary(entries)
+        unknown = len(members) - len(entries)
+        if unknown:
+            summary += f" / 不明 {unknown}人"
+        return summary
+
+    @staticmethod
+    def _set_field(embed: discord.Embed, name: str, value: str):
+        """同じ名前のフィールドがあれば書き換え、なければ追加"""
+        for index, field in enumerate(embed.fields):
+            if field.name == name:
+                embed.set_field_at(index, name=name, value=value, inline=field.inline)
                 return
+        embed.add_field(name=name, value=value, inline=False)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        """募集用VCが手動で削除された場合も募集を終了する"""
+        self.vc_pool.discard(channel.id)
+        recruitment = self.registry.by_vc(channel.id)
+        if recruitment is None:
+            return
+        await self.end_recruitment(recruitment)
 
-            # 最新の100メッセージを取得
-            async for message in recruitment_channel.history(limit=100):
-                if message.author == self.bot.user and len(message.embeds) > 0:
-                    # 募集開始メッセージを見つけた場合
-                    if message.embeds[0].title == "募集を開始":
-                        # 新しいViewを作成して既存のメッセージに追加
-                        view = discord.ui.View(timeout=None)
-                        view.add_item(GameModeSelect())
-                        message.view = view
-                        await message.edit(view=view)
-                        self.recruitment_messages[recruitment_channel.id] = message.id
-                        print("募集メッセージのViewを再登録しました。")
-                        break
+    async def end_recruitment(self, recruitment: Recruitment):
+        """VCがなくなった募集を終了する"""
+        self.reaper_for(recruitment.guild_id).cancel(recruitment.vc_id)
+        if not self.registry.remove(recruitment):
+            return  # reap_vcなどで終了済み
+        self.matchmaking.remove(recruitment.owner_id)
+        self.party_ranks.pop(recruitment.vc_id, None)
+        self.record_end(recruitment)
+        await self.update_recruitment_message(recruitment)
 
-        except Exception as e:
-            print(f"永続的なViewの再登録中にエラー: {e}")
+    def record_event(self, event: str, recruitment: Recruitment, value: Optional[float] = None):
+        """利用状況の集計用にイベントを記録（StatsCogが読み込まれている場合のみ）"""
+        stats_cog = self.bot.get_cog("StatsCog")
+        if stats_cog:
+            stats_cog.record(event, recruitment, value)
+
+    def record_join(self, member: discord.Member, recruitment: Recruitment, vc: discord.VoiceChannel):
+        """参加と、初めて満員になった時点を記録"""
+        if member.bot:
+            return
+        if member.id != recruitment.owner_id:
+            self.record_event('joined', recruitment)
+        if recruitment.team_size and recruitment.filled_at is None:
+            if sum(1 for m in vc.members if not m.bot) >= recruitment.team_size:
+                self.registry.mark_filled(recruitment)
+                self.record_event('filled', recruitment, recruitment.filled_at - recruitment.created_at)
+
+    def record_end(self, recruitment: Recruitment):
+        """募集の終了を記録（valueは募集の継続時間）"""
+        self.record_event('reaped', recruitment, time.time() - recruitment.created_at)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        """VCの状態変更を監視"""
+        if before.channel != after.channel:
+            if before.channel:
+                recruitment = self.registry.by_vc(before.channel.id)
+                if recruitment:
+                    if len(before.channel.members) == 0:
+                        # 空になったら猶予時間後に削除
+                        self.registry.touch(recruitment)
+                        self.reaper_for(member.guild.id).schedule(before.channel.id, self.VC_EMPTY_GRACE)
+                    self.party_ranks.get(before.channel.id, {}).pop(member.id, None)
+                    self.index_recruitment(recruitment)
+                    self.schedule_embed_update(recruitment)
+            if after.channel:
+                recruitment = self.registry.by_vc(after.channel.id)
+                if recruitment:
+                    # 誰かが参加したら削除を取り消す
+                    self.registry.touch(recruitment)
+                    self.reaper_for(member.guild.id).cancel(after.channel.id)
+                    self.record_join(member, recruitment, after.channel)
+                    self.refresh_party_ranks(recruitment)
+                    self.index_recruitment(recruitment)
+                    self.schedule_embed_update(recruitment)
+
+    def migrate_legacy_config(self):
+        """設定が1件もなければ、以前の固定チャンネルIDをそのサーバーの設定として取り込む"""
+        if self.guild_configs.all():
+            return
+        channel = self.bot.get_channel(LEGACY_CHANNEL_IDS['recruitment'])
+        if channel is None:
+            return
+        self.guild_configs.set(
+            channel.guild.id,
+            recruitment_channel_id=LEGACY_CHANNEL_IDS['recruitment'],
+            ranked_channel_id=LEGACY_CHANNEL_IDS['ranked'],
+            normal_channel_id=LEGACY_CHANNEL_IDS['normal'],
+            tft_channel_id=LEGACY_CHANNEL_IDS['tft'],
+            vc_category_id=LEGACY_VC_CATEGORY_ID
+        )
+        logger.info("既存のチャンネル設定を取り込みました", extra={'guild_id': channel.guild.id})
 
-    @commands.command(name='setup_recruitment')
-    @commands.has_permissions(administrator=True)
-    async def setup_recruitment_command(self, ctx):
+    def setup_persistent_views(self):
+        """永続的なViewを登録（custom_idが固定なので、すべての募集開始パネルに1回の登録で対応できる）"""
+        view = discord.ui.View(timeout=None)
+        view.add_item(GameModeSelect())
+        self.bot.add_view(view)
+
+    @app_commands.command(name="recruitment_config", description="募集に使うチャンネルを設定します（管理者のみ）")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        recruitment="募集開始パネルを置くチャンネル",
+        ranked="ランクの募集を投稿するチャンネル",
+        normal="ノーマルの募集を投稿するチャンネル",
+        tft="TFTの募集を投稿するチャンネル",
+        category="募集用VCを作成するカテゴリ"
+    )
+    async def recruitment_config(
+        self,
+        interaction: discord.Interaction,
+        recruitment: Optional[discord.TextChannel] = None,
+        ranked: Optional[discord.TextChannel] = None,
+        normal: Optional[discord.TextChannel] = None,
+        tft: Optional[discord.TextChannel] = None,
+        category: Optional[discord.CategoryChannel] = None
+    ):
+        """サーバーの募集設定を更新（指定しなかった項目はそのまま）"""
+        fields = {}
+        if recruitment:
+            fields['recruitment_channel_id'] = recruitment.id
+        if ranked:
+            fields['ranked_channel_id'] = ranked.id
+        if normal:
+            fields['normal_channel_id'] = normal.id
+        if tft:
+            fields['tft_channel_id'] = tft.id
+        if category:
+            fields['vc_category_id'] = category.id
+
+        if fields:
+            config = self.guild_configs.set(interaction.guild.id, **fields)
+        else:
+            config = self.guild_configs.get(interaction.guild.id) or GuildConfig(interaction.guild.id)
+
+        def mention(channel_id: Optional[int]) -> str:
+            return f"<#{channel_id}>" if channel_id else "未設定"
+
+        embed = discord.Embed(title="募集設定", color=discord.Color.blue())
+        embed.add_field(name="募集開始パネル", value=mention(config.recruitment_channel_id), inline=False)
+        embed.add_field(name="ランク", value=mention(config.ranked_channel_id), inline=False)
+        embed.add_field(name="ノーマル", value=mention(config.normal_channel_id), inline=False)
+        embed.add_field(name="TFT", value=mention(config.tft_channel_id), inline=False)
+        embed.add_field(name="VCカテゴリ", value=mention(config.vc_category_id), inline=False)
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="setup_recruitment", description="募集チャンネルに募集開始パネルを送信します（管理者のみ）")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    async def setup_recruitment_command(self, interaction: discord.Interaction):
         """募集チャンネルに初期メッセージを送信するコマンド（管理者のみ使用可能）"""
+        await interaction.response.defer(ephemeral=True)
         try:
             # 募集チャンネルを取得
-            recruitment_channel = self.bot.get_channel(self.CHANNEL_IDS['recruitment'])
+            config = self.guild_configs.get(interaction.guild.id)
+            if not config or not config.recruitment_channel_id:
+                await interaction.followup.send("エラー: 募集チャンネルが設定されていません。/recruitment_config で設定してください。", ephemeral=True)
+                return
+            recruitment_channel = self.bot.get_channel(config.recruitment_channel_id)
             if not recruitment_channel:
-                await ctx.send("エラー: 募集チャンネルが見つかりません。")
+                await interaction.followup.send("エラー: 募集チャンネルが見つかりません。", ephemeral=True)
                 return
 
-            # 既存のメッセージを削除
+            # 既存のメッセージをまとめて削除
             try:
-                async for message in recruitment_channel.history(limit=100):
-                    if message.author == self.bot.user:
-                        await message.delete()
+                old_messages = [message async for message in recruitment_channel.history(limit=100) if message.author == self.bot.user]
+                await purge_messages(recruitment_channel, old_messages, self.RECONCILE_CONCURRENCY)
             except Exception as e:
-                await ctx.send(f"既存メッセージの削除中にエラー: {e}")
+                await interaction.followup.send(f"既存メッセージの削除中にエラー: {e}", ephemeral=True)
 
             # 新しいメッセージを送信
             embed = discord.Embed(
@@ -328,11 +672,301 @@ class RecruitmentCog(commands.Cog):
             
             message = await recruitment_channel.send(embed=embed, view=view)
             self.recruitment_messages[recruitment_channel.id] = message.id
+            self.store.save_panel(recruitment_channel.id, message.id)
+            await interaction.followup.send("募集開始パネルを送信しました。", ephemeral=True)
 
         except discord.Forbidden:
-            await ctx.send("エラー: Botに必要な権限がありません。")
+            await interaction.followup.send("エラー: Botに必要な権限がありません。", ephemeral=True)
+        except Exception as e:
+            await interaction.followup.send(f"エラーが発生しました: {e}", ephemeral=True)
+
+    def _rank_task(self, puuid: str, game_mode: str) -> asyncio.Future:
+        """先読み済みのランク情報があればそれを、なければ取得を開始"""
+        account_cog = self.bot.get_cog("AccountCog")
+        if account_cog:
+            entry = account_cog.prefetcher.get(puuid, game_mode)
+            if entry is not MISSING:
+                future = self.bot.loop.create_future()
+                future.set_result(entry)
+                return future
+        task = asyncio.create_task(get_rank_entry(puuid, game_mode))
+        # タイムアウト後に失敗した場合や使われなかった場合も例外を回収しておく
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def reconcile_all(self):
+        """担当するすべてのサーバーで整合処理を実行"""
+        summary = ReconcileSummary()
+        for config in self.guild_configs.all():
+            guild = self.bot.get_guild(config.guild_id)
+            if guild is None or not owns_guild(self.bot, guild.id):
+                continue
+            try:
+                summary.merge(await self.reconcile_guild(guild))
+            except Exception:
+                logger.exception("整合処理中にエラー", extra={'guild_id': guild.id})
+        logger.info("起動時の整合処理が完了しました", extra=summary.counts)
+
+    async def reconcile_guild(self, guild: discord.Guild, purge_closed: bool = False) -> ReconcileSummary:
+        """Discord上のVC・募集メッセージと、保持している募集の状態を突き合わせて片付ける"""
+        summary = ReconcileSummary()
+        config = self.guild_configs.get(guild.id)
+        if config is None:
+            return summary
+        started_at = discord.utils.utcnow()
+        recruitments = [recruitment for recruitment in self.registry if recruitment.guild_id == guild.id]
+
+        # VCがなくなっている募集を終了（作成中でVCが未設定のものは除く）
+        for recruitment in recruitments:
+            if recruitment.vc_id is not None and self.bot.get_channel(recruitment.vc_id) is None:
+                await self.end_recruitment(recruitment)
+                summary.add('recruitments_closed')
+
+        # カテゴリ内の、どの募集にも使われていないVC（非表示のものは待機に戻し、Botが作った空のVCは削除）
+        category = self.bot.get_channel(config.vc_category_id) if config.vc_category_id else None
+        if category is not None:
+            in_use = {recruitment.vc_id for recruitment in self.registry if recruitment.guild_id == guild.id}
+            in_use |= self.vcs_in_flight | self.vc_pool.claiming
+            idle_before = self.vc_pool.idle_count(guild.id)
+            self.vc_pool.adopt(category, exclude=in_use)
+            summary.add('vcs_adopted', self.vc_pool.idle_count(guild.id) - idle_before)
+            orphans = [
+                vc for vc in category.voice_channels
+                if vc.id not in in_use and not self.vc_pool.is_idle(vc.id)
+                and not vc.members and RECRUITMENT_VC_NAME.match(vc.name)
+                and discord.utils.snowflake_time(vc.id) < started_at  # 作成の応答待ちのVCは除く
+            ]
+            failed = await run_bounded((vc.delete for vc in orphans), self.RECONCILE_CONCURRENCY)
+            summary.add('vcs_deleted', len(orphans) - failed)
+            summary.add('errors', failed)
+
+        # 募集チャンネルの、進行中の募集に対応しないBotの投稿
+        # 終了表示になっていないもの（停止中に終了した募集）は削除し、purge_closedなら終了済みのものも削除
+        # 履歴の取得中にも募集は作成されるため、対応する募集は1件ずつその時点の状態で確認し、
+        # 整合処理の開始後に投稿されたものは対象にしない
+        channel_ids = {config.ranked_channel_id, config.normal_channel_id, config.tft_channel_id} - {None}
+        for channel_id in channel_ids:
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                continue
+            stale = []
+            try:
+                async for message in channel.history(limit=self.RECONCILE_HISTORY_LIMIT):
+                    if message.author.id != self.bot.user.id or not message.embeds or message.created_at >= started_at:
+                        continue
+                    if self.registry.by_message(message.id) is not None or message.id in self.recruitment_messages.values():
+                        continue
+                    closed = (message.embeds[0].title or '').startswith("【募集終了】")
+                    if purge_closed or not closed:
+                        stale.append(message)
+                if stale:
+                    summary.add('messages_deleted', await purge_messages(channel, stale, self.RECONCILE_CONCURRENCY))
+            except discord.HTTPException as e:
+                logger.warning("募集メッセージを削除できませんでした", extra={'channel_id': channel_id, 'error': str(e)})
+                summary.add('errors')
+            for message in stale:
+                self.recruitment_embeds.pop(message.id, None)
+
+        logger.info("整合処理を実行しました", extra={'guild_id': guild.id, **summary.counts})
+        return summary
+
+    @app_commands.command(name="recruitment_reconcile", description="不要な募集用VCと募集メッセージを片付けます（管理者のみ）")
+    @app_commands.guild_only()
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(purge_closed="終了済みの募集メッセージも削除する")
+    async def recruitment_reconcile(self, interaction: discord.Interaction, purge_closed: bool = False):
+        """募集の状態とDiscord上のVC・メッセージの不整合を解消し、結果を表示"""
+        await interaction.response.defer(ephemeral=True)
+        started = time.perf_counter()
+        summary = await self.reconcile_guild(interaction.guild, purge_closed)
+        embed = discord.Embed(
+            title="整合処理の結果" if summary.changed else "整合処理の結果（変更なし）",
+            description="\n".join(summary.lines()),
+            color=discord.Color.blue()
+        )
+        embed.set_footer(text=f"所要時間: {time.perf_counter() - started:.1f}秒")
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
+    @app_commands.command(name="find", description="条件に合う空きのある募集を探します")
+    @app_commands.guild_only()
+    @app_commands.describe(
+        mode="ゲームモード",
+        tier="ランク帯（指定したティアの前後も含めて探します）",
+        spread="前後に含めるティアの数",
+        role="空いていてほしいロール",
+        slots="参加したい人数"
+    )
+    @app_commands.choices(
+        mode=[
+            app_commands.Choice(name="ランク", value="ranked"),
+            app_commands.Choice(name="ノーマル", value="normal"),
+            app_commands.Choice(name="TFT", value="tft")
+        ],
+        tier=[app_commands.Choice(name=tier, value=tier) for tier in RANK_TIERS],
+        role=[app_commands.Choice(name=label, value=role) for role, label in ROLE_EMOJIS.items() if role != 'fill']
+    )
+    async def find(
+        self,
+        interaction: discord.Interaction,
+        mode: str,
+        tier: Optional[str] = None,
+        spread: app_commands.Range[int, 0, 3] = 1,
+        role: Optional[str] = None,
+        slots: app_commands.Range[int, 1, 4] = 1
+    ):
+        """インデックスから空きのある募集を検索"""
+        results = self.matchmaking.find(interaction.guild.id, mode, tier=tier, spread=spread, role=role, slots=slots)
+        if not results:
+            await interaction.response.send_message("条件に合う募集は見つかりませんでした。", ephemeral=True)
+            return
+
+        embed = discord.Embed(title="見つかった募集", color=discord.Color.blue())
+        for recruitment in results:
+            link = f"https://discord.com/channels/{recruitment.guild_id}/{recruitment.channel_id}/{recruitment.message_id}"
+            vc = self.bot.get_channel(recruitment.vc_id)
+            members = len([m for m in vc.members if not m.bot]) if vc else 0
+            slots_text = f"残り{recruitment.team_size - members}人" if recruitment.team_size else "制限なし"
+            embed.add_field(
+                name=recruitment.title or "募集",
+                value=f"{recruitment.rank} / {recruitment.size_label}（{slots_text}）\n<#{recruitment.vc_id}> [募集メッセージ]({link})",
+                inline=False
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+    def start_rank_lookup(self, puuid: str, game_mode: str) -> asyncio.Future:
+        """ランク情報の取得をバックグラウンドで開始（募集作成時に結果を受け取る）"""
+        key = (puuid, game_mode)
+        task = self.rank_lookups.get(key)
+        if task is None:
+            task = self._rank_task(puuid, game_mode)
+            self.rank_lookups[key] = task
+            # 募集が作成されなかった場合に備えて一定時間後に破棄
+            self.bot.loop.call_later(self.RANK_LOOKUP_KEEP, self._discard_rank_lookup, key, task)
+        return task
+
+    def _discard_rank_lookup(self, key: Tuple[str, str], task: asyncio.Future):
+        if self.rank_lookups.get(key) is task:
+            del self.rank_lookups[key]
+
+    async def resolve_rank(self, puuid: str, game_mode: str) -> Tuple[str, str]:
+        """ランク表示とティアを取得（時間内に取得できなければ未設定として扱う）"""
+        task = self.rank_lookups.pop((puuid, game_mode), None)
+        if task is None:
+            task = self._rank_task(puuid, game_mode)
+        try:
+            # shieldで包み、タイムアウトしても取得自体は続けてキャッシュに残す
+            entry = await asyncio.wait_for(asyncio.shield(task), timeout=self.RANK_LOOKUP_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("ランク情報の取得がタイムアウトしました", extra={'puuid': puuid})
+            entry = None
+        except Exception as e:
+            logger.warning("ランク情報の取得に失敗しました", extra={'puuid': puuid, 'error': str(e)})
+            entry = None
+
+        if not entry:
+            return "未設定", 'UNRANKED'
+        tier = entry['tier']
+        rank_display = f"{tier} {entry['rank']}"
+        if game_mode == 'tft':
+            rank_display = f"TFT {rank_display}"
+        return rank_display, tier
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        """募集作成フローの操作を、custom_idに入っている状態から処理する"""
+        if interaction.type not in (discord.InteractionType.component, discord.InteractionType.modal_submit):
+            return
+        decoded = decode_flow_id((interaction.data or {}).get('custom_id', ''))
+        if decoded is None:
+            return
+        step, state = decoded
+        handler = {
+            STEP_ACCOUNT: self.submit_riot_id,
+            STEP_SIZE: self.select_team_size,
+            STEP_ROLE: self.select_role,
+            STEP_TITLE: self.submit_title
+        }[step]
+        await handler(interaction, state)
+
+    async def submit_riot_id(self, interaction: discord.Interaction, state: FlowState):
+        """入力されたサモナー名を確認し、人数選択を表示"""
+        # Riot APIはレート制限の順番待ちや再試行で3秒を超えることがあるため、先に応答しておく
+        with self.writes.foreground():
+            await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            name, tag = modal_value(interaction).split('#')
+            account_info = await get_summoner_by_riot_id(name.strip(), tag.strip())
+            
+            if not account_info:
+                await interaction.followup.send("サモナーが見つかりませんでした。", ephemeral=True)
+                return
+
+            # ランク情報の取得を先に開始し、人数・ロール選択の間に終わらせておく
+            self.start_rank_lookup(account_info['puuid'], state.game_mode)
+
+            # 次のステップ（人数選択）を表示
+            view = team_size_view(state.with_puuid(account_info['puuid']))
+            await interaction.followup.send("アカウントが見つかりました！\n募集人数を選択してください：", view=view, ephemeral=True)
+        except ValueError:
+            await interaction.followup.send("正しい形式で入力してください（例: Test#1234）", ephemeral=True)
+        except RiotAPIError:
+            await interaction.followup.send("Riot APIから情報を取得できませんでした。しばらくしてから再度お試しください。", ephemeral=True)
         except Exception as e:
-            await ctx.send(f"エラーが発生しました: {e}")
+            await interaction.followup.send(f"エラーが発生しました: {e}", ephemeral=True)
+
+    async def select_team_size(self, interaction: discord.Interaction, state: FlowState):
+        """人数の選択後、ロール選択（TFTはタイトル入力）を表示"""
+        try:
+            logger.debug("人数を選択", extra={'user_id': interaction.user.id, 'size_label': state.size_label, 'game_mode': state.game_mode})
+            with self.writes.foreground():
+                if state.game_mode == 'tft':
+                    # TFTの場合は直接タイトル入力へ（ロールは'none'として扱う）
+                    await interaction.response.send_modal(TitleModal(state.with_role('none')))
+                else:
+                    await interaction.response.send_message("ロールを選択してください：", view=role_select_view(state), ephemeral=True)
+        except Exception:
+            logger.exception("人数選択の処理中にエラー", extra={'user_id': interaction.user.id})
+            if not interaction.response.is_done():
+                await interaction.response.send_message("エラーが発生しました。もう一度お試しください。", ephemeral=True)
+            else:
+                await interaction.followup.send("エラーが発生しました。もう一度お試しください。", ephemeral=True)
+
+    async def select_role(self, interaction: discord.Interaction, state: FlowState):
+        """ロールの選択後、タイトル入力を表示"""
+        role = interaction.data.get('values', ['fill'])[0]
+        with self.writes.foreground():
+            await interaction.response.send_modal(TitleModal(state.with_role(role)))
+
+    async def submit_title(self, interaction: discord.Interaction, state: FlowState):
+        """タイトルの入力後、募集を作成"""
+        # アカウント情報の取得にRiot APIを使う場合があるため、先に応答しておく
+        with STAGE_SECONDS.time(stage='defer'), self.writes.foreground():
+            await interaction.response.defer(ephemeral=True, thinking=True)
+        try:
+            account_info = await self.account_info_for(interaction.user.id, state.puuid)
+        except RiotAPIError:
+            account_info = None
+        if not account_info:
+            await interaction.followup.send("アカウント情報を取得できませんでした。もう一度お試しください。", ephemeral=True)
+            return
+
+        await self.create_recruitment(
+            interaction,
+            account_info,
+            state.game_mode,
+            state.team_size,
+            state.size_label,
+            state.role,
+            modal_value(interaction)
+        )
+
+    async def account_info_for(self, user_id: int, puuid: str) -> Optional[dict]:
+        """フローのPUUIDに対応するアカウント情報（連携済みならRiot APIを使わない）"""
+        account_cog = self.bot.get_cog("AccountCog")
+        account = account_cog.accounts.get(user_id) if account_cog else None
+        if account and account.puuid == puuid:
+            return account.account_info()
+        return await get_account_by_puuid(puuid)
 
     async def create_recruitment(
         self,
@@ -344,82 +978,59 @@ class RecruitmentCog(commands.Cog):
         role: str,
         title: str
     ):
-        """募集を作成"""
+        """募集を作成（応答済みでなければ先に応答し、結果はフォローアップで返す）"""
+        started = time.perf_counter()
         try:
             if not interaction.response.is_done():
-                await interaction.response.defer(ephemeral=True)
+                with STAGE_SECONDS.time(stage='defer'), self.writes.foreground():
+                    await interaction.response.defer(ephemeral=True)
 
-            # 既存のVCをチェック
-            for vc_id in list(self.active_vcs.keys()):
-                vc = self.bot.get_channel(vc_id)
-                if vc and vc.name == f"[{game_mode.upper()}] {interaction.user.display_name}の{size_label}":
-                    await interaction.followup.send("既に募集用VCを作成しています。", ephemeral=True)
-                    return
+            # 既存の募集をチェック
+            if self.registry.by_owner(interaction.user.id):
+                await interaction.followup.send("既に募集用VCを作成しています。", ephemeral=True)
+                return
+
+            # サーバーの設定を取得
+            config = self.guild_configs.get(interaction.guild.id)
+            if not config:
+                await interaction.followup.send("このサーバーでは募集が設定されていません。", ephemeral=True)
+                return
 
             # VCカテゴリを取得
-            category = self.bot.get_channel(self.VC_CATEGORY_ID)
+            category = self.bot.get_channel(config.vc_category_id) if config.vc_category_id else None
             if not category:
                 await interaction.followup.send("VCカテゴリが見つかりません。", ephemeral=True)
                 return
 
+            # VC作成前に登録し、同じユーザーの同時作成を防ぐ
+            recruitment = Recruitment(
+                owner_id=interaction.user.id,
+                guild_id=interaction.guild.id,
+                game_mode=game_mode,
+                team_size=team_size,
+                size_label=size_label,
+                role=role,
+                title=title
+            )
+            self.registry.add(recruitment)
+
+            # VC作成とランク情報の取得を並行して実行
             vc_name = f"[{game_mode.upper()}] {interaction.user.display_name}の{size_label}"
-            vc = await interaction.guild.create_voice_channel(
+            vc_task = asyncio.create_task(self.create_vc(
+                interaction.guild,
                 name=vc_name,
                 category=category,
                 user_limit=team_size
-            )
-            self.active_vcs[vc.id] = datetime.now()
-
-            # サモナー情報を取得
-            try:
-                summoner_info = await interaction.client.loop.run_in_executor(
-                    None, lambda: get_summoner_by_puuid(account_info['puuid'])
-                )
-                print(f"Summoner info: {summoner_info}")  # デバッグ用
-
-                league_info = await interaction.client.loop.run_in_executor(
-                    None, lambda: get_league_info(summoner_info['id'])
-                )
-                print(f"League info: {league_info}")  # デバッグ用
-            except Exception as e:
-                print(f"Error fetching summoner info: {e}")
-                summoner_info = None
-                league_info = None
-
-            # ランク情報を取得
-            rank_display = "未設定"
-            rank_image = RANK_IMAGE_URLS['UNRANKED']
-            if league_info is not None:
-                try:
-                    if game_mode == 'tft':
-                        # TFTのランク情報を取得
-                        print(f"Fetching TFT rank for summoner ID: {summoner_info['id']}")  # デバッグ用
-                        tft_league_info = await interaction.client.loop.run_in_executor(
-                            None, lambda: get_tft_league_info(summoner_info['id'])
-                        )
-                        print(f"TFT league info: {tft_league_info}")  # デバッグ用
-
-                        if tft_league_info and len(tft_league_info) > 0:
-                            tft_rank = tft_league_info[0]  # 最初のランク情報を使用
-                            tier = tft_rank['tier']
-                            rank = tft_rank['rank']
-                            rank_display = f"TFT {tier} {rank}"
-                            rank_image = RANK_IMAGE_URLS.get(tier, RANK_IMAGE_URLS['UNRANKED'])
-                            print(f"TFT rank found: {rank_display}")
-                        else:
-                            print("No TFT rank found in response")
-                    else:
-                        # 通常のソロランク情報を取得
-                        solo_rank = next((q for q in league_info if q['queueType'] == 'RANKED_SOLO_5x5'), None)
-                        if solo_rank:
-                            tier = solo_rank['tier']
-                            rank = solo_rank['rank']
-                            rank_display = f"{tier} {rank}"
-                            rank_image = RANK_IMAGE_URLS.get(tier, RANK_IMAGE_URLS['UNRANKED'])
-                            print(f"Solo rank found: {rank_display}")  # デバッグ用
-                except Exception as e:
-                    print(f"Error processing rank info: {e}")
-                    print(f"Full error details: ", exc_info=True)  # より詳細なエラー情報
+            ))
+            self.known_puuids[interaction.user.id] = account_info['puuid']
+            with STAGE_SECONDS.time(stage='rank_lookup'):
+                rank_display, tier = await self.resolve_rank(account_info['puuid'], game_mode)
+            vc = await vc_task
+            recruitment.rank = rank_display
+            self.registry.set_vc(recruitment, vc.id)
+            self.vcs_in_flight.discard(vc.id)
+            # 誰も参加しなければ猶予時間後に削除
+            self.reaper_for(interaction.guild.id).schedule(vc.id, self.VC_EMPTY_GRACE)
 
             # 募集メッセージを作成
             try:
@@ -428,12 +1039,13 @@ class RecruitmentCog(commands.Cog):
                     color=discord.Color.blue()
                 )
                 
-                # サムネイルの設定
+                # サムネイルの設定（ローカルにあるランク紋章は添付ファイルとして送信）
+                rank_image, rank_file = self.rank_thumbnail(tier)
                 if rank_image:
                     try:
                         embed.set_thumbnail(url=rank_image)
                     except Exception as e:
-                        print(f"Error setting thumbnail: {e}")
+                        logger.warning("サムネイルの設定に失敗しました", extra={'error': str(e)})
 
                 embed.add_field(
                     name="作成者",
@@ -445,37 +1057,102 @@ class RecruitmentCog(commands.Cog):
                     embed.add_field(name="作成者のロール", value=f"{ROLE_EMOJIS.get(role, '')}", inline=False)
                 embed.add_field(name="募集人数", value=f"{team_size if team_size else '制限なし'}人", inline=False)
                 embed.add_field(name="ボイスチャンネル", value=vc.mention, inline=False)
+                embed.add_field(name="参加者", value="まだいません", inline=False)
+                embed.add_field(name="残り枠", value=f"{team_size}人" if team_size else "制限なし", inline=False)
 
                 # 募集チャンネルに送信
-                channel_id = self.CHANNEL_IDS.get(game_mode)
+                channel_id = config.channel_for(game_mode)
                 if channel_id:
                     channel = self.bot.get_channel(channel_id)
                     if channel:
-                        message = await channel.send(embed=embed)
-                        self.active_recruitments[vc.id] = message
+                        with STAGE_SECONDS.time(stage='message_send'):
+                            if rank_file:
+                                message = await channel.send(embed=embed, file=rank_file)
+                            else:
+                                message = await channel.send(embed=embed)
+                        self.registry.set_message(recruitment, channel.id, message.id)
+                        # 添付画像のURLが解決された送信後のEmbedを保持して、以降の編集に使う
+                        self.recruitment_embeds[message.id] = message.embeds[0] if message.embeds else embed
+                        self.index_recruitment(recruitment)
                         await interaction.followup.send("募集を作成しました！", ephemeral=True)
+                        STAGE_SECONDS.observe(time.perf_counter() - started, stage='total')
+                        RECRUITMENTS_CREATED.inc(game_mode=game_mode, result='ok')
+                        self.record_event('created', recruitment)
+                        logger.info("募集を作成しました", extra={
+                            'guild_id': recruitment.guild_id, 'game_mode': game_mode,
+                            'elapsed_ms': round((time.perf_counter() - started) * 1000)
+                        })
                     else:
                         raise ValueError("募集チャンネルが見つかりませんでした。")
                 else:
                     raise ValueError("対応する募集チャンネルが設定されていません。")
 
-            except Exception as e:
-                print(f"Error creating recruitment message: {e}")
+            except Exception:
+                logger.exception("募集メッセージの作成に失敗しました", extra={'guild_id': recruitment.guild_id})
+                RECRUITMENTS_CREATED.inc(game_mode=game_mode, result='error')
+                if self.registry.remove(recruitment):
+                    self.matchmaking.remove(recruitment.owner_id)
                 if 'vc' in locals():
-                    try:
-                        await vc.delete()
-                    except:
-                        pass
+                    # 後片付けは応答の後で行う
+                    self.writes.submit('vc_retire', lambda: self.retire_vc(vc), key=vc.id, bucket=vc.id)
                 await interaction.followup.send("募集の作成中にエラーが発生しました。", ephemeral=True)
 
-        except Exception as e:
-            print(f"募集作成エラー: {e}")
+        except Exception:
+            logger.exception("募集作成エラー", extra={'guild_id': interaction.guild_id})
+            RECRUITMENTS_CREATED.inc(game_mode=game_mode, result='error')
             await interaction.followup.send("募集の作成中にエラーが発生しました。", ephemeral=True)
+            if 'recruitment' in locals() and self.registry.remove(recruitment):
+                self.matchmaking.remove(recruitment.owner_id)
             if 'vc' in locals():
-                try:
-                    await vc.delete()
-                except:
-                    pass
+                self.writes.submit('vc_retire', lambda: self.retire_vc(vc), key=vc.id, bucket=vc.id)
+
+    async def create_vc(self, guild: discord.Guild, **kwargs) -> discord.VoiceChannel:
+        """募集用VCを用意（待機中のVCがあれば使い、なければ作成。所要時間と成否を記録）"""
+        with STAGE_SECONDS.time(stage='vc_create'):
+            vc = await self.vc_pool.claim(guild, kwargs['category'], kwargs['name'], kwargs.get('user_limit'))
+            if vc is not None:
+                VC_OPERATIONS.inc(operation='claim', result='ok')
+                self.vcs_in_flight.add(vc.id)
+                return vc
+            try:
+                vc = await guild.create_voice_channel(**kwargs)
+            except Exception:
+                VC_OPERATIONS.inc(operation='create', result='error')
+                raise
+        VC_OPERATIONS.inc(operation='create', result='ok')
+        self.vcs_in_flight.add(vc.id)
+        return vc
+
+    async def retire_vc(self, vc: discord.VoiceChannel) -> bool:
+        """使い終わったVCを待機に戻す（待機数が足りていれば削除）
+
+        書き込みの順番待ちの間に誰かが参加した場合は何もせずFalseを返す。
+        """
+        self.vcs_in_flight.discard(vc.id)
+        if vc.members:
+            VC_OPERATIONS.inc(operation='retire', result='occupied')
+            return False
+        try:
+            if await self.vc_pool.release(vc):
+                VC_OPERATIONS.inc(operation='release', result='ok')
+                return True
+        except discord.NotFound:
+            raise
+        except discord.HTTPException as e:
+            VC_OPERATIONS.inc(operation='release', result='error')
+            logger.warning("VCを待機に戻せませんでした", extra={'vc_id': vc.id, 'error': str(e)})
+            if vc.members:
+                VC_OPERATIONS.inc(operation='retire', result='occupied')
+                return False
+        try:
+            await vc.delete()
+        except discord.NotFound:
+            raise
+        except discord.HTTPException:
+            VC_OPERATIONS.inc(operation='delete', result='error')
+            raise
+        VC_OPERATIONS.inc(operation='delete', result='ok')
+        return True
 
 async def setup(bot):
     await bot.add_cog(RecruitmentCog(bot)) 
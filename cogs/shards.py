@@ -0,0 +1,80 @@
+import logging
+import math
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from utils.sharding import ShardEventCounter, guild_shard_id
+
+logger = logging.getLogger(__name__)
+
+
+class ShardCog(commands.Cog):
+    """シャードごとの遅延とイベント数を記録・表示する"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.events = ShardEventCounter()
+        self.disconnects: dict = {}  # シャードID: 切断回数
+
+    def _record(self, guild: discord.Guild):
+        if guild is not None:
+            self.events.record(guild_shard_id(self.bot, guild.id))
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
+        self._record(member.guild)
+
+    @commands.Cog.listener()
+    async def on_interaction(self, interaction: discord.Interaction):
+        self._record(interaction.guild)
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id: int):
+        self.disconnects[shard_id] = self.disconnects.get(shard_id, 0) + 1
+        logger.warning("シャードが切断されました", extra={'shard_id': shard_id})
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id: int):
+        logger.info("シャードが再接続しました", extra={'shard_id': shard_id})
+
+    def shard_latencies(self):
+        """(シャードID, 遅延秒数) の一覧"""
+        latencies = getattr(self.bot, 'latencies', None)
+        if latencies is not None:
+            return latencies
+        return [(self.bot.shard_id or 0, self.bot.latency)]
+
+    @app_commands.command(name="shard_status", description="シャードごとの遅延とイベント数を表示します（管理者のみ）")
+    @app_commands.default_permissions(administrator=True)
+    async def shard_status(self, interaction: discord.Interaction):
+        """シャードごとの状態を表示"""
+        guild_counts = {}
+        for guild in self.bot.guilds:
+            shard_id = guild_shard_id(self.bot, guild.id)
+            guild_counts[shard_id] = guild_counts.get(shard_id, 0) + 1
+
+        recruitment_counts = {}
+        recruitment_cog = self.bot.get_cog("RecruitmentCog")
+        if recruitment_cog:
+            for recruitment in recruitment_cog.registry:
+                shard_id = guild_shard_id(self.bot, recruitment.guild_id)
+                recruitment_counts[shard_id] = recruitment_counts.get(shard_id, 0) + 1
+
+        embed = discord.Embed(title="シャードの状態", color=discord.Color.blue())
+        for shard_id, latency in self.shard_latencies():
+            embed.add_field(
+                name=f"シャード {shard_id}",
+                value=(
+                    f"遅延: {f'{latency * 1000:.0f}ms' if math.isfinite(latency) else '未接続'}\n"
+                    f"イベント: {self.events.rate(shard_id):.0f}件/分（累計 {self.events.totals.get(shard_id, 0)}件）\n"
+                    f"サーバー: {guild_counts.get(shard_id, 0)} / 募集: {recruitment_counts.get(shard_id, 0)}\n"
+                    f"切断: {self.disconnects.get(shard_id, 0)}回"
+                ),
+                inline=True
+            )
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(ShardCog(bot))
@@ -0,0 +1,97 @@
+import os
+import time
+
+import discord
+from discord import app_commands
+from discord.ext import commands
+from typing import Optional
+
+from utils.analytics import AnalyticsStore, rank_tier
+from utils.registry import Recruitment
+
+MODE_LABELS = {'ranked': "ランク", 'normal': "ノーマル", 'tft': "TFT"}
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.0f}秒"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f}分"
+    return f"{seconds / 3600:.1f}時間"
+
+
+class StatsCog(commands.Cog):
+    """募集の利用状況の記録と集計（/stats）"""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.analytics = AnalyticsStore(
+            os.getenv('RECRUITMENT_DB', 'data/recruitment.sqlite3'),
+            retention_days=float(os.getenv('STATS_EVENT_RETENTION_DAYS', '90')),  # イベントログを残す日数
+            utc_offset_hours=int(os.getenv('STATS_UTC_OFFSET', '9'))  # ピーク時間帯の表示に使う時差
+        )
+
+    async def cog_unload(self):
+        await self.analytics.close()
+
+    def record(self, event: str, recruitment: Recruitment, value: Optional[float] = None):
+        """募集のイベントを記録（書き込みは後でまとめて行う）"""
+        self.analytics.record(
+            event,
+            recruitment.guild_id,
+            recruitment.game_mode,
+            recruitment.size_label,
+            recruitment.role,
+            rank_tier(recruitment.rank),
+            value,
+            sized=recruitment.team_size is not None
+        )
+
+    @app_commands.command(name="stats", description="募集の利用状況を表示します")
+    @app_commands.guild_only()
+    @app_commands.describe(days="集計する日数", mode="ゲームモード（指定しなければすべて）")
+    @app_commands.choices(mode=[app_commands.Choice(name=label, value=mode) for mode, label in MODE_LABELS.items()])
+    async def stats(
+        self,
+        interaction: discord.Interaction,
+        days: app_commands.Range[int, 1, 90] = 7,
+        mode: Optional[app_commands.Choice[str]] = None
+    ):
+        """直近の募集数・満員になった割合・満員までの時間・ピーク時間帯を表示"""
+        started = time.perf_counter()
+        game_mode = mode.value if mode else None
+        summary = await self.analytics.summary(interaction.guild.id, days, game_mode)
+
+        title = f"募集の利用状況（直近{days}日" + (f"・{MODE_LABELS[game_mode]}" if game_mode else "") + "）"
+        embed = discord.Embed(title=title, color=discord.Color.blue())
+        if not summary.created:
+            embed.description = "この期間の募集はありません。"
+        else:
+            embed.add_field(name="募集数", value=f"{summary.created}件", inline=True)
+            embed.add_field(name="参加", value=f"{summary.joined}人", inline=True)
+            embed.add_field(
+                name="満員になった割合",
+                value=f"{summary.fill_rate:.0%}（{summary.filled}件）" if summary.fill_rate is not None else "人数制限なしのみ",
+                inline=True
+            )
+            if summary.median_fill_seconds is not None:
+                embed.add_field(name="満員までの時間（中央値）", value=f"約{format_duration(summary.median_fill_seconds)}", inline=True)
+            embed.add_field(
+                name="ピーク時間帯",
+                value="\n".join(f"{hour}時台: {count}件" for hour, count in summary.peak_hours),
+                inline=False
+            )
+            embed.add_field(
+                name="ランク帯",
+                value="\n".join(
+                    f"{tier}: {created}件（満員 {filled / sized:.0%}）" if sized else f"{tier}: {created}件"
+                    for tier, created, sized, filled in summary.tiers[:6]
+                ),
+                inline=False
+            )
+        embed.set_footer(text=f"集計: {(time.perf_counter() - started) * 1000:.0f}ms")
+        await interaction.response.send_message(embed=embed, ephemeral=True)
+
+
+async def setup(bot):
+    await bot.add_cog(StatsCog(bot))
@@ -0,0 +1,42 @@
+import asyncio
+
+from utils.accounts import AccountStore
+
+ACCOUNT = {'puuid': 'p', 'gameName': 'Test', 'tagLine': 'JP1'}
+
+
+def test_link_and_unlink_are_batched_and_persisted(tmp_path):
+    path = str(tmp_path / 'accounts.sqlite3')
+
+    async def write():
+        store = AccountStore(path, flush_interval=60)
+        store.link(1, ACCOUNT)
+        store.link(2, dict(ACCOUNT, puuid='q'))
+        store.touch(2, 'tft')
+        store.unlink(1)
+        rows = store.conn.execute("SELECT COUNT(*) FROM linked_accounts").fetchone()[0]
+        await store.close()  # 未反映の更新は閉じる時に書き込む
+        return rows
+
+    rows_before_close = asyncio.run(write())
+    store = AccountStore(path)
+    try:
+        assert rows_before_close == 0  # イベントループ上ではcommitしない
+        assert store.get(1) is None
+        assert store.get(2).puuid == 'q'
+        assert store.get(2).last_mode == 'tft'
+    finally:
+        store.conn.close()
+
+
+def test_relink_replaces_account(tmp_path):
+    async def main():
+        store = AccountStore(str(tmp_path / 'accounts.sqlite3'), flush_interval=60)
+        store.link(1, ACCOUNT)
+        account = store.link(1, dict(ACCOUNT, puuid='q'))
+        await store.flush()
+        row = store.conn.execute("SELECT puuid FROM linked_accounts WHERE discord_id = 1").fetchone()
+        await store.close()
+        return account.riot_id, row
+
+    assert asyncio.run(main()) == ('Test#JP1', ('q',))
@@ -0,0 +1,204 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from utils.analytics import AnalyticsStore, bucket_seconds, fill_bucket, rank_tier
+
+GUILD = 1
+OTHER_GUILD = 2
+
+
+def run_store(tmp_path, record, **summary_kwargs):
+    """イベントを記録・書き込みした後の集計を返す"""
+    async def main():
+        store = AnalyticsStore(str(tmp_path / 'stats.sqlite3'), flush_interval=60, utc_offset_hours=9)
+        try:
+            await record(store)
+            await store.flush()
+            return await store.summary(GUILD, summary_kwargs.get('days', 7), summary_kwargs.get('game_mode'))
+        finally:
+            await store.close()
+
+    return asyncio.run(main())
+
+
+def record(store, event, game_mode='ranked', tier='GOLD', value=None, timestamp=None, guild_id=GUILD, sized=True):
+    size_label = 'Duo' if sized else 'Unlimited'
+    store.record(event, guild_id, game_mode, size_label, 'mid', tier, value, timestamp, sized=sized)
+
+
+def test_rank_tier():
+    assert rank_tier("GOLD II") == 'GOLD'
+    assert rank_tier("TFT DIAMOND I") == 'DIAMOND'
+    assert rank_tier("Unranked") == 'UNRANKED'
+    assert rank_tier(None) == 'UNRANKED'
+
+
+def test_fill_buckets():
+    assert fill_bucket(0) == 0  # 1秒未満は1秒として数える
+    assert fill_bucket(2) == 4  # 2倍ごとに4バケット
+    for seconds in (5, 60, 300, 3600):
+        assert bucket_seconds(fill_bucket(seconds)) == pytest.approx(seconds, rel=0.19)
+
+
+def test_totals_and_fill_rate(tmp_path):
+    async def events(store):
+        for _ in range(4):
+            record(store, 'created')
+        for _ in range(3):
+            record(store, 'joined')
+        record(store, 'filled', value=120)
+        record(store, 'reaped')
+        record(store, 'created', sized=False)  # 人数制限なしの募集は満員率の分母に含めない
+        record(store, 'created', guild_id=OTHER_GUILD)  # 他のサーバーは含まない
+
+    summary = run_store(tmp_path, events)
+    assert (summary.created, summary.created_sized, summary.joined, summary.filled, summary.reaped) == (5, 4, 3, 1, 1)
+    assert summary.fill_rate == pytest.approx(0.25)
+
+
+def test_no_fill_rate_for_unlimited_only(tmp_path):
+    async def events(store):
+        record(store, 'created', sized=False)
+
+    summary = run_store(tmp_path, events)
+    assert summary.created == 1
+    assert summary.fill_rate is None
+
+
+def test_rollups_accumulate_across_flushes(tmp_path):
+    """同じ時間帯の集計行は、書き込みのたびに加算される"""
+    async def events(store):
+        now = time.time()
+        record(store, 'created', timestamp=now)
+        await store.flush()
+        record(store, 'created', timestamp=now)
+        record(store, 'filled', value=30, timestamp=now)
+        await store.flush()
+        record(store, 'filled', value=30, timestamp=now)
+
+    summary = run_store(tmp_path, events)
+    assert summary.created == 2
+    assert summary.filled == 2
+    assert summary.median_fill_seconds == pytest.approx(30, rel=0.19)
+
+
+def test_rollup_rows_and_event_log(tmp_path):
+    async def main():
+        store = AnalyticsStore(str(tmp_path / 'stats.sqlite3'), flush_interval=60)
+        ts = 3600 * 500000 + 10
+        record(store, 'created', timestamp=ts)
+        record(store, 'created', tier='SILVER', timestamp=ts)
+        record(store, 'filled', value=60, timestamp=ts + 30)
+        record(store, 'created', timestamp=ts + 3600)  # 次の時間帯
+        await store.flush()
+        hourly = store.conn.execute(
+            "SELECT hour, tier, created, filled, fill_seconds FROM recruitment_hourly ORDER BY hour, tier"
+        ).fetchall()
+        fills = store.conn.execute("SELECT hour, bucket, count FROM recruitment_fill_hourly").fetchall()
+        events = store.conn.execute("SELECT COUNT(*) FROM recruitment_events").fetchone()[0]
+        await store.close()
+        return hourly, fills, events
+
+    hourly, fills, events = asyncio.run(main())
+    assert hourly == [
+        (500000, 'GOLD', 1, 1, 60.0),
+        (500000, 'SILVER', 1, 0, 0.0),
+        (500001, 'GOLD', 1, 0, 0.0),
+    ]
+    assert fills == [(500000, fill_bucket(60), 1)]
+    assert events == 4
+
+
+def test_median_fill_time(tmp_path):
+    async def events(store):
+        for seconds in (10, 20, 30, 600, 900):
+            record(store, 'filled', value=seconds)
+
+    summary = run_store(tmp_path, events)
+    assert summary.median_fill_seconds == pytest.approx(30, rel=0.19)
+
+
+def test_no_fill_time_without_filled_events(tmp_path):
+    async def events(store):
+        record(store, 'created')
+
+    summary = run_store(tmp_path, events)
+    assert summary.median_fill_seconds is None
+    assert summary.fill_rate == 0.0
+
+
+def test_peak_hours_use_utc_offset(tmp_path):
+    now = time.time()
+    busy = now - 3600  # 1時間前
+    quiet = now - 3 * 3600
+
+    async def events(store):
+        for _ in range(3):
+            record(store, 'created', timestamp=busy)
+        record(store, 'created', timestamp=quiet)
+
+    summary = run_store(tmp_path, events)
+    assert summary.peak_hours == [
+        ((int(busy // 3600) + 9) % 24, 3),
+        ((int(quiet // 3600) + 9) % 24, 1),
+    ]
+
+
+def test_tiers_and_mode_filter(tmp_path):
+    async def events(store):
+        record(store, 'created', tier='GOLD')
+        record(store, 'created', tier='GOLD')
+        record(store, 'filled', tier='GOLD', value=60)
+        record(store, 'created', tier='DIAMOND')
+        record(store, 'created', tier='DIAMOND', sized=False)
+        record(store, 'created', game_mode='tft', tier='GOLD')
+
+    summary = run_store(tmp_path, events, game_mode='ranked')
+    assert summary.created == 4
+    assert summary.tiers == [('GOLD', 2, 2, 1), ('DIAMOND', 2, 1, 0)]
+
+
+def test_summary_excludes_old_hours(tmp_path):
+    async def events(store):
+        record(store, 'created', timestamp=time.time() - 10 * 86400)
+        record(store, 'created')
+
+    assert run_store(tmp_path, events, days=7).created == 1
+
+
+def test_adds_created_sized_to_existing_rollups(tmp_path):
+    """列の追加前の集計表は、残っているイベントログから人数制限なしの募集を除いて埋める"""
+    path = str(tmp_path / 'stats.sqlite3')
+    hour = int(time.time() // 3600)
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE recruitment_events ("
+        "ts REAL, guild_id INTEGER, event TEXT, game_mode TEXT, size_label TEXT, role TEXT, tier TEXT, value REAL)"
+    )
+    conn.execute(
+        "CREATE TABLE recruitment_hourly ("
+        "guild_id INTEGER, hour INTEGER, game_mode TEXT, tier TEXT, "
+        "created INTEGER DEFAULT 0, joined INTEGER DEFAULT 0, filled INTEGER DEFAULT 0, reaped INTEGER DEFAULT 0, "
+        "fill_seconds REAL DEFAULT 0, PRIMARY KEY (guild_id, hour, game_mode, tier)) WITHOUT ROWID"
+    )
+    conn.executemany(
+        "INSERT INTO recruitment_events VALUES (?, ?, 'created', 'ranked', ?, 'mid', 'GOLD', NULL)",
+        [(hour * 3600 + 10, GUILD, 'Duo'), (hour * 3600 + 20, GUILD, 'Unlimited')]
+    )
+    conn.execute("INSERT INTO recruitment_hourly VALUES (?, ?, 'ranked', 'GOLD', 2, 0, 1, 0, 60)", (GUILD, hour))
+    conn.commit()
+    conn.close()
+
+    async def main():
+        store = AnalyticsStore(path, flush_interval=60)
+        try:
+            return await store.summary(GUILD, 1)
+        finally:
+            await store.close()
+
+    summary = asyncio.run(main())
+    assert (summary.created, summary.created_sized) == (2, 1)
+    assert summary.fill_rate == pytest.approx(1.0)
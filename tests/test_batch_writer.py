@@ -0,0 +1,55 @@
+import asyncio
+
+from utils.batch_writer import BatchWriter
+
+
+class Recorder:
+    """更新を溜め、書き込まれた内容を順に記録する"""
+
+    def __init__(self, flush_interval: float = 60):
+        self.pending = {}
+        self.written = []
+        self.batch = BatchWriter(self.take_pending, self.write, flush_interval)
+
+    def set(self, key, value):
+        self.pending[key] = value
+        self.batch.schedule()
+
+    def take_pending(self):
+        pending, self.pending = self.pending, {}
+        return (pending,)
+
+    def write(self, pending):
+        self.written.append(pending)
+
+
+def test_batches_updates_until_interval():
+    async def main():
+        recorder = Recorder(flush_interval=0.05)
+        recorder.set('a', 1)
+        recorder.set('a', 2)
+        recorder.set('b', 3)
+        before = list(recorder.written)
+        await asyncio.sleep(0.15)
+        return before, recorder.written
+
+    before, after = asyncio.run(main())
+    assert before == []
+    assert after == [{'a': 2, 'b': 3}]  # 1回の書き込みにまとめる
+
+
+def test_close_writes_pending_updates():
+    async def main():
+        recorder = Recorder()
+        recorder.set('a', 1)
+        await recorder.batch.close()
+        await recorder.batch.flush()  # 空なら書き込まない
+        return recorder.written
+
+    assert asyncio.run(main()) == [{'a': 1}]
+
+
+def test_writes_immediately_outside_event_loop():
+    recorder = Recorder()
+    recorder.set('a', 1)
+    assert recorder.written == [{'a': 1}]
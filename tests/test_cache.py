@@ -0,0 +1,104 @@
+import asyncio
+
+from utils.cache import MISSING, SQLiteBackend, TTLCache
+
+
+def test_get_and_set():
+    cache = TTLCache(maxsize=10)
+    assert cache.get('account:a') is MISSING
+    cache.set('account:a', {'puuid': 'p'}, 60)
+    assert cache.get('account:a') == {'puuid': 'p'}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_expired_entries_are_missing():
+    cache = TTLCache(maxsize=10)
+    cache.set('league:a', [], -1)
+    assert cache.get('league:a') is MISSING
+    assert cache.stats()['size'] == 0  # 期限切れの項目は参照時に削除する
+
+
+def test_negative_caching():
+    """見つからなかった結果（None）もMISSINGと区別して保持する"""
+    cache = TTLCache(maxsize=10)
+    cache.set('account:unknown#jp1', None, 60)
+    assert cache.get('account:unknown#jp1') is None
+    stats = cache.stats()
+    assert stats['hits'] == 1
+    assert stats['negative_hits'] == 1
+
+
+def test_lru_eviction():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    cache.get('a')  # aを最近使ったことにする
+    cache.set('c', 3, 60)
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_invalidate():
+    cache = TTLCache(maxsize=10)
+    cache.set('a', 1, 60)
+    cache.invalidate('a')
+    assert cache.get('a') is MISSING
+
+
+def test_sqlite_backend_persists_after_close(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+
+    async def write():
+        cache = TTLCache(maxsize=10, backend=SQLiteBackend(path, flush_interval=60))
+        cache.set('account:a', {'puuid': 'p'}, 60)
+        cache.set('account:missing', None, 60)
+        cache.set('account:b', {'puuid': 'q'}, 60)
+        cache.invalidate('account:b')
+        await cache.close()  # 未反映の書き込みは閉じる時に反映する
+
+    async def read():
+        cache = TTLCache(maxsize=10, backend=SQLiteBackend(path))
+        values = cache.get('account:a'), cache.get('account:missing'), cache.get('account:b')
+        await cache.close()
+        return values, cache.stats()['negative_hits']
+
+    asyncio.run(write())
+    (found, missing, deleted), negative_hits = asyncio.run(read())
+    assert found == {'puuid': 'p'}
+    assert missing is None
+    assert deleted is MISSING
+    assert negative_hits == 1
+
+
+def test_sqlite_backend_batches_writes(tmp_path):
+    async def main():
+        backend = SQLiteBackend(str(tmp_path / 'cache.sqlite3'), flush_interval=0.05)
+        cache = TTLCache(maxsize=1, backend=backend)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)  # aはメモリから追い出される
+        rows_before = backend.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        from_pending = cache.get('a')  # 未反映の書き込みから読める
+        await asyncio.sleep(0.2)
+        rows_after = backend.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        await cache.close()
+        return rows_before, from_pending, rows_after
+
+    rows_before, from_pending, rows_after = asyncio.run(main())
+    assert rows_before == 0
+    assert from_pending == 1
+    assert rows_after == 2
+
+
+def test_sqlite_backend_skips_expired_rows(tmp_path):
+    async def main():
+        backend = SQLiteBackend(str(tmp_path / 'cache.sqlite3'))
+        backend.set('a', 1, 0.0)  # 期限切れ
+        await backend.flush()
+        value = backend.get('a')
+        await backend.close()
+        return value
+
+    assert asyncio.run(main()) == (MISSING, 0.0)
@@ -0,0 +1,76 @@
+import pytest
+
+from utils.flow import (
+    FlowState, TEAM_SIZES, ROLE_CODES, STEP_ACCOUNT, STEP_SIZE, STEP_ROLE, STEP_TITLE,
+    encode_flow_id, decode_flow_id
+)
+
+PUUID = 'x' * 78  # PUUIDは78文字
+
+
+def assert_same_state(a: FlowState, b: FlowState):
+    assert (a.game_mode, a.puuid, a.size_index, a.role) == (b.game_mode, b.puuid, b.size_index, b.role)
+
+
+@pytest.mark.parametrize('game_mode', list(TEAM_SIZES))
+def test_round_trip_every_step(game_mode):
+    states = [
+        (STEP_ACCOUNT, FlowState(game_mode)),
+        (STEP_SIZE, FlowState(game_mode, PUUID, size_index=0)),
+        (STEP_ROLE, FlowState(game_mode, PUUID, size_index=len(TEAM_SIZES[game_mode]) - 1)),
+        (STEP_TITLE, FlowState(game_mode, PUUID, size_index=0, role='none')),
+    ]
+    for step, state in states:
+        custom_id = encode_flow_id(step, state)
+        assert len(custom_id) <= 100  # Discordのcustom_idの上限
+        decoded_step, decoded = decode_flow_id(custom_id)
+        assert decoded_step == step
+        assert_same_state(decoded, state)
+
+
+@pytest.mark.parametrize('role', list(ROLE_CODES))
+def test_round_trip_every_role(role):
+    state = FlowState('normal', PUUID, size_index=2, role=role)
+    _, decoded = decode_flow_id(encode_flow_id(STEP_TITLE, state))
+    assert decoded.role == role
+
+
+def test_encoded_format():
+    state = FlowState('ranked', 'abc', size_index=1, role='jungle')
+    assert encode_flow_id(STEP_TITLE, state) == 'rf:t:r1j:abc'
+    assert encode_flow_id(STEP_ACCOUNT, FlowState('tft')) == 'rf:a:t--:'
+
+
+def test_state_helpers():
+    state = FlowState('normal').with_puuid(PUUID).with_size(1).with_role('mid')
+    assert (state.puuid, state.size_index, state.role) == (PUUID, 1, 'mid')
+    assert state.size_label == 'Trio'
+    assert state.team_size == 3
+    unlimited = FlowState('ranked', PUUID, size_index=2)
+    assert unlimited.size_label == 'Unlimited'
+    assert unlimited.team_size is None
+
+
+@pytest.mark.parametrize('custom_id', [
+    'game_mode_select',  # フロー以外のコンポーネント
+    'rf:t:r0j',  # 区切りが足りない
+    'xx:t:r0j:' + PUUID,  # 接頭辞が違う
+    'rf:z:r0j:' + PUUID,  # 不明なステップ
+    'rf:t:r0:' + PUUID,  # 符号の長さが違う
+    'rf:t:q0j:' + PUUID,  # 不明なモード
+    'rf:t:r9j:' + PUUID,  # 人数の範囲外（ランクは3種類）
+    'rf:t:rxj:' + PUUID,  # 人数が数字でない
+    'rf:t:r0q:' + PUUID,  # 不明なロール
+    'rf:s:r0-:',  # サモナー名の入力後なのにPUUIDがない
+    'rf:r:r--:' + PUUID,  # ロール選択なのに人数がない
+    'rf:t:r0-:' + PUUID,  # タイトル入力なのにロールがない
+])
+def test_invalid_ids_decode_to_none(custom_id):
+    assert decode_flow_id(custom_id) is None
+
+
+def test_puuid_may_contain_separator():
+    """PUUIDは最後の項目なので、区切り文字を含んでいても復元できる"""
+    state = FlowState('ranked', 'a:b', size_index=0)
+    _, decoded = decode_flow_id(encode_flow_id(STEP_ROLE, state))
+    assert decoded.puuid == 'a:b'
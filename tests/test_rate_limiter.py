@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.rate_limiter import RateLimiter, RateLimitExceeded, TokenBucket, parse_rate_limits
+
+
+def test_parse_rate_limits():
+    assert parse_rate_limits("20:1,100:120") == [(20, 1), (100, 120)]
+    assert parse_rate_limits(" 20:1 , x:y, 5") == [(20, 1)]  # 不正な項目は無視する
+    assert parse_rate_limits(None) == []
+    assert parse_rate_limits("") == []
+
+
+def test_token_bucket_refills_over_window():
+    bucket = TokenBucket(2, 10)
+    now = time.monotonic()
+    assert bucket.delay(now) == 0.0
+    bucket.consume()
+    bucket.consume()
+    assert bucket.delay(now) == pytest.approx(5.0, abs=0.01)  # 1トークン = 10秒 / 2回
+    assert bucket.delay(now + 5.0) == 0.0
+
+
+def test_acquire_within_limit_does_not_wait():
+    async def main():
+        limiter = RateLimiter([(3, 60)], max_wait=1.0)
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire('jp1', 'league')
+        return time.monotonic() - started, limiter.total_requests
+
+    elapsed, requests = asyncio.run(main())
+    assert elapsed < 0.1
+    assert requests == 3
+
+
+def test_acquire_raises_when_wait_exceeds_max_wait():
+    async def main():
+        limiter = RateLimiter([(1, 60)], max_wait=1.0)
+        await limiter.acquire('jp1', 'league')
+        with pytest.raises(RateLimitExceeded) as excinfo:
+            await limiter.acquire('jp1', 'league')
+        return excinfo.value.wait
+
+    assert asyncio.run(main()) == pytest.approx(60.0, abs=0.1)
+
+
+def test_acquire_waits_for_next_token_and_reports_queue():
+    async def main():
+        limiter = RateLimiter([(1, 0.2)], max_wait=1.0)
+        await limiter.acquire('jp1', 'league')
+        started = time.monotonic()
+        waiter = asyncio.create_task(limiter.acquire('jp1', 'league'))
+        await asyncio.sleep(0.05)
+        queued = limiter.queued('jp1'), limiter.queued('asia')
+        await waiter
+        return queued, time.monotonic() - started, limiter.queued('jp1')
+
+    queued, elapsed, queued_after = asyncio.run(main())
+    assert queued == (1, 0)
+    assert 0.15 <= elapsed < 0.5
+    assert queued_after == 0
+
+
+def test_app_limit_is_shared_by_methods_and_regions_are_independent():
+    async def main():
+        limiter = RateLimiter([(1, 60)], max_wait=0.5)
+        await limiter.acquire('jp1', 'league')
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire('jp1', 'summoner')
+        await limiter.acquire('asia', 'account')
+
+    asyncio.run(main())
+
+
+def test_method_limits_from_headers():
+    async def main():
+        limiter = RateLimiter([(100, 1)], max_wait=0.5)
+        limiter.update_from_headers('jp1', 'league', {
+            'X-Method-Rate-Limit': '2:10',
+            'X-Method-Rate-Limit-Count': '2:10'  # サーバー側で既に使い切っている
+        })
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire('jp1', 'league')
+        await limiter.acquire('jp1', 'summoner')  # 他のメソッドには影響しない
+        return limiter.sustained_rate('jp1', 'league'), limiter.sustained_rate('jp1')
+
+    league_rate, app_rate = asyncio.run(main())
+    assert league_rate == pytest.approx(0.2)
+    assert app_rate == pytest.approx(100.0)
+
+
+def test_app_limit_headers_replace_defaults():
+    limiter = RateLimiter([(20, 1), (100, 120)])
+    limiter.update_from_headers('jp1', 'league', {'X-App-Rate-Limit': '500:10,30000:600'})
+    assert limiter.sustained_rate('jp1') == pytest.approx(50.0)
+    assert limiter.sustained_rate('asia') == pytest.approx(100 / 120)
+
+
+def test_penalize_scope():
+    async def main():
+        limiter = RateLimiter([(100, 1)], max_wait=0.5)
+        limiter.penalize('jp1', 'league', 30)
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire('jp1', 'league')
+        await limiter.acquire('jp1', 'summoner')  # メソッド単位の制限
+
+        limiter.penalize('jp1', 'league', 30, 'application')
+        with pytest.raises(RateLimitExceeded):
+            await limiter.acquire('jp1', 'summoner')  # アプリ全体の制限はリージョン全体を止める
+        await limiter.acquire('asia', 'account')
+        return limiter.throttled
+
+    assert asyncio.run(main()) == 2
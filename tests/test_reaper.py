@@ -0,0 +1,122 @@
+import asyncio
+
+from utils.reaper import DeadlineScheduler
+
+
+def run_scheduler(setup, wait: float = 0.15):
+    """スケジューラを動かし、setup(scheduler)の後にwait秒待って呼ばれたキーを順に返す"""
+    async def main():
+        fired = []
+
+        async def callback(key):
+            fired.append(key)
+
+        scheduler = DeadlineScheduler(callback)
+        scheduler.start()
+        try:
+            await setup(scheduler)
+            await asyncio.sleep(wait)
+        finally:
+            scheduler.stop()
+        return fired, len(scheduler)
+
+    return asyncio.run(main())
+
+
+def test_fires_in_deadline_order():
+    async def setup(scheduler):
+        scheduler.schedule('c', 0.06)
+        scheduler.schedule('a', 0.02)
+        scheduler.schedule('b', 0.04)
+
+    fired, remaining = run_scheduler(setup)
+    assert fired == ['a', 'b', 'c']
+    assert remaining == 0
+
+
+def test_reschedule_replaces_deadline():
+    async def setup(scheduler):
+        scheduler.schedule('vc', 0.02)
+        scheduler.schedule('vc', 0.5)  # 置き換え
+        assert 'vc' in scheduler
+        assert len(scheduler) == 1
+
+    fired, remaining = run_scheduler(setup)
+    assert fired == []
+    assert remaining == 1
+
+
+def test_cancel():
+    async def setup(scheduler):
+        scheduler.schedule('a', 0.02)
+        scheduler.schedule('b', 0.03)
+        scheduler.cancel('a')
+        scheduler.cancel('missing')  # 登録されていないキーは無視する
+        assert 'a' not in scheduler
+
+    fired, remaining = run_scheduler(setup)
+    assert fired == ['b']
+    assert remaining == 0
+
+
+def test_earlier_deadline_wakes_scheduler():
+    async def setup(scheduler):
+        scheduler.schedule('late', 10)
+        await asyncio.sleep(0.02)  # lateの期限まで眠っている状態にする
+        scheduler.schedule('early', 0.02)
+
+    fired, remaining = run_scheduler(setup, wait=0.1)
+    assert fired == ['early']
+    assert remaining == 1
+
+
+def test_negative_delay_fires_immediately():
+    async def setup(scheduler):
+        scheduler.schedule('overdue', -30)
+
+    fired, _ = run_scheduler(setup, wait=0.02)
+    assert fired == ['overdue']
+
+
+def test_callback_errors_do_not_stop_scheduler():
+    async def main():
+        fired = []
+
+        async def callback(key):
+            if key == 'broken':
+                raise RuntimeError("boom")
+            fired.append(key)
+
+        scheduler = DeadlineScheduler(callback)
+        scheduler.start()
+        scheduler.schedule('broken', 0.01)
+        scheduler.schedule('ok', 0.03)
+        await asyncio.sleep(0.1)
+        scheduler.stop()
+        return fired
+
+    assert asyncio.run(main()) == ['ok']
+
+
+def test_stop_cancels_running_callbacks():
+    async def main():
+        started = asyncio.Event()
+        cancelled = []
+
+        async def callback(key):
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(key)
+                raise
+
+        scheduler = DeadlineScheduler(callback)
+        scheduler.start()
+        scheduler.schedule('slow', 0)
+        await asyncio.wait_for(started.wait(), timeout=1.0)
+        scheduler.stop()
+        await asyncio.sleep(0.01)
+        return cancelled
+
+    assert asyncio.run(main()) == ['slow']
@@ -0,0 +1,196 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from utils import riot_api
+from utils.cache import MISSING, TTLCache
+from utils.rate_limiter import RateLimiter
+
+
+class FakeFetch:
+    """_get_jsonの代わり。releaseされるまで応答を止め、呼ばれた回数を数える"""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, region, method, path):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(riot_api, 'cache', TTLCache(maxsize=100))
+    monkeypatch.setattr(riot_api, '_inflight', {})
+
+
+def cached_get(key='puuid:a'):
+    return riot_api._cached_get('account', key, riot_api.REGION, 'account-v1.by-puuid', f"/riot/account/v1/accounts/by-puuid/{key}")
+
+
+def test_concurrent_lookups_share_one_fetch(fresh_cache, monkeypatch):
+    async def main():
+        fetch = FakeFetch(result={'puuid': 'a'})
+        monkeypatch.setattr(riot_api, '_get_json', fetch)
+        callers = [asyncio.create_task(cached_get()) for _ in range(5)]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        results = await asyncio.gather(*callers)
+        cached = await cached_get()  # 保存済みの結果を使う
+        return results, cached, fetch.calls, riot_api._inflight
+
+    results, cached, calls, inflight = asyncio.run(main())
+    assert results == [{'puuid': 'a'}] * 5
+    assert cached == {'puuid': 'a'}
+    assert calls == 1
+    assert inflight == {}
+
+
+def test_cancelled_caller_does_not_cancel_shared_fetch(fresh_cache, monkeypatch):
+    async def main():
+        fetch = FakeFetch(result={'puuid': 'a'})
+        monkeypatch.setattr(riot_api, '_get_json', fetch)
+        first = asyncio.create_task(cached_get())
+        second = asyncio.create_task(cached_get())
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return first.cancelled(), await second, fetch.calls
+
+    cancelled, result, calls = asyncio.run(main())
+    assert cancelled
+    assert result == {'puuid': 'a'}
+    assert calls == 1
+
+
+def test_fetch_completes_after_every_caller_is_cancelled(fresh_cache, monkeypatch):
+    async def main():
+        fetch = FakeFetch(result={'puuid': 'a'})
+        monkeypatch.setattr(riot_api, '_get_json', fetch)
+        caller = asyncio.create_task(cached_get())
+        await asyncio.sleep(0)
+        caller.cancel()
+        fetch.release.set()
+        await asyncio.sleep(0.01)
+        return riot_api.cache.get('account:puuid:a'), riot_api._inflight
+
+    cached, inflight = asyncio.run(main())
+    assert cached == {'puuid': 'a'}  # 取得結果は次の呼び出しのために保存される
+    assert inflight == {}
+
+
+def test_failure_reaches_every_waiter(fresh_cache, monkeypatch):
+    async def main():
+        fetch = FakeFetch(error=riot_api.RiotAPIError("down"))
+        monkeypatch.setattr(riot_api, '_get_json', fetch)
+        callers = [asyncio.create_task(cached_get()) for _ in range(3)]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        return results, fetch.calls, riot_api.cache.get('account:puuid:a'), riot_api._inflight
+
+    results, calls, cached, inflight = asyncio.run(main())
+    assert all(isinstance(result, riot_api.RiotAPIError) for result in results)
+    assert calls == 1
+    assert cached is MISSING  # 失敗は保存しない（次の呼び出しで取得し直す）
+    assert inflight == {}
+
+
+class RecordingLimiter(RateLimiter):
+    """penalizeの呼び出しを記録するRateLimiter"""
+
+    def __init__(self, limits=((100, 1),), max_wait=1.0):
+        super().__init__(list(limits), max_wait=max_wait)
+        self.penalties = []
+
+    def penalize(self, region, method, retry_after, limit_type=None):
+        self.penalties.append((region, method, retry_after, limit_type))
+        super().penalize(region, method, retry_after, limit_type)
+
+
+def run_against(responses, request, limiter, monkeypatch, max_retries=3):
+    """responses（(ステータス, ヘッダー)の一覧、最後のものを繰り返す）を返すローカルサーバーに対してrequest()を実行
+
+    (request()の結果または例外, サーバーが受けたリクエスト数) を返す。
+    """
+    async def main():
+        received = []
+
+        async def handler(http_request):
+            status, headers = responses[min(len(received), len(responses) - 1)]
+            received.append(http_request.path)
+            return web.json_response({'puuid': 'a'} if status == 200 else {}, status=status, headers=headers)
+
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', handler)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        monkeypatch.setitem(riot_api._BASE_URLS, riot_api.REGION, f"http://127.0.0.1:{port}")
+        monkeypatch.setattr(riot_api, 'API_KEY', 'test-key')
+        monkeypatch.setattr(riot_api, 'rate_limiter', limiter)
+        monkeypatch.setattr(riot_api, 'MAX_RETRIES', max_retries)
+        monkeypatch.setattr(riot_api, '_backoff', lambda attempt: 0.01)
+        try:
+            result = await request()
+        except Exception as e:
+            result = e
+        finally:
+            await riot_api.close_sessions()
+            await runner.cleanup()
+        return result, len(received)
+
+    return asyncio.run(main())
+
+
+def get_account():
+    return riot_api._get_json(riot_api.REGION, 'account-v1.by-puuid', '/riot/account/v1/accounts/by-puuid/a')
+
+
+def test_429_penalizes_with_retry_after_and_retries(fresh_cache, monkeypatch):
+    limiter = RecordingLimiter()
+    responses = [(429, {'Retry-After': '0.05', 'X-Rate-Limit-Type': 'method'}), (200, {})]
+    result, requests = run_against(responses, get_account, limiter, monkeypatch)
+    assert result == {'puuid': 'a'}
+    assert requests == 2
+    assert limiter.penalties == [(riot_api.REGION, 'account-v1.by-puuid', 0.05, 'method')]
+
+
+def test_429_without_retry_after_uses_backoff(fresh_cache, monkeypatch):
+    limiter = RecordingLimiter()
+    responses = [(429, {'X-Rate-Limit-Type': 'service'}), (200, {})]
+    result, _ = run_against(responses, get_account, limiter, monkeypatch)
+    assert result == {'puuid': 'a'}
+    assert limiter.penalties == [(riot_api.REGION, 'account-v1.by-puuid', 0.01, 'service')]
+
+
+def test_429_gives_up_after_max_retries(fresh_cache, monkeypatch):
+    limiter = RecordingLimiter()
+    responses = [(429, {'Retry-After': '0.01', 'X-Rate-Limit-Type': 'application'})]
+    result, requests = run_against(responses, get_account, limiter, monkeypatch, max_retries=2)
+    assert isinstance(result, riot_api.RiotRateLimitError)
+    assert requests == 3  # 最初の1回と再試行2回
+    assert len(limiter.penalties) == 3
+
+
+def test_queue_wait_over_limit_raises_rate_limit_error(fresh_cache, monkeypatch):
+    """順番待ちがmax_waitを超える場合は、リクエストを送らずにRiotRateLimitErrorにする"""
+    limiter = RecordingLimiter(limits=[(1, 60)], max_wait=0.05)
+
+    async def request_twice():
+        await get_account()
+        return await get_account()
+
+    result, requests = run_against([(200, {})], request_twice, limiter, monkeypatch)
+    assert isinstance(result, riot_api.RiotRateLimitError)
+    assert requests == 1
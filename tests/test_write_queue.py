@@ -0,0 +1,212 @@
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from utils.write_queue import WriteQueue
+
+
+def recorder(log, name, result=None):
+    async def job():
+        log.append(name)
+        return result
+    return job
+
+
+def not_found():
+    return discord.NotFound(SimpleNamespace(status=404, reason='Not Found'), 'Unknown Channel')
+
+
+def test_runs_writes_in_submission_order():
+    async def main():
+        writes = WriteQueue()
+        log = []
+        futures = [writes.submit('vc_delete', recorder(log, n, n)) for n in range(3)]
+        return await asyncio.gather(*futures), log
+
+    results, log = asyncio.run(main())
+    assert results == [0, 1, 2]
+    assert log == [0, 1, 2]
+
+
+def test_coalesces_pending_writes_with_same_key():
+    async def main():
+        writes = WriteQueue()
+        log = []
+        first = writes.submit('message_edit', recorder(log, 'old', 'old'), key=1)
+        second = writes.submit('message_edit', recorder(log, 'new', 'new'), key=1)
+        other = writes.submit('message_edit', recorder(log, 'other'), key=2)
+        await asyncio.gather(first, other)
+        return first is second, first.result(), log, writes.stats()
+
+    same, result, log, stats = asyncio.run(main())
+    assert same  # 同じFutureを返す
+    assert result == 'new'  # 最後に依頼された内容だけを実行する
+    assert log == ['new', 'other']
+    assert stats == {'backlog': 0, 'coalesced': 1}
+
+
+def test_key_is_not_coalesced_once_running():
+    async def main():
+        writes = WriteQueue()
+        log = []
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(0.02)
+            log.append('first')
+
+        first = writes.submit('message_edit', slow, key=1)
+        await started.wait()
+        second = writes.submit('message_edit', recorder(log, 'second'), key=1)
+        await asyncio.gather(first, second)
+        return first is second, log
+
+    same, log = asyncio.run(main())
+    assert not same
+    assert log == ['first', 'second']
+
+
+def test_foreground_defers_background_writes():
+    async def main():
+        writes = WriteQueue(max_defer=1.0)
+        log = []
+        with writes.foreground():
+            deferred = writes.submit('vc_delete', recorder(log, 'delete'))
+            urgent = writes.submit('vc_create', recorder(log, 'create'), defer=False)
+            await urgent  # 応答に必要な書き込みは待たせない
+            await asyncio.sleep(0.02)
+            during = list(log)
+            backlog = writes.backlog()
+        await deferred
+        return during, log, backlog
+
+    during, log, backlog = asyncio.run(main())
+    assert during == ['create']
+    assert backlog == {'vc_delete': 1, 'vc_create': 0}
+    assert log == ['create', 'delete']
+
+
+def test_deferral_is_bounded_by_max_defer():
+    async def main():
+        writes = WriteQueue(max_defer=0.05)
+        log = []
+        with writes.foreground():
+            future = writes.submit('vc_delete', recorder(log, 'delete'))
+            await asyncio.wait_for(future, timeout=1.0)  # 応答が続いても後回しにし続けない
+            return log
+
+    assert asyncio.run(main()) == ['delete']
+
+
+def test_retries_with_backoff():
+    async def main():
+        writes = WriteQueue(max_retries=3, backoff=0.001)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise discord.DiscordServerError(SimpleNamespace(status=503, reason='Unavailable'), 'down')
+            return 'ok'
+
+        return await writes.submit('vc_delete', flaky), len(attempts)
+
+    assert asyncio.run(main()) == ('ok', 3)
+
+
+def test_gives_up_after_max_retries():
+    async def main():
+        writes = WriteQueue(max_retries=2, backoff=0.001)
+        attempts = []
+
+        async def broken():
+            attempts.append(1)
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await writes.submit('vc_delete', broken)
+        return len(attempts)
+
+    assert asyncio.run(main()) == 3
+
+
+def test_not_found_is_not_retried():
+    async def main():
+        writes = WriteQueue(backoff=0.001)
+        attempts = []
+
+        async def gone():
+            attempts.append(1)
+            raise not_found()
+
+        with pytest.raises(discord.NotFound):
+            await writes.submit('vc_delete', gone)
+        return len(attempts)
+
+    assert asyncio.run(main()) == 1
+
+
+def test_flush_waits_for_backlog_even_in_foreground():
+    async def main():
+        writes = WriteQueue(max_defer=10.0)
+        log = []
+        with writes.foreground():
+            for n in range(3):
+                writes.submit('message_edit', recorder(log, n), key=n)
+            await writes.flush(timeout=1.0)
+        return log, writes.backlog()
+
+    log, backlog = asyncio.run(main())
+    assert log == [0, 1, 2]
+    assert backlog == {'message_edit': 0}
+
+
+def test_buckets_do_not_wait_for_each_other():
+    """チャンネルが違うメッセージの編集は、同じルートでも並行して実行する"""
+    async def main():
+        writes = WriteQueue(concurrency=2)
+        log = []
+        release = asyncio.Event()
+
+        async def blocked():
+            await release.wait()
+            log.append('channel 1')
+
+        first = writes.submit('message_edit', blocked, key=10, bucket=1)
+        second = writes.submit('message_edit', recorder(log, 'channel 2'), key=20, bucket=2)
+        await asyncio.wait_for(second, timeout=1.0)
+        during = list(log)
+        backlog = writes.backlog()
+        release.set()
+        await first
+        return during, backlog, writes.backlog()
+
+    during, backlog, after = asyncio.run(main())
+    assert during == ['channel 2']
+    assert backlog == {'message_edit': 0}  # 実行中のものは数えない
+    assert after == {'message_edit': 0}  # 空になったバケットは捨ててもルートは残す
+
+
+def test_backoff_does_not_hold_concurrency_slot():
+    """再試行を待つ間は、他の書き込みに同時実行数の枠を譲る"""
+    async def main():
+        writes = WriteQueue(concurrency=1, max_retries=1, backoff=0.2)
+        log = []
+
+        async def flaky():
+            log.append('flaky')
+            if log.count('flaky') == 1:
+                raise discord.DiscordServerError(SimpleNamespace(status=503, reason='Unavailable'), 'down')
+            return 'ok'
+
+        retried = writes.submit('vc_delete', flaky, bucket=1)
+        other = writes.submit('vc_delete', recorder(log, 'other'), bucket=2)
+        await asyncio.wait_for(other, timeout=0.09)  # 最短のバックオフ（0.1秒）より先に終わる
+        return await retried, log
+
+    result, log = asyncio.run(main())
+    assert result == 'ok'
+    assert log == ['flaky', 'other', 'flaky']
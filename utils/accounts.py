@@ -0,0 +1,135 @@
+import os
+import sqlite3
+import time
+from typing import Optional, Dict, List, Tuple
+
+from utils.batch_writer import BatchWriter
+
+_COLUMNS = ('discord_id', 'puuid', 'game_name', 'tag_line', 'last_mode', 'linked_at', 'last_active')
+
+
+class LinkedAccount:
+    """Discordユーザーと連携したRiotアカウント"""
+
+    __slots__ = _COLUMNS
+
+    def __init__(
+        self,
+        discord_id: int,
+        puuid: str,
+        game_name: str,
+        tag_line: str,
+        last_mode: str = 'ranked',
+        linked_at: Optional[float] = None,
+        last_active: Optional[float] = None
+    ):
+        self.discord_id = discord_id
+        self.puuid = puuid
+        self.game_name = game_name
+        self.tag_line = tag_line
+        self.last_mode = last_mode  # 最後に募集したゲームモード（先読みするキューの判定に使う）
+        self.linked_at = linked_at if linked_at is not None else time.time()
+        self.last_active = last_active if last_active is not None else self.linked_at
+
+    @property
+    def riot_id(self) -> str:
+        return f"{self.game_name}#{self.tag_line}"
+
+    def account_info(self) -> Dict[str, str]:
+        """get_summoner_by_riot_idの結果と同じ形式（募集作成の流れにそのまま渡せる）"""
+        return {'puuid': self.puuid, 'gameName': self.game_name, 'tagLine': self.tag_line}
+
+
+class AccountStore:
+    """連携済みアカウントをSQLiteに保存する（件数が少ないため起動時にすべて読み込む）
+
+    連携・解除・最終利用時刻の更新はメモリ上で行い、一定間隔でまとめて別スレッドから書き込む。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS linked_accounts ("
+            "discord_id INTEGER PRIMARY KEY, puuid TEXT NOT NULL, game_name TEXT, tag_line TEXT, "
+            "last_mode TEXT, linked_at REAL, last_active REAL)"
+        )
+        self.conn.commit()
+        rows = self.conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM linked_accounts").fetchall()
+        self._accounts: Dict[int, LinkedAccount] = {row[0]: LinkedAccount(*row) for row in rows}
+        self._pending: Dict[int, Optional[Tuple]] = {}  # ユーザーID: 行（Noneなら削除）
+        self._batch = BatchWriter(self._take_pending, self._write, flush_interval)
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def get(self, discord_id: int) -> Optional[LinkedAccount]:
+        return self._accounts.get(discord_id)
+
+    def link(self, discord_id: int, account_info: dict) -> LinkedAccount:
+        """アカウントを連携（既に連携済みなら置き換える）"""
+        account = LinkedAccount(discord_id, account_info['puuid'], account_info['gameName'], account_info['tagLine'])
+        self._accounts[discord_id] = account
+        self._save(account)
+        return account
+
+    def unlink(self, discord_id: int) -> bool:
+        """連携を解除して保存済みの情報を削除"""
+        if self._accounts.pop(discord_id, None) is None:
+            return False
+        self._pending[discord_id] = None
+        self._batch.schedule()
+        return True
+
+    def touch(self, discord_id: int, game_mode: Optional[str] = None) -> Optional[LinkedAccount]:
+        """最終利用時刻を更新（連携していなければ何もしない）"""
+        account = self._accounts.get(discord_id)
+        if account is None:
+            return None
+        account.last_active = time.time()
+        if game_mode:
+            account.last_mode = game_mode
+        self._save(account)
+        return account
+
+    def active_since(self, since: float) -> List[LinkedAccount]:
+        """指定時刻以降に利用したアカウント（最近利用した順）"""
+        accounts = [a for a in self._accounts.values() if a.last_active >= since]
+        accounts.sort(key=lambda a: a.last_active, reverse=True)
+        return accounts
+
+    # --- 書き込み（まとめて反映） ---
+
+    def _save(self, account: LinkedAccount):
+        self._pending[account.discord_id] = tuple(getattr(account, c) for c in _COLUMNS)
+        self._batch.schedule()
+
+    def _take_pending(self) -> Tuple[Dict[int, Optional[Tuple]]]:
+        pending, self._pending = self._pending, {}
+        return (pending,)
+
+    async def flush(self):
+        """溜まっている更新を別スレッドでまとめて書き込む"""
+        await self._batch.flush()
+
+    def _write(self, pending: Dict[int, Optional[Tuple]]):
+        if not pending:
+            return
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO linked_accounts ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' for _ in _COLUMNS)})",
+                [row for row in pending.values() if row is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM linked_accounts WHERE discord_id = ?",
+                [(discord_id,) for discord_id, row in pending.items() if row is None]
+            )
+
+    async def close(self):
+        """未反映の更新を書き込んでから閉じる"""
+        await self._batch.close()
+        self.conn.close()
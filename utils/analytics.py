@@ -0,0 +1,223 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, List, Tuple
+
+from utils.batch_writer import BatchWriter
+from utils.helper import RANK_TIERS
+
+EVENTS = ('created', 'joined', 'filled', 'reaped')
+
+# 満員までの時間は対数のバケットで数える（1バケットは2の1/4乗倍、中央値の誤差は約±9%）
+FILL_BUCKETS_PER_DOUBLING = 4
+
+# created_sizedは人数の決まった募集の作成数（人数制限なしの募集は満員にならないため、満員率の分母に含めない）
+_ROLLUP_COLUMNS = ('created', 'created_sized', 'joined', 'filled', 'reaped', 'fill_seconds')
+
+
+def rank_tier(rank_display: Optional[str]) -> str:
+    """"GOLD II" や "TFT GOLD II" 形式の表示からティアを取り出す（なければUNRANKED）"""
+    for word in (rank_display or '').split():
+        if word in RANK_TIERS:
+            return word
+    return 'UNRANKED'
+
+
+def fill_bucket(seconds: float) -> int:
+    return int(math.floor(math.log2(max(seconds, 1.0)) * FILL_BUCKETS_PER_DOUBLING))
+
+
+def bucket_seconds(bucket: int) -> float:
+    """バケットの代表値（範囲の中央）"""
+    return 2 ** ((bucket + 0.5) / FILL_BUCKETS_PER_DOUBLING)
+
+
+class StatsSummary:
+    """/statsで表示する集計結果"""
+
+    __slots__ = ('created', 'created_sized', 'joined', 'filled', 'reaped', 'median_fill_seconds', 'peak_hours', 'tiers')
+
+    def __init__(self):
+        self.created = 0
+        self.created_sized = 0  # 人数の決まった募集の作成数
+        self.joined = 0
+        self.filled = 0
+        self.reaped = 0
+        self.median_fill_seconds: Optional[float] = None
+        self.peak_hours: List[Tuple[int, int]] = []  # (時刻, 作成数)
+        self.tiers: List[Tuple[str, int, int, int]] = []  # (ティア, 作成数, 人数の決まった募集の作成数, 満員数)
+
+    @property
+    def fill_rate(self) -> Optional[float]:
+        """人数の決まった募集のうち満員になった割合"""
+        return self.filled / self.created_sized if self.created_sized else None
+
+
+class AnalyticsStore:
+    """募集の作成・参加・満員・終了のイベントを記録し、1時間ごとの集計を更新し続ける
+
+    イベントはメモリ上に溜め、一定間隔で別スレッドからイベントログと集計表にまとめて書き込む。
+    集計はサーバー・時刻（1時間単位）・モード・ティアごとの件数と、満員までの時間のバケット。
+    /statsの問い合わせは集計表だけを読み、イベントログは走査しない。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 10.0, retention_days: float = 90.0, utc_offset_hours: int = 9):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.retention = retention_days * 24 * 60 * 60  # イベントログを残す秒数（集計は残す）
+        self.utc_offset_hours = utc_offset_hours  # ピーク時間帯を表示する時差
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recruitment_events ("
+            "ts REAL, guild_id INTEGER, event TEXT, game_mode TEXT, size_label TEXT, role TEXT, tier TEXT, value REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS recruitment_events_ts ON recruitment_events (ts)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recruitment_hourly ("
+            "guild_id INTEGER, hour INTEGER, game_mode TEXT, tier TEXT, "
+            "created INTEGER DEFAULT 0, created_sized INTEGER DEFAULT 0, joined INTEGER DEFAULT 0, "
+            "filled INTEGER DEFAULT 0, reaped INTEGER DEFAULT 0, fill_seconds REAL DEFAULT 0, "
+            "PRIMARY KEY (guild_id, hour, game_mode, tier)) WITHOUT ROWID"
+        )
+        self._add_created_sized()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recruitment_fill_hourly ("
+            "guild_id INTEGER, hour INTEGER, game_mode TEXT, bucket INTEGER, count INTEGER DEFAULT 0, "
+            "PRIMARY KEY (guild_id, hour, game_mode, bucket)) WITHOUT ROWID"
+        )
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._pending_events: List[Tuple] = []
+        self._pending_rollups: Dict[Tuple, List[float]] = {}  # (サーバー, 時刻, モード, ティア): 各列の増分
+        self._pending_fills: Dict[Tuple, int] = {}  # (サーバー, 時刻, モード, バケット): 件数
+        self._batch = BatchWriter(self._take_pending, self._write, flush_interval)
+        self._pruned_at = 0.0
+
+    def _add_created_sized(self):
+        """created_sized列の追加前に作成した集計表に列を追加し、残っているイベントログから値を埋める"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(recruitment_hourly)")}
+        if 'created_sized' in columns:
+            return
+        self.conn.execute("ALTER TABLE recruitment_hourly ADD COLUMN created_sized INTEGER DEFAULT 0")
+        # イベントログを削除済みの時間帯は、人数制限なしの募集を区別できないため作成数をそのまま使う
+        self.conn.execute(
+            "UPDATE recruitment_hourly SET created_sized = created - ("
+            "SELECT COUNT(*) FROM recruitment_events e WHERE e.event = 'created' AND e.size_label = 'Unlimited' "
+            "AND e.guild_id = recruitment_hourly.guild_id AND CAST(e.ts / 3600 AS INTEGER) = recruitment_hourly.hour "
+            "AND e.game_mode = recruitment_hourly.game_mode AND e.tier = recruitment_hourly.tier)"
+        )
+
+    # --- 記録（メモリ上の更新のみ） ---
+
+    def record(
+        self,
+        event: str,
+        guild_id: int,
+        game_mode: str,
+        size_label: str,
+        role: str,
+        tier: str,
+        value: Optional[float] = None,
+        timestamp: Optional[float] = None,
+        sized: bool = True
+    ):
+        """イベントを記録（filledのvalueは満員までの秒数、sizedは人数の決まった募集か）"""
+        ts = timestamp if timestamp is not None else time.time()
+        hour = int(ts // 3600)
+        self._pending_events.append((ts, guild_id, event, game_mode, size_label, role, tier, value))
+        deltas = self._pending_rollups.setdefault((guild_id, hour, game_mode, tier), [0, 0, 0, 0, 0, 0.0])
+        deltas[_ROLLUP_COLUMNS.index(event)] += 1
+        if event == 'created' and sized:
+            deltas[_ROLLUP_COLUMNS.index('created_sized')] += 1
+        if event == 'filled' and value is not None:
+            deltas[_ROLLUP_COLUMNS.index('fill_seconds')] += value
+            key = (guild_id, hour, game_mode, fill_bucket(value))
+            self._pending_fills[key] = self._pending_fills.get(key, 0) + 1
+        self._batch.schedule()
+
+    def _take_pending(self):
+        pending = self._pending_events, self._pending_rollups, self._pending_fills
+        self._pending_events, self._pending_rollups, self._pending_fills = [], {}, {}
+        return pending
+
+    async def flush(self):
+        """溜まっているイベントを別スレッドでまとめて書き込む"""
+        await self._batch.flush()
+
+    def _write(self, events: List[Tuple], rollups: Dict[Tuple, List[float]], fills: Dict[Tuple, int]):
+        if not events:
+            return
+        columns = ', '.join(_ROLLUP_COLUMNS)
+        updates = ', '.join(f"{column} = {column} + excluded.{column}" for column in _ROLLUP_COLUMNS)
+        placeholders = ', '.join('?' for _ in range(4 + len(_ROLLUP_COLUMNS)))
+        with self._lock, self.conn:
+            self.conn.executemany("INSERT INTO recruitment_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", events)
+            self.conn.executemany(
+                f"INSERT INTO recruitment_hourly (guild_id, hour, game_mode, tier, {columns}) VALUES ({placeholders}) "
+                f"ON CONFLICT (guild_id, hour, game_mode, tier) DO UPDATE SET {updates}",
+                [key + tuple(deltas) for key, deltas in rollups.items()]
+            )
+            self.conn.executemany(
+                "INSERT INTO recruitment_fill_hourly (guild_id, hour, game_mode, bucket, count) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (guild_id, hour, game_mode, bucket) DO UPDATE SET count = count + excluded.count",
+                [key + (count,) for key, count in fills.items()]
+            )
+            # 古いイベントログを1時間に1回削除（集計表は残す）
+            now = time.time()
+            if now - self._pruned_at > 3600:
+                self.conn.execute("DELETE FROM recruitment_events WHERE ts < ?", (now - self.retention,))
+                self._pruned_at = now
+
+    # --- 問い合わせ（集計表のみを読む） ---
+
+    async def summary(self, guild_id: int, days: float, game_mode: Optional[str] = None) -> StatsSummary:
+        """直近days日間の集計（未書き込みのイベントは含まない）"""
+        return await asyncio.to_thread(self._summary, guild_id, int((time.time() - days * 86400) // 3600), game_mode)
+
+    def _summary(self, guild_id: int, since_hour: int, game_mode: Optional[str]) -> StatsSummary:
+        where = "guild_id = ? AND hour >= ?" + (" AND game_mode = ?" if game_mode else "")
+        params = (guild_id, since_hour) + ((game_mode,) if game_mode else ())
+        result = StatsSummary()
+        with self._lock:
+            totals = self.conn.execute(
+                f"SELECT SUM(created), SUM(created_sized), SUM(joined), SUM(filled), SUM(reaped) "
+                f"FROM recruitment_hourly WHERE {where}",
+                params
+            ).fetchone()
+            hours = self.conn.execute(
+                f"SELECT (hour + ?) % 24 AS hour_of_day, SUM(created) AS total FROM recruitment_hourly WHERE {where} "
+                "GROUP BY hour_of_day HAVING total > 0 ORDER BY total DESC LIMIT 3",
+                (self.utc_offset_hours,) + params
+            ).fetchall()
+            tiers = self.conn.execute(
+                f"SELECT tier, SUM(created) AS total, SUM(created_sized), SUM(filled) FROM recruitment_hourly WHERE {where} "
+                "GROUP BY tier HAVING total > 0 ORDER BY total DESC",
+                params
+            ).fetchall()
+            buckets = self.conn.execute(
+                f"SELECT bucket, SUM(count) FROM recruitment_fill_hourly WHERE {where} GROUP BY bucket ORDER BY bucket",
+                params
+            ).fetchall()
+        result.created, result.created_sized, result.joined, result.filled, result.reaped = (value or 0 for value in totals)
+        result.peak_hours = [(hour, total) for hour, total in hours]
+        result.tiers = [(tier, created, sized or 0, filled) for tier, created, sized, filled in tiers]
+        # バケットの累積から中央値を求める
+        count = sum(n for _, n in buckets)
+        seen = 0
+        for bucket, n in buckets:
+            seen += n
+            if seen * 2 >= count:
+                result.median_fill_seconds = bucket_seconds(bucket)
+                break
+        return result
+
+    async def close(self):
+        """未反映のイベントを書き込んでから閉じる"""
+        await self._batch.close()
+        self.conn.close()
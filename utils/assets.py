@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+from typing import Optional, Dict
+
+import aiohttp
+
+from utils.helper import RANK_IMAGE_URLS
+
+logger = logging.getLogger(__name__)
+
+# ランクの紋章はDDragonに含まれないため、CommunityDragonの最新版を使用する
+RANK_CREST_URL = 'https://raw.communitydragon.org/latest/plugins/rcp-fe-lol-static-assets/global/default/images/ranked-emblem/emblem-{tier}.png'
+RANK_TIERS = [tier for tier in RANK_IMAGE_URLS if tier != 'UNRANKED']
+
+
+class AssetCache:
+    """DDragonのバージョンごとにランク紋章の画像をローカルに保存する
+
+    ファイルは内容のSHA-256をファイル名として blobs/ に1つだけ保存し、
+    バージョンごとの manifest.json から参照する。古いバージョンは gc() で削除する。
+    """
+
+    def __init__(self, root: str, keep_versions: int = 2, timeout: float = 10.0):
+        self.root = root
+        self.keep_versions = keep_versions
+        self.timeout = timeout
+        self.version: Optional[str] = None
+        self._manifest: Dict[str, str] = {}  # アセット名: SHA-256
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._downloads: Dict[str, asyncio.Task] = {}  # 同じアセットの同時ダウンロードをまとめる
+        self._manifest_lock = asyncio.Lock()  # manifest.jsonの書き込みを1つずつ行う
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+    @property
+    def blob_dir(self) -> str:
+        return os.path.join(self.root, 'blobs')
+
+    def _version_dir(self, version: str) -> str:
+        return os.path.join(self.root, 'versions', version)
+
+    def _session_for(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    # --- バージョンの準備 ---
+
+    async def prepare(self, version: str):
+        """指定バージョンのランク紋章を揃え、古いバージョンを削除"""
+        self._manifest = await asyncio.to_thread(self._read_manifest, version)
+        self.version = version
+        await asyncio.gather(
+            *(self._ensure(f"rank/{tier}", RANK_CREST_URL.format(tier=tier.lower())) for tier in RANK_TIERS)
+        )
+        removed = await asyncio.to_thread(self.gc)
+        logger.info("アセットを準備しました", extra={'version': version, 'assets': len(self._manifest), 'removed': removed})
+
+    def _read_manifest(self, version: str) -> Dict[str, str]:
+        try:
+            with open(os.path.join(self._version_dir(version), 'manifest.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self, version: str, manifest: Dict[str, str]):
+        directory = self._version_dir(version)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'manifest.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(path + '.tmp', path)
+
+    async def _ensure(self, name: str, url: str) -> Optional[str]:
+        """アセットがなければダウンロードして、保存先のパスを返す"""
+        digest = self._manifest.get(name)
+        if digest and os.path.exists(self._blob_path(digest)):
+            return self._blob_path(digest)
+        task = self._downloads.get(name)
+        if task is None:
+            task = asyncio.create_task(self._download(name, url))
+            self._downloads[name] = task
+            task.add_done_callback(lambda _: self._downloads.pop(name, None))
+        return await asyncio.shield(task)
+
+    async def _download(self, name: str, url: str) -> Optional[str]:
+        try:
+            async with self._session_for().get(url) as response:
+                if response.status != 200:
+                    logger.warning("アセットの取得に失敗しました", extra={'asset': name, 'status': response.status})
+                    return None
+                data = await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning("アセットの取得に失敗しました", extra={'asset': name, 'error': repr(e)})
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        await asyncio.to_thread(self._write_blob, path, data)
+        self._manifest[name] = digest
+        if self.version is not None:
+            async with self._manifest_lock:
+                await asyncio.to_thread(self._write_manifest, self.version, dict(self._manifest))
+        return path
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blob_dir, digest)
+
+    @staticmethod
+    def _write_blob(path: str, data: bytes):
+        if os.path.exists(path):
+            return  # 同じ内容のファイルが既にある
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def gc(self) -> int:
+        """新しい順にkeep_versions件を残してバージョンを削除し、どこからも参照されないファイルを消す"""
+        versions_dir = os.path.join(self.root, 'versions')
+        if not os.path.isdir(versions_dir):
+            return 0
+        versions = sorted(os.listdir(versions_dir), key=_version_key, reverse=True)
+        keep = set(versions[:self.keep_versions])
+        if self.version:
+            keep.add(self.version)
+        for version in versions:
+            if version not in keep:
+                shutil.rmtree(self._version_dir(version), ignore_errors=True)
+
+        referenced = set(self._manifest.values())
+        for version in keep:
+            referenced.update(self._read_manifest(version).values())
+        removed = 0
+        for filename in os.listdir(self.blob_dir):
+            if filename not in referenced:
+                os.remove(os.path.join(self.blob_dir, filename))
+                removed += 1
+        return removed
+
+    # --- 参照 ---
+
+    def rank_crest(self, tier: str) -> Optional[Dict[str, str]]:
+        """ランク紋章のローカルパスとハッシュ（未取得ならNone）"""
+        digest = self._manifest.get(f"rank/{tier.upper()}")
+        if not digest:
+            return None
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            return None
+        return {'path': path, 'sha256': digest}
+
+
+def _version_key(version: str):
+    """"14.10.1" を数値として比較できる形に変換"""
+    return tuple(int(part) if part.isdigit() else 0 for part in version.split('.'))
@@ -0,0 +1,51 @@
+import asyncio
+from typing import Callable, Optional, Tuple
+
+
+class BatchWriter:
+    """メモリ上に溜めた更新を、一定間隔で別スレッドからまとめて書き込む
+
+    take_pendingは溜まっている更新を取り出して空にし、writeの引数のタプルを返す（すべて空なら書き込まない）。
+    writeは別スレッドで呼ばれるため、イベントループ上ではcommitしない。
+    書き込みは1つずつ行い、依頼された順序を保つ。
+    """
+
+    def __init__(self, take_pending: Callable[[], Tuple], write: Callable[..., None], flush_interval: float):
+        self.take_pending = take_pending
+        self.write = write
+        self.flush_interval = flush_interval
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def schedule(self):
+        """flush_interval秒後の書き込みを予約（予約済みなら何もしない）"""
+        if self._flush_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # イベントループ外（終了処理中など）は即座に書き込む
+            self.write(*self.take_pending())
+            return
+        self._flush_handle = loop.call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self._flush_task = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        """溜まっている更新を別スレッドでまとめて書き込む"""
+        async with self._flush_lock:  # 書き込み順序を保つ
+            pending = self.take_pending()
+            if any(pending):
+                await asyncio.to_thread(self.write, *pending)
+
+    async def close(self):
+        """予約を取り消し、実行中の書き込みを待ってから未反映の更新を書き込む"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
@@ -0,0 +1,164 @@
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import Optional, Any, Dict, Tuple
+
+from utils.batch_writer import BatchWriter
+
+MISSING = object()  # キャッシュに存在しないことを表す（Noneは「見つからなかった」結果として保存される）
+
+
+class SQLiteBackend:
+    """再起動後もキャッシュを保持するためのSQLiteバックエンド
+
+    書き込みはメモリ上にまとめておき、一定間隔で別スレッドから書き込み用の接続でまとめて反映する
+    （イベントループ上ではcommitしない）。読み込みは未反映の書き込みを先に確認する。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)  # 読み込み用（イベントループ上）
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self.conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        self.conn.commit()
+        # 書き込み用（別スレッド）。WALなので書き込み中も読み込み用の接続は待たされない
+        self.writer = sqlite3.connect(path, check_same_thread=False)
+        self.writer.execute("PRAGMA synchronous=NORMAL")
+        self._pending: Dict[str, Optional[Tuple[str, float]]] = {}  # key: (JSON, 期限)（Noneなら削除）
+        self._batch = BatchWriter(self._take_pending, self._write, flush_interval)
+
+    def get(self, key: str) -> Tuple[Any, float]:
+        now = time.time()
+        if key in self._pending:
+            entry = self._pending[key]
+            if entry is None or entry[1] <= now:
+                return MISSING, 0.0
+            return json.loads(entry[0]), entry[1]
+        row = self.conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if row is None:
+            return MISSING, 0.0
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value: Any, expires_at: float):
+        self._pending[key] = (json.dumps(value, ensure_ascii=False), expires_at)
+        self._batch.schedule()
+
+    def delete(self, key: str):
+        self._pending[key] = None
+        self._batch.schedule()
+
+    def _take_pending(self) -> Tuple[Dict[str, Optional[Tuple[str, float]]]]:
+        pending, self._pending = self._pending, {}
+        return (pending,)
+
+    async def flush(self):
+        """溜まっている書き込みを別スレッドでまとめて反映する"""
+        await self._batch.flush()
+
+    def _write(self, pending: Dict[str, Optional[Tuple[str, float]]]):
+        if not pending:
+            return
+        with self.writer:
+            self.writer.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                [(key, entry[0], entry[1]) for key, entry in pending.items() if entry is not None]
+            )
+            self.writer.executemany(
+                "DELETE FROM cache WHERE key = ?",
+                [(key,) for key, entry in pending.items() if entry is None]
+            )
+
+    async def close(self):
+        """未反映の書き込みを反映してから閉じる"""
+        await self._batch.close()
+        self.writer.close()
+        self.conn.close()
+
+
+class TTLCache:
+    """有効期限付きのLRUキャッシュ（上限を超えたら最も古く使われたものから削除）"""
+
+    def __init__(self, maxsize: int = 5000, backend: Optional[SQLiteBackend] = None):
+        self.maxsize = maxsize
+        self.backend = backend
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()  # key: (値, 期限)
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        """値を取得（なければMISSINGを返す）"""
+        entry = self._data.get(key)
+        now = time.time()
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > now:
+                self._data.move_to_end(key)
+                return self._hit(value)
+            del self._data[key]
+
+        if self.backend is not None:
+            value, expires_at = self.backend.get(key)
+            if value is not MISSING:
+                self._store(key, value, expires_at)
+                return self._hit(value)
+
+        self.misses += 1
+        return MISSING
+
+    def _hit(self, value: Any) -> Any:
+        self.hits += 1
+        if value is None:
+            self.negative_hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        expires_at = time.time() + ttl
+        self._store(key, value, expires_at)
+        if self.backend is not None:
+            self.backend.set(key, value, expires_at)
+
+    def _store(self, key: str, value: Any, expires_at: float):
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: str):
+        self._data.pop(key, None)
+        if self.backend is not None:
+            self.backend.delete(key)
+
+    async def flush(self):
+        """バックエンドへの未反映の書き込みを反映する"""
+        if self.backend is not None:
+            await self.backend.flush()
+
+    async def close(self):
+        """バックエンドを閉じて外す（メモリ上のキャッシュはそのまま使える）"""
+        if self.backend is not None:
+            backend, self.backend = self.backend, None
+            await backend.close()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'negative_hits': self.negative_hits,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0
+        }
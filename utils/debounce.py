@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Callable, Awaitable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DebouncedEditor:
+    """同じメッセージへの連続した編集を1回にまとめる
+
+    requestされてからdelay秒待ち、その間に来た依頼は最後のものだけを実行する。
+    同じチャンネルの編集はchannel_interval秒以上の間隔を空けて実行する。
+    """
+
+    def __init__(self, delay: float = 1.5, channel_interval: float = 1.0):
+        self.delay = delay
+        self.channel_interval = channel_interval
+        self._jobs: Dict[int, Tuple[int, Callable[[], Awaitable[None]]]] = {}  # メッセージID: (チャンネルID, 編集処理)
+        self._timers: Dict[int, asyncio.TimerHandle] = {}
+        self._running: Dict[int, asyncio.Task] = {}
+        self._next_slot: Dict[int, float] = {}  # チャンネルID: 次に編集できる時刻
+        self.requested = 0
+        self.executed = 0
+
+    def request(self, channel_id: int, message_id: int, job: Callable[[], Awaitable[None]]):
+        """編集を依頼（まだ実行されていない依頼は置き換える）"""
+        self.requested += 1
+        self._jobs[message_id] = (channel_id, job)
+        if message_id in self._timers:
+            return
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now + self.delay, self._next_slot.get(channel_id, 0.0))
+        self._next_slot[channel_id] = slot + self.channel_interval
+        self._timers[message_id] = loop.call_at(slot, self._run, message_id)
+
+    def _run(self, message_id: int):
+        self._timers.pop(message_id, None)
+        entry = self._jobs.pop(message_id, None)
+        if entry is None:
+            return
+        previous = self._running.get(message_id)
+        task = asyncio.create_task(self._execute(message_id, entry[1], previous))
+        self._running[message_id] = task
+
+    async def _execute(self, message_id: int, job: Callable[[], Awaitable[None]], previous: Optional[asyncio.Task]):
+        # 前の編集が終わってから実行し、順序が入れ替わらないようにする
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        try:
+            await job()
+            self.executed += 1
+        except Exception as e:
+            logger.warning("メッセージの編集に失敗しました", extra={'message_id': message_id, 'error': str(e)})
+        finally:
+            if self._running.get(message_id) is asyncio.current_task():
+                del self._running[message_id]
+
+    async def flush(self):
+        """待機中の編集をすぐに実行して完了を待つ"""
+        for message_id, timer in list(self._timers.items()):
+            timer.cancel()
+            self._run(message_id)
+        if self._running:
+            await asyncio.wait(list(self._running.values()))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._jobs),
+            'requested': self.requested,
+            'executed': self.executed
+        }
@@ -0,0 +1,91 @@
+from typing import Optional, Tuple
+
+# 募集作成フローの途中の状態をコンポーネントのcustom_idに埋め込む
+# custom_idは100文字まで。PUUID（78文字）以外は1文字ずつの符号にする
+# 例: "rf:t:r1j:<PUUID>" = タイトル入力、ランク、2番目の人数（Flex）、JG
+FLOW_PREFIX = 'rf'
+
+STEP_ACCOUNT = 'a'  # サモナー名の入力
+STEP_SIZE = 's'  # 人数の選択
+STEP_ROLE = 'r'  # ロールの選択
+STEP_TITLE = 't'  # タイトルの入力
+STEPS = (STEP_ACCOUNT, STEP_SIZE, STEP_ROLE, STEP_TITLE)
+
+# ゲームモードごとの人数の選択肢（ラベル, 人数）。custom_idには順番を入れる
+TEAM_SIZES = {
+    'ranked': [("Duo", 2), ("Flex", 5), ("Unlimited", None)],
+    'normal': [("Duo", 2), ("Trio", 3), ("Squad", 4), ("Flex", 5), ("Unlimited", None)],
+    'tft': [("Duo", 2), ("Unlimited", None)]
+}
+
+MODE_CODES = {'ranked': 'r', 'normal': 'n', 'tft': 't'}
+ROLE_CODES = {'top': 't', 'jungle': 'j', 'mid': 'm', 'bot': 'b', 'support': 's', 'fill': 'f', 'none': 'x'}
+_MODES = {code: mode for mode, code in MODE_CODES.items()}
+_ROLES = {code: role for role, code in ROLE_CODES.items()}
+_UNSET = '-'
+
+
+class FlowState:
+    """募集作成フローで選択済みの内容"""
+
+    __slots__ = ('game_mode', 'puuid', 'size_index', 'role')
+
+    def __init__(self, game_mode: str, puuid: str = '', size_index: Optional[int] = None, role: Optional[str] = None):
+        self.game_mode = game_mode
+        self.puuid = puuid  # サモナー名の入力前は空
+        self.size_index = size_index
+        self.role = role
+
+    @property
+    def size_label(self) -> str:
+        return TEAM_SIZES[self.game_mode][self.size_index][0]
+
+    @property
+    def team_size(self) -> Optional[int]:
+        return TEAM_SIZES[self.game_mode][self.size_index][1]
+
+    def with_puuid(self, puuid: str) -> 'FlowState':
+        return FlowState(self.game_mode, puuid, self.size_index, self.role)
+
+    def with_size(self, size_index: int) -> 'FlowState':
+        return FlowState(self.game_mode, self.puuid, size_index, self.role)
+
+    def with_role(self, role: str) -> 'FlowState':
+        return FlowState(self.game_mode, self.puuid, self.size_index, role)
+
+
+def encode_flow_id(step: str, state: FlowState) -> str:
+    """次のステップのコンポーネントに付けるcustom_id"""
+    code = (
+        MODE_CODES[state.game_mode]
+        + (str(state.size_index) if state.size_index is not None else _UNSET)
+        + (ROLE_CODES[state.role] if state.role is not None else _UNSET)
+    )
+    return f"{FLOW_PREFIX}:{step}:{code}:{state.puuid}"
+
+
+def decode_flow_id(custom_id: str) -> Optional[Tuple[str, FlowState]]:
+    """custom_idからステップと状態を復元（フローのcustom_idでなければNone）"""
+    parts = custom_id.split(':', 3)
+    if len(parts) != 4 or parts[0] != FLOW_PREFIX or parts[1] not in STEPS or len(parts[2]) != 3:
+        return None
+    step, (mode_code, size_code, role_code), puuid = parts[1], parts[2], parts[3]
+    game_mode = _MODES.get(mode_code)
+    if game_mode is None:
+        return None
+    size_index = None
+    if size_code != _UNSET:
+        if not size_code.isdigit() or int(size_code) >= len(TEAM_SIZES[game_mode]):
+            return None
+        size_index = int(size_code)
+    role = None
+    if role_code != _UNSET:
+        role = _ROLES.get(role_code)
+        if role is None:
+            return None
+    # 各ステップまでに選択済みのはずの項目が欠けていれば無効
+    if step != STEP_ACCOUNT and (not puuid or size_index is None):
+        return None
+    if step == STEP_TITLE and role is None:
+        return None
+    return step, FlowState(game_mode, puuid, size_index, role)
@@ -0,0 +1,92 @@
+import os
+import sqlite3
+from typing import Optional, Dict, List
+
+# ゲームモードと募集メッセージを送信するチャンネルの対応
+MODE_CHANNEL_FIELDS = {
+    'ranked': 'ranked_channel_id',
+    'normal': 'normal_channel_id',
+    'tft': 'tft_channel_id'
+}
+
+
+class GuildConfig:
+    """サーバーごとのチャンネル設定"""
+
+    __slots__ = (
+        'guild_id', 'recruitment_channel_id', 'ranked_channel_id',
+        'normal_channel_id', 'tft_channel_id', 'vc_category_id'
+    )
+
+    def __init__(
+        self,
+        guild_id: int,
+        recruitment_channel_id: Optional[int] = None,
+        ranked_channel_id: Optional[int] = None,
+        normal_channel_id: Optional[int] = None,
+        tft_channel_id: Optional[int] = None,
+        vc_category_id: Optional[int] = None
+    ):
+        self.guild_id = guild_id
+        self.recruitment_channel_id = recruitment_channel_id  # 募集開始パネルを置くチャンネル
+        self.ranked_channel_id = ranked_channel_id
+        self.normal_channel_id = normal_channel_id
+        self.tft_channel_id = tft_channel_id
+        self.vc_category_id = vc_category_id  # 募集用VCを作成するカテゴリ
+
+    def channel_for(self, game_mode: str) -> Optional[int]:
+        """ゲームモードに対応する募集チャンネルID"""
+        field = MODE_CHANNEL_FIELDS.get(game_mode)
+        return getattr(self, field) if field else None
+
+
+class GuildConfigStore:
+    """サーバー設定をSQLiteに保存し、必要になった時に読み込んでメモリに保持する"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS guild_configs ("
+            "guild_id INTEGER PRIMARY KEY, recruitment_channel_id INTEGER, ranked_channel_id INTEGER, "
+            "normal_channel_id INTEGER, tft_channel_id INTEGER, vc_category_id INTEGER)"
+        )
+        self.conn.commit()
+        self._configs: Dict[int, Optional[GuildConfig]] = {}  # 読み込み済みの設定（未設定ならNone）
+
+    def get(self, guild_id: int) -> Optional[GuildConfig]:
+        if guild_id not in self._configs:
+            row = self.conn.execute(
+                f"SELECT {', '.join(GuildConfig.__slots__)} FROM guild_configs WHERE guild_id = ?", (guild_id,)
+            ).fetchone()
+            self._configs[guild_id] = GuildConfig(*row) if row else None
+        return self._configs[guild_id]
+
+    def set(self, guild_id: int, **fields) -> GuildConfig:
+        """指定した項目だけを更新して保存"""
+        config = self.get(guild_id) or GuildConfig(guild_id)
+        for name, value in fields.items():
+            if name not in GuildConfig.__slots__ or name == 'guild_id':
+                raise ValueError(f"不明な設定項目です: {name}")
+            setattr(config, name, value)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO guild_configs ({', '.join(GuildConfig.__slots__)}) "
+            f"VALUES ({', '.join('?' for _ in GuildConfig.__slots__)})",
+            tuple(getattr(config, name) for name in GuildConfig.__slots__)
+        )
+        self.conn.commit()
+        self._configs[guild_id] = config
+        return config
+
+    def all(self) -> List[GuildConfig]:
+        """保存されているすべての設定（起動時のパネル登録用）"""
+        rows = self.conn.execute(f"SELECT {', '.join(GuildConfig.__slots__)} FROM guild_configs").fetchall()
+        for row in rows:
+            self._configs[row[0]] = GuildConfig(*row)
+        return [self._configs[row[0]] for row in rows]
+
+    def close(self):
+        self.conn.close()
@@ -38,4 +38,41 @@ def get_rank_display(rank_info):
 
 def get_rank_image_url(rank_info):
     key = rank_info.split()[0].upper()
-    return RANK_IMAGE_URLS.get(key, "") 
+    return RANK_IMAGE_URLS.get(key, "")
+
+# ティアの順序（平均・範囲の計算に使用）とディビジョン
+RANK_TIERS = list(RANK_EMOJIS)
+DIVISIONS = ["IV", "III", "II", "I"]
+APEX_TIERS = ("MASTER", "GRANDMASTER", "CHALLENGER")
+
+def rank_score(tier: str, division: str = "IV") -> int:
+    """ティアとディビジョンを比較用の数値に変換（IRON IV = 0、1ディビジョンごとに+1）"""
+    score = RANK_TIERS.index(tier.upper()) * len(DIVISIONS)
+    if tier.upper() not in APEX_TIERS and division in DIVISIONS:
+        score += DIVISIONS.index(division)
+    return score
+
+def score_to_rank(score: float) -> str:
+    """rank_scoreの値を "GOLD II" 形式に戻す（小数は四捨五入）"""
+    score = max(0, min(int(round(score)), rank_score("CHALLENGER")))
+    tier = RANK_TIERS[score // len(DIVISIONS)]
+    if tier in APEX_TIERS:
+        return tier
+    return f"{tier} {DIVISIONS[score % len(DIVISIONS)]}"
+
+def entry_score(entry) -> int:
+    """Riot APIのランク情報（tier, rank）を数値に変換"""
+    return rank_score(entry['tier'], entry.get('rank', "IV"))
+
+def party_rank_summary(entries) -> str:
+    """メンバーのランク情報から「平均（最低〜最高）」の表示を作る（未ランクはNone）"""
+    scores = sorted(entry_score(entry) for entry in entries if entry)
+    unranked = sum(1 for entry in entries if not entry)
+    if not scores:
+        return f"ランクなし {unranked}人" if unranked else "未取得"
+    summary = f"平均 {score_to_rank(sum(scores) / len(scores))}"
+    if len(scores) > 1:
+        summary += f"（{score_to_rank(scores[0])} 〜 {score_to_rank(scores[-1])}）"
+    if unranked:
+        summary += f" / ランクなし {unranked}人"
+    return summary
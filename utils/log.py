@@ -0,0 +1,76 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import time
+
+# LogRecordの標準の属性（これ以外はextraで渡された項目として出力する）
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """メッセージと例外を文字列にしてからキューに入れる（extraの項目はそのまま残す）"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class StructuredFormatter(logging.Formatter):
+    """extraで渡した項目を key=value（またはJSON）として出力するフォーマッタ"""
+
+    def __init__(self, json_output: bool = False):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+        message = record.getMessage()
+        if self.json_output:
+            data = {
+                'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)),
+                'level': record.levelname,
+                'logger': record.name,
+                'message': message,
+                **fields
+            }
+            if record.exc_text:
+                data['exc_info'] = record.exc_text
+            return json.dumps(data, ensure_ascii=False, default=str)
+
+        line = f"{self.formatTime(record, '%Y-%m-%d %H:%M:%S')} {record.levelname:<8} {record.name}: {message}"
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+def setup_logging(level: str = 'INFO', json_output: bool = False):
+    """ルートロガーを設定する
+
+    出力は別スレッドで行い、標準出力への書き込みでイベントループを止めないようにする。
+    """
+    global _listener
+    if _listener is not None:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(StructuredFormatter(json_output))
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(_QueueHandler(log_queue))
+    # discord.pyのHTTPログは詳細すぎるため抑える
+    logging.getLogger('discord.http').setLevel(logging.WARNING)
@@ -0,0 +1,129 @@
+import heapq
+from typing import Optional, Dict, List, Set, Tuple, Iterable
+
+from utils.helper import DIVISIONS, RANK_TIERS, rank_score
+from utils.registry import Recruitment
+
+UNRANKED_BAND = -1
+
+
+def parse_rank_display(text: Optional[str]) -> Optional[int]:
+    """"GOLD II" や "TFT GOLD II" 形式の表示を rank_score の値に変換（未設定ならNone）"""
+    if not text:
+        return None
+    parts = [part for part in text.upper().split() if part != "TFT"]
+    if not parts or parts[0] not in RANK_TIERS:
+        return None
+    return rank_score(parts[0], parts[1] if len(parts) > 1 else "IV")
+
+
+class _Entry:
+    """インデックス内の募集1件（検索に使う値を計算済みで保持する）"""
+
+    __slots__ = ('recruitment', 'score', 'open_slots', 'missing_roles', 'key')
+
+    def __init__(self, recruitment: Recruitment, score: Optional[int], open_slots: Optional[int], missing_roles: frozenset):
+        self.recruitment = recruitment
+        self.score = score
+        self.open_slots = open_slots  # Noneなら人数制限なし
+        self.missing_roles = missing_roles
+        band = score // len(DIVISIONS) if score is not None else UNRANKED_BAND
+        self.key = (recruitment.guild_id, recruitment.game_mode, band)
+
+
+class MatchmakingIndex:
+    """空きのある募集を (サーバー, モード, ティア) と不足ロールで引けるようにしたインデックス
+
+    募集の作成・参加者の増減・終了のたびにupdate/removeで差分だけを反映する。
+    満員の募集は検索対象から外し、空きができたら戻す。
+    """
+
+    def __init__(self, roles: Iterable[str]):
+        self.roles = frozenset(roles)  # 募集で埋める必要があるロール（fillを除く）
+        self._entries: Dict[int, _Entry] = {}  # 作成者ID: 項目
+        self._bands: Dict[Tuple[int, str, int], Set[int]] = {}  # (サーバー, モード, ティア): 作成者ID
+        self._by_role: Dict[Tuple[int, str, str], Set[int]] = {}  # (サーバー, モード, 不足ロール): 作成者ID
+
+    def __len__(self) -> int:
+        return sum(len(owners) for owners in self._bands.values())
+
+    def update(self, recruitment: Recruitment, member_count: int):
+        """募集の現在の状態を反映（VC参加者数はBotを除いた人数）"""
+        self.remove(recruitment.owner_id)
+        if recruitment.vc_id is None:
+            return
+        open_slots = None
+        if recruitment.team_size:
+            open_slots = recruitment.team_size - member_count
+            if open_slots <= 0:
+                return  # 満員
+        if recruitment.game_mode == 'tft':
+            missing_roles = frozenset()
+        elif recruitment.role in self.roles:
+            missing_roles = self.roles - {recruitment.role}
+        else:
+            missing_roles = self.roles  # fillの場合はすべてのロールを募集中とみなす
+        entry = _Entry(recruitment, parse_rank_display(recruitment.rank), open_slots, missing_roles)
+        self._entries[recruitment.owner_id] = entry
+        self._bands.setdefault(entry.key, set()).add(recruitment.owner_id)
+        guild_id, game_mode, _ = entry.key
+        for role in missing_roles:
+            self._by_role.setdefault((guild_id, game_mode, role), set()).add(recruitment.owner_id)
+
+    def remove(self, owner_id: int):
+        entry = self._entries.pop(owner_id, None)
+        if entry is None:
+            return
+        self._discard(self._bands, entry.key, owner_id)
+        guild_id, game_mode, _ = entry.key
+        for role in entry.missing_roles:
+            self._discard(self._by_role, (guild_id, game_mode, role), owner_id)
+
+    @staticmethod
+    def _discard(index: Dict, key, owner_id: int):
+        owners = index.get(key)
+        if owners is not None:
+            owners.discard(owner_id)
+            if not owners:
+                del index[key]
+
+    def find(
+        self,
+        guild_id: int,
+        game_mode: str,
+        tier: Optional[str] = None,
+        spread: int = 1,
+        role: Optional[str] = None,
+        slots: int = 1,
+        limit: int = 10
+    ) -> List[Recruitment]:
+        """条件に合う募集を、ランクが近い順・新しい順に返す
+
+        tierを指定するとそのティア±spreadの募集だけを対象にする（未設定の募集は除く）。
+        slotsは参加したい人数（空き枠がそれ以上ある募集だけを返す）。
+        """
+        if tier:
+            center = RANK_TIERS.index(tier.upper())
+            bands = range(max(center - spread, 0), min(center + spread, len(RANK_TIERS) - 1) + 1)
+            target = rank_score(tier, "II")
+        else:
+            bands = [UNRANKED_BAND] + list(range(len(RANK_TIERS)))
+            target = None
+
+        candidates: Set[int] = set()
+        for band in bands:
+            candidates |= self._bands.get((guild_id, game_mode, band), set())
+        if role and role in self.roles:
+            candidates &= self._by_role.get((guild_id, game_mode, role), set())
+        if slots > 1:
+            candidates = {
+                owner_id for owner_id in candidates
+                if self._entries[owner_id].open_slots is None or self._entries[owner_id].open_slots >= slots
+            }
+
+        def fit(owner_id: int):
+            entry = self._entries[owner_id]
+            distance = abs(entry.score - target) if target is not None and entry.score is not None else 0
+            return distance, -entry.recruitment.created_at
+
+        return [self._entries[owner_id].recruitment for owner_id in heapq.nsmallest(limit, candidates, key=fit)]
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Tuple, Any
+
+from utils import riot_api
+from utils.accounts import AccountStore, LinkedAccount
+from utils.cache import MISSING
+
+logger = logging.getLogger(__name__)
+
+
+def rank_queue(game_mode: str) -> str:
+    """ゲームモードが参照するランクのキュー（ランクとノーマルはどちらもソロランク）"""
+    return 'tft' if game_mode == 'tft' else 'solo'
+
+
+class RankPrefetcher:
+    """最近利用した連携ユーザーのランク情報を定期的に取得しておく
+
+    レート制限のうちbudget_shareの割合だけを使うよう、取得ごとに間隔を空ける。
+    他のリクエストが順番待ちしている間は取得を止める。
+    """
+
+    def __init__(
+        self,
+        accounts: AccountStore,
+        budget_share: float = 0.2,
+        refresh_interval: float = 15 * 60,
+        active_window: float = 7 * 24 * 60 * 60
+    ):
+        self.accounts = accounts
+        self.budget_share = budget_share
+        self.refresh_interval = refresh_interval  # 1人あたりの再取得間隔
+        self.active_window = active_window  # この期間内に利用したユーザーだけを対象にする
+        self.max_age = refresh_interval * 2  # これより古い取得結果は使わない
+        self._ranks: Dict[Tuple[str, str], Tuple[Optional[Dict[str, Any]], float]] = {}  # (PUUID, キュー): (ランク情報, 取得時刻)
+        self._task: Optional[asyncio.Task] = None
+        self.refreshed = 0
+        self.hits = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def get(self, puuid: str, game_mode: str):
+        """取得済みのランク情報（なければMISSING。未ランクの場合はNone）"""
+        cached = self._ranks.get((puuid, rank_queue(game_mode)))
+        if cached is None or time.time() - cached[1] > self.max_age:
+            return MISSING
+        self.hits += 1
+        return cached[0]
+
+    def forget(self, puuid: str):
+        """連携解除したユーザーの取得結果を削除"""
+        for key in [key for key in self._ranks if key[0] == puuid]:
+            del self._ranks[key]
+
+    def _due(self):
+        """再取得が必要なアカウント（最近利用した順）"""
+        now = time.time()
+        # 対象外になったユーザーの古い取得結果を捨てる
+        for key in [key for key, (_, fetched_at) in self._ranks.items() if now - fetched_at > self.max_age]:
+            del self._ranks[key]
+        due = []
+        for account in self.accounts.active_since(now - self.active_window):
+            cached = self._ranks.get((account.puuid, rank_queue(account.last_mode)))
+            if cached is None or now - cached[1] >= self.refresh_interval:
+                due.append(account)
+        return due
+
+    def _spacing(self, requests: int) -> float:
+        """直前の取得で使ったリクエスト数（先読み自身の分のみ）に対して空ける秒数"""
+        rate = riot_api.rate_limiter.sustained_rate(riot_api.GAME_REGION) * self.budget_share
+        return requests / rate if rate > 0 else self.refresh_interval
+
+    async def _run(self):
+        while True:
+            due = self._due()
+            if not due:
+                await asyncio.sleep(60)
+                continue
+            for account in due:
+                # 募集作成などのリクエストが待っている間は譲る
+                while riot_api.rate_limiter.queued(riot_api.GAME_REGION) or riot_api.rate_limiter.queued(riot_api.REGION):
+                    await asyncio.sleep(1)
+                used = await self._refresh(account)
+                await asyncio.sleep(self._spacing(max(used, 1)))
+
+    async def _refresh(self, account: LinkedAccount) -> int:
+        """1人分のランク情報を取得し、使ったリクエスト数を返す（同時に送られた他の処理のリクエストは含まない）"""
+        with riot_api.count_requests() as used:
+            try:
+                entry = await riot_api.get_rank_entry(account.puuid, account.last_mode)
+            except riot_api.RiotAPIError as e:
+                logger.warning("ランク情報の先読みに失敗しました", extra={'riot_id': account.riot_id, 'error': str(e)})
+            else:
+                self._ranks[(account.puuid, rank_queue(account.last_mode))] = (entry, time.time())
+                self.refreshed += 1
+        return used[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {'linked': len(self.accounts), 'warm': len(self._ranks), 'refreshed': self.refreshed, 'hits': self.hits}
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from typing import Optional, Dict, List, Tuple
+
+
+class RateLimitExceeded(Exception):
+    """待機時間が上限を超えるためリクエストを送信できない"""
+
+    def __init__(self, wait: float):
+        super().__init__(f"レート制限の待機時間が上限を超えました（{wait:.1f}秒）")
+        self.wait = wait
+
+
+def parse_rate_limits(value: Optional[str]) -> List[Tuple[int, int]]:
+    """"20:1,100:120" 形式のヘッダーを [(回数, 秒数), ...] に変換"""
+    limits = []
+    if not value:
+        return limits
+    for part in value.split(','):
+        try:
+            count, window = part.strip().split(':')
+            limits.append((int(count), int(window)))
+        except ValueError:
+            continue
+    return limits
+
+
+class TokenBucket:
+    """1つのレート制限（例: 1秒あたり20回）を表すトークンバケット"""
+
+    def __init__(self, limit: int, window: int):
+        self.limit = limit
+        self.window = window
+        self.tokens = float(limit)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.limit, self.tokens + elapsed * self.limit / self.window)
+            self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        """トークンが1つ使えるようになるまでの秒数"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.window / self.limit
+
+    def consume(self):
+        self.tokens -= 1
+
+    def sync(self, used: int, now: float):
+        """サーバー側のカウント（X-*-Rate-Limit-Count）に合わせて残りトークンを補正"""
+        self._refill(now)
+        self.tokens = min(self.tokens, float(self.limit - used))
+
+
+class RateLimiter:
+    """リージョン単位（アプリ制限）とメソッド単位の制限を守ってリクエストを順番待ちさせる"""
+
+    def __init__(self, default_app_limits: List[Tuple[int, int]], max_wait: float = 10.0):
+        self.default_app_limits = default_app_limits
+        self.max_wait = max_wait
+        self._app_buckets: Dict[str, List[TokenBucket]] = {}
+        self._method_buckets: Dict[Tuple[str, str], List[TokenBucket]] = {}
+        self._blocked_until: Dict[Tuple[str, Optional[str]], float] = {}  # Retry-Afterによる停止
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        # 統計情報
+        self._queued: Dict[Tuple[str, str], int] = {}
+        self.total_requests = 0
+        self.total_wait = 0.0
+        self.max_observed_wait = 0.0
+        self.throttled = 0
+
+    def _get_lock(self, key: Tuple[str, str]) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    def _app(self, region: str) -> List[TokenBucket]:
+        app = self._app_buckets.get(region)
+        if app is None:
+            app = [TokenBucket(limit, window) for limit, window in self.default_app_limits]
+            self._app_buckets[region] = app
+        return app
+
+    def _buckets(self, region: str, method: str) -> List[TokenBucket]:
+        return self._app(region) + self._method_buckets.get((region, method), [])
+
+    def _reserve(self, region: str, method: str) -> float:
+        """全バケットにトークンがあれば消費して0を、なければ必要な待機秒数を返す"""
+        now = time.monotonic()
+        delay = max(
+            self._blocked_until.get((region, None), 0.0) - now,
+            self._blocked_until.get((region, method), 0.0) - now,
+            0.0
+        )
+        buckets = self._buckets(region, method)
+        for bucket in buckets:
+            delay = max(delay, bucket.delay(now))
+        if delay > 0:
+            return delay
+        for bucket in buckets:
+            bucket.consume()
+        return 0.0
+
+    async def acquire(self, region: str, method: str):
+        """送信可能になるまで待機（同じリージョン・メソッドのリクエストは到着順に処理）"""
+        key = (region, method)
+        self._queued[key] = self._queued.get(key, 0) + 1
+        started = time.monotonic()
+        try:
+            async with self._get_lock(key):
+                while True:
+                    delay = self._reserve(region, method)
+                    if delay <= 0:
+                        break
+                    if time.monotonic() - started + delay > self.max_wait:
+                        raise RateLimitExceeded(delay)
+                    await asyncio.sleep(delay)
+        finally:
+            self._queued[key] -= 1
+            waited = time.monotonic() - started
+            self.total_requests += 1
+            self.total_wait += waited
+            self.max_observed_wait = max(self.max_observed_wait, waited)
+
+    def update_from_headers(self, region: str, method: str, headers):
+        """レスポンスヘッダーから制限値と使用回数を反映"""
+        now = time.monotonic()
+        self._app_buckets[region] = self._merge(
+            self._app(region),
+            headers.get('X-App-Rate-Limit'),
+            headers.get('X-App-Rate-Limit-Count'),
+            now
+        )
+        key = (region, method)
+        self._method_buckets[key] = self._merge(
+            self._method_buckets.get(key, []),
+            headers.get('X-Method-Rate-Limit'),
+            headers.get('X-Method-Rate-Limit-Count'),
+            now
+        )
+
+    @staticmethod
+    def _merge(buckets: List[TokenBucket], limit_header: Optional[str], count_header: Optional[str], now: float) -> List[TokenBucket]:
+        limits = parse_rate_limits(limit_header)
+        if not limits:
+            return buckets
+        existing = {(b.limit, b.window): b for b in buckets}
+        merged = [existing.get(pair) or TokenBucket(*pair) for pair in limits]
+        counts = {window: used for used, window in parse_rate_limits(count_header)}
+        for bucket in merged:
+            if bucket.window in counts:
+                bucket.sync(counts[bucket.window], now)
+        return merged
+
+    def penalize(self, region: str, method: str, retry_after: float, limit_type: Optional[str] = None):
+        """429を受け取った時にRetry-Afterの間リクエストを止める"""
+        self.throttled += 1
+        # アプリ全体の制限ならリージョン全体、それ以外はメソッド単位で止める
+        key = (region, None) if limit_type == 'application' else (region, method)
+        self._blocked_until[key] = max(self._blocked_until.get(key, 0.0), time.monotonic() + retry_after)
+
+    def sustained_rate(self, region: str, method: Optional[str] = None) -> float:
+        """長時間にわたって送信できる1秒あたりのリクエスト数（最も厳しい制限で決まる）"""
+        buckets = self._buckets(region, method or '')
+        if not buckets:
+            return float('inf')
+        return min(bucket.limit / bucket.window for bucket in buckets)
+
+    def queued(self, region: str) -> int:
+        """指定リージョンで順番待ちしているリクエスト数"""
+        return sum(n for (r, _), n in self._queued.items() if r == region)
+
+    def stats(self) -> Dict[str, object]:
+        """待ち行列の長さと待機時間の統計"""
+        return {
+            'queue_depth': {f"{region}:{method}": n for (region, method), n in self._queued.items() if n},
+            'requests': self.total_requests,
+            'throttled': self.throttled,
+            'avg_wait': self.total_wait / self.total_requests if self.total_requests else 0.0,
+            'max_wait': self.max_observed_wait
+        }
@@ -0,0 +1,86 @@
+import asyncio
+import heapq
+import logging
+from typing import Callable, Awaitable, Dict, List, Tuple, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """キーごとの期限を最小ヒープで管理し、期限が来たらコールバックを呼ぶ
+
+    定期的に全件を確認するのではなく、次の期限までだけ眠る。
+    同じキーを再登録すると期限が置き換わり、cancelで取り消せる。
+    """
+
+    def __init__(self, callback: Callable[[Hashable], Awaitable[None]]):
+        self.callback = callback
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._deadlines: Dict[Hashable, float] = {}  # キー: 有効な期限（ヒープ内の古い項目は無視する）
+        self._counter = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._firing: Set[asyncio.Task] = set()  # 実行中のコールバック（stopで取り消す）
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._firing:
+            task.cancel()
+        self._firing.clear()
+
+    def schedule(self, key: Hashable, delay: float):
+        """delay秒後にcallback(key)を呼ぶ"""
+        deadline = asyncio.get_running_loop().time() + max(0.0, delay)
+        self._deadlines[key] = deadline
+        self._counter += 1
+        heapq.heappush(self._heap, (deadline, self._counter, key))
+        # 先頭の期限が変わった場合に備えて起こす
+        self._wakeup.set()
+
+    def cancel(self, key: Hashable):
+        self._deadlines.pop(key, None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            # 取り消し・置き換え済みの項目を捨てる
+            while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            deadline, _, key = self._heap[0]
+            delay = deadline - loop.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            del self._deadlines[key]
+            task = asyncio.create_task(self._fire(key))
+            self._firing.add(task)
+            task.add_done_callback(self._firing.discard)
+
+    async def _fire(self, key: Hashable):
+        try:
+            await self.callback(key)
+        except Exception:
+            logger.exception("期限処理中にエラー", extra={'key': key})
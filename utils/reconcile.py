@@ -0,0 +1,67 @@
+import asyncio
+import datetime
+from typing import Awaitable, Callable, Dict, Iterable, List, Sequence
+
+import discord
+
+# 一括削除はDiscordの仕様で作成から14日以内のメッセージを2〜100件まで
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14) - datetime.timedelta(minutes=5)
+BULK_DELETE_LIMIT = 100
+
+
+class ReconcileSummary:
+    """整合処理で変更した内容の件数"""
+
+    FIELDS = {
+        'vcs_deleted': "削除した不要なVC",
+        'vcs_adopted': "待機に戻したVC",
+        'recruitments_closed': "VCがなく終了した募集",
+        'messages_deleted': "削除したメッセージ",
+        'errors': "失敗した操作"
+    }
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {field: 0 for field in self.FIELDS}
+
+    def add(self, field: str, count: int = 1):
+        self.counts[field] += count
+
+    def merge(self, other: 'ReconcileSummary'):
+        for field, count in other.counts.items():
+            self.counts[field] += count
+
+    @property
+    def changed(self) -> bool:
+        return any(self.counts.values())
+
+    def lines(self) -> List[str]:
+        return [f"{label}: {self.counts[field]}件" for field, label in self.FIELDS.items()]
+
+
+async def run_bounded(jobs: Iterable[Callable[[], Awaitable[None]]], concurrency: int) -> int:
+    """同時実行数を制限して実行し、失敗した数を返す"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(job):
+        async with semaphore:
+            await job()
+
+    results = await asyncio.gather(*(run(job) for job in jobs), return_exceptions=True)
+    return sum(1 for result in results if isinstance(result, Exception) and not isinstance(result, discord.NotFound))
+
+
+async def purge_messages(channel: discord.TextChannel, messages: Sequence[discord.Message], concurrency: int = 3) -> int:
+    """メッセージをまとめて削除し、削除できた数を返す
+
+    14日以内のメッセージは100件ずつ一括削除し、それより古いものだけを1件ずつ削除する。
+    """
+    cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE
+    recent = [message for message in messages if message.created_at > cutoff]
+    old = [message for message in messages if message.created_at <= cutoff]
+    deleted = 0
+    for start in range(0, len(recent), BULK_DELETE_LIMIT):
+        chunk = recent[start:start + BULK_DELETE_LIMIT]
+        await channel.delete_messages(chunk)
+        deleted += len(chunk)
+    failed = await run_bounded((message.delete for message in old), concurrency)
+    return deleted + len(old) - failed
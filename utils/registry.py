@@ -0,0 +1,138 @@
+import time
+from typing import Dict, Optional, List, Iterator
+
+
+class Recruitment:
+    """1件の募集の状態"""
+
+    __slots__ = (
+        'owner_id', 'guild_id', 'vc_id', 'channel_id', 'message_id',
+        'game_mode', 'team_size', 'size_label', 'role', 'rank', 'title',
+        'created_at', 'last_active', 'filled_at'
+    )
+
+    def __init__(
+        self,
+        owner_id: int,
+        guild_id: int,
+        game_mode: str,
+        team_size: Optional[int],
+        size_label: str,
+        role: str,
+        rank: str = "未設定",
+        title: str = "",
+        vc_id: Optional[int] = None,
+        channel_id: Optional[int] = None,
+        message_id: Optional[int] = None,
+        created_at: Optional[float] = None,
+        last_active: Optional[float] = None,
+        filled_at: Optional[float] = None
+    ):
+        self.owner_id = owner_id
+        self.guild_id = guild_id
+        self.vc_id = vc_id
+        self.channel_id = channel_id  # 募集メッセージを送信したチャンネル
+        self.message_id = message_id
+        self.game_mode = game_mode
+        self.team_size = team_size
+        self.size_label = size_label
+        self.role = role
+        self.rank = rank
+        self.title = title
+        self.created_at = created_at if created_at is not None else time.time()
+        self.last_active = last_active if last_active is not None else self.created_at
+        self.filled_at = filled_at  # 初めて満員になった時刻（統計に1回だけ記録するため、再起動後も保持する）
+
+    def __repr__(self):
+        return f"<Recruitment owner={self.owner_id} vc={self.vc_id} mode={self.game_mode} size={self.size_label}>"
+
+
+class RecruitmentRegistry:
+    """募集の一覧。作成者・VC・メッセージのどれからでもO(1)で引ける"""
+
+    def __init__(self, store=None):
+        self.store = store  # RecruitmentStore（設定すると変更が永続化される）
+        self._by_owner: Dict[int, Recruitment] = {}
+        self._by_vc: Dict[int, Recruitment] = {}
+        self._by_message: Dict[int, Recruitment] = {}
+        self._by_mode: Dict[str, Dict[int, Recruitment]] = {}  # モード: {作成者ID: 募集}（作成順）
+
+    def __len__(self) -> int:
+        return len(self._by_owner)
+
+    def __iter__(self) -> Iterator[Recruitment]:
+        return iter(list(self._by_owner.values()))
+
+    def add(self, recruitment: Recruitment):
+        """募集を登録（同じ作成者の募集は1件まで）"""
+        self.restore(recruitment)
+        self._save(recruitment)
+
+    def restore(self, recruitment: Recruitment):
+        """保存済みの募集を登録（永続化はしない）"""
+        if recruitment.owner_id in self._by_owner:
+            raise ValueError(f"作成者 {recruitment.owner_id} の募集は既に登録されています")
+        self._by_owner[recruitment.owner_id] = recruitment
+        self._by_mode.setdefault(recruitment.game_mode, {})[recruitment.owner_id] = recruitment
+        if recruitment.vc_id is not None:
+            self._by_vc[recruitment.vc_id] = recruitment
+        if recruitment.message_id is not None:
+            self._by_message[recruitment.message_id] = recruitment
+
+    def set_vc(self, recruitment: Recruitment, vc_id: int):
+        if recruitment.vc_id is not None:
+            self._by_vc.pop(recruitment.vc_id, None)
+        recruitment.vc_id = vc_id
+        self._by_vc[vc_id] = recruitment
+        self._save(recruitment)
+
+    def set_message(self, recruitment: Recruitment, channel_id: int, message_id: int):
+        if recruitment.message_id is not None:
+            self._by_message.pop(recruitment.message_id, None)
+        recruitment.channel_id = channel_id
+        recruitment.message_id = message_id
+        self._by_message[message_id] = recruitment
+        self._save(recruitment)
+
+    def remove(self, recruitment: Recruitment) -> bool:
+        """募集を削除し、削除したかを返す（登録されていなければ何もしない）"""
+        if self._by_owner.get(recruitment.owner_id) is not recruitment:
+            return False
+        del self._by_owner[recruitment.owner_id]
+        mode = self._by_mode.get(recruitment.game_mode)
+        if mode is not None:
+            mode.pop(recruitment.owner_id, None)
+        if recruitment.vc_id is not None:
+            self._by_vc.pop(recruitment.vc_id, None)
+        if recruitment.message_id is not None:
+            self._by_message.pop(recruitment.message_id, None)
+        if self.store is not None:
+            self.store.delete(recruitment)
+        return True
+
+    def by_owner(self, owner_id: int) -> Optional[Recruitment]:
+        return self._by_owner.get(owner_id)
+
+    def by_vc(self, vc_id: int) -> Optional[Recruitment]:
+        return self._by_vc.get(vc_id)
+
+    def by_message(self, message_id: int) -> Optional[Recruitment]:
+        return self._by_message.get(message_id)
+
+    def by_mode(self, game_mode: str) -> List[Recruitment]:
+        """モードごとの募集一覧（作成順）"""
+        return list(self._by_mode.get(game_mode, {}).values())
+
+    def mark_filled(self, recruitment: Recruitment, timestamp: Optional[float] = None):
+        """初めて満員になった時刻を記録"""
+        recruitment.filled_at = timestamp if timestamp is not None else time.time()
+        self._save(recruitment)
+
+    def touch(self, recruitment: Recruitment, timestamp: Optional[float] = None):
+        """最終アクティブ時刻を更新"""
+        recruitment.last_active = timestamp if timestamp is not None else time.time()
+        self._save(recruitment)
+
+    def _save(self, recruitment: Recruitment):
+        if self.store is not None:
+            self.store.save(recruitment)
@@ -1,12 +1,25 @@
-import requests
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import random
 import os
+import time
+from urllib.parse import quote
 from dotenv import load_dotenv
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable, AsyncIterator, Tuple
+
+import aiohttp
+
+from utils.cache import TTLCache, SQLiteBackend, MISSING
+from utils.rate_limiter import RateLimiter, RateLimitExceeded, parse_rate_limits
+from utils import metrics
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
-API_KEY = os.getenv('RIOT_API_KEY')
-if not API_KEY:
-    raise ValueError("RIOT_API_KEYが設定されていません。.envファイルを確認してください。")
+API_KEY = os.getenv('RIOT_API_KEY')  # 起動時にvalidate_config()で確認する
 
 REGION = "asia"  # アカウントAPIはasiaリージョンを使用
 GAME_REGION = "jp1"  # ゲームデータAPIはjp1リージョンを使用
@@ -14,49 +27,381 @@ GAME_REGION = "jp1"  # ゲームデータAPIはjp1リージョンを使用
 RIOT_API_BASE_URL = 'https://asia.api.riotgames.com'
 RIOT_API_JP_URL = 'https://jp1.api.riotgames.com'
 
-def get_latest_version() -> str:
-    """最新のDDragonバージョンを取得"""
+_BASE_URLS = {
+    REGION: RIOT_API_BASE_URL,
+    GAME_REGION: RIOT_API_JP_URL
+}
+
+DDRAGON_BASE_URL = 'https://ddragon.leagueoflegends.com'
+DDRAGON_FALLBACK_VERSION = '14.1.1'
+DDRAGON_VERSION_PATH = os.getenv('DDRAGON_VERSION_PATH', 'data/ddragon_version.json')  # 取得したバージョンの保存先
+DDRAGON_REFRESH_INTERVAL = float(os.getenv('DDRAGON_REFRESH_HOURS', '6')) * 60 * 60
+
+# 接続設定（.envで上書き可能）
+MAX_CONNECTIONS_PER_HOST = int(os.getenv('RIOT_API_MAX_CONNECTIONS', '10'))  # ホストごとのkeep-alive接続数
+MAX_CONCURRENT_REQUESTS = int(os.getenv('RIOT_API_MAX_CONCURRENCY', '20'))  # ホストごとの同時リクエスト数
+REQUEST_TIMEOUT = float(os.getenv('RIOT_API_TIMEOUT', '5'))  # 1リクエストあたりのタイムアウト（秒）
+BATCH_CONCURRENCY = int(os.getenv('RIOT_API_BATCH_CONCURRENCY', '5'))  # まとめて取得する時の同時取得人数
+
+# レート制限設定（ヘッダーを受け取るまではこの値を使用。デフォルトは開発用キーの制限）
+APP_RATE_LIMIT = os.getenv('RIOT_APP_RATE_LIMIT', '20:1,100:120')
+MAX_QUEUE_WAIT = float(os.getenv('RIOT_API_MAX_QUEUE_WAIT', '10'))  # 順番待ちの上限（秒）
+MAX_RETRIES = int(os.getenv('RIOT_API_MAX_RETRIES', '3'))  # 429/5xxの再試行回数
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+rate_limiter = RateLimiter(parse_rate_limits(APP_RATE_LIMIT), max_wait=MAX_QUEUE_WAIT)
+
+# キャッシュ設定（秒）。アカウントとサモナーの対応は長く、ランク情報は短く保持する
+CACHE_TTLS = {
+    'account': int(os.getenv('RIOT_CACHE_ACCOUNT_TTL', str(24 * 60 * 60))),
+    'summoner': int(os.getenv('RIOT_CACHE_SUMMONER_TTL', str(24 * 60 * 60))),
+    'league': int(os.getenv('RIOT_CACHE_LEAGUE_TTL', '300')),
+    'tft-league': int(os.getenv('RIOT_CACHE_LEAGUE_TTL', '300'))
+}
+NEGATIVE_CACHE_TTL = int(os.getenv('RIOT_CACHE_NEGATIVE_TTL', '60'))  # 見つからなかった結果の保持時間
+CACHE_MAXSIZE = int(os.getenv('RIOT_CACHE_MAXSIZE', '5000'))
+CACHE_DB_PATH = os.getenv('RIOT_CACHE_DB')  # 設定するとSQLiteに保存して再起動後も利用する
+
+# SQLiteの保存先はinit_sessions()で開く（import時にはファイルを開かない）
+cache = TTLCache(CACHE_MAXSIZE)
+
+# メトリクス
+REQUEST_SECONDS = metrics.histogram('riot_api_request_seconds', 'Riot APIへの1回のHTTPリクエストの所要時間', ['method', 'status'])
+QUEUE_WAIT_SECONDS = metrics.histogram('riot_api_queue_wait_seconds', 'レート制限による順番待ちの時間', ['method'])
+THROTTLED = metrics.counter('riot_api_throttled_total', '429を受け取った回数', ['method'])
+CACHE_LOOKUPS = metrics.counter('riot_api_cache_total', 'キャッシュの参照結果（hit/miss/coalesced）', ['namespace', 'result'])
+metrics.gauge('riot_api_queue_depth', 'レート制限の順番待ちをしているリクエスト数', ['region']).set_function(
+    lambda: {(region,): rate_limiter.queued(region) for region in _BASE_URLS}
+)
+
+class RiotAPIError(Exception):
+    """再試行してもRiot APIから結果を取得できなかった"""
+
+class RiotRateLimitError(RiotAPIError):
+    """レート制限により結果を取得できなかった"""
+
+# ルーティングホストごとに共有するセッションと同時実行数の制限
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+_limits: Dict[str, asyncio.Semaphore] = {}
+
+# 実行中の同一リクエスト（キャッシュキー: Task）。後から来た呼び出しは同じ結果を待つ
+_inflight: Dict[str, asyncio.Task] = {}
+_coalesce_stats = {'requests': 0, 'coalesced': 0}
+
+# count_requests()の中で送ったリクエスト数（他のタスクのリクエストは数えない）
+_request_counter: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar('riot_request_counter', default=None)
+
+# DDragonのバージョン（ディスクから読み込むか取得するまではNone）
+_ddragon_version: Optional[str] = None
+_ddragon_fetched_at = 0.0
+_ddragon_lock: Optional[asyncio.Lock] = None
+_ddragon_refresh_task: Optional[asyncio.Task] = None
+
+def validate_config():
+    """起動時に設定を確認する（不足していればValueError）"""
+    if not API_KEY:
+        raise ValueError("RIOT_API_KEYが設定されていません。.envファイルを確認してください。")
+
+def _load_ddragon_version():
+    """保存済みのバージョンを読み込む（初回のみ）"""
+    global _ddragon_version, _ddragon_fetched_at
+    if _ddragon_version is not None:
+        return
     try:
-        response = requests.get('https://ddragon.leagueoflegends.com/api/versions.json')
-        versions = response.json()
-        return versions[0]
-    except:
-        return '14.1.1'  # フォールバックバージョン
+        with open(DDRAGON_VERSION_PATH) as f:
+            data = json.load(f)
+        _ddragon_version = data['version']
+        _ddragon_fetched_at = data['fetched_at']
+    except (OSError, ValueError, KeyError):
+        pass
+
+def _save_ddragon_version():
+    directory = os.path.dirname(DDRAGON_VERSION_PATH)
+    try:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(DDRAGON_VERSION_PATH, 'w') as f:
+            json.dump({'version': _ddragon_version, 'fetched_at': _ddragon_fetched_at}, f)
+    except OSError as e:
+        logger.warning("DDragonバージョンの保存に失敗しました", extra={'error': repr(e)})
+
+async def refresh_ddragon_version() -> str:
+    """最新のDDragonバージョンを取得して保存（失敗した場合は現在の値を使い続ける）"""
+    global _ddragon_version, _ddragon_fetched_at, _ddragon_lock
+    if _ddragon_lock is None:
+        _ddragon_lock = asyncio.Lock()
+    async with _ddragon_lock:
+        try:
+            async with _get_session(DDRAGON_BASE_URL).get('/api/versions.json') as response:
+                if response.status == 200:
+                    versions = await response.json()
+                    _ddragon_version = versions[0]
+                    _ddragon_fetched_at = time.time()
+                    _save_ddragon_version()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, IndexError) as e:
+            logger.warning("DDragonバージョンの取得に失敗しました", extra={'error': repr(e)})
+    return current_ddragon_version()
+
+async def get_ddragon_version() -> str:
+    """DDragonバージョンを取得（保存済みの値が古い場合のみ問い合わせる）"""
+    _load_ddragon_version()
+    if _ddragon_version is None or time.time() - _ddragon_fetched_at > DDRAGON_REFRESH_INTERVAL:
+        return await refresh_ddragon_version()
+    return _ddragon_version
+
+def current_ddragon_version() -> str:
+    """問い合わせを行わずに、現在把握しているバージョンを返す"""
+    _load_ddragon_version()
+    return _ddragon_version or DDRAGON_FALLBACK_VERSION
+
+def start_ddragon_refresh() -> asyncio.Task:
+    """DDragonバージョンを定期的に更新するバックグラウンドタスクを開始"""
+    global _ddragon_refresh_task
+    if _ddragon_refresh_task is None or _ddragon_refresh_task.done():
+        _ddragon_refresh_task = asyncio.create_task(_ddragon_refresh_loop())
+    return _ddragon_refresh_task
+
+def stop_ddragon_refresh():
+    global _ddragon_refresh_task
+    if _ddragon_refresh_task is not None:
+        _ddragon_refresh_task.cancel()
+        _ddragon_refresh_task = None
+
+async def _ddragon_refresh_loop():
+    while True:
+        await get_ddragon_version()
+        remaining = _ddragon_fetched_at + DDRAGON_REFRESH_INTERVAL - time.time()
+        # 取得に失敗している間は短い間隔で再試行
+        await asyncio.sleep(remaining if remaining > 0 else 300)
+
+def _get_session(base_url: str) -> aiohttp.ClientSession:
+    """ホストごとのkeep-aliveセッションを取得（なければ作成）"""
+    session = _sessions.get(base_url)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS_PER_HOST, ttl_dns_cache=300)
+        session = aiohttp.ClientSession(
+            base_url=base_url,
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            # APIキーはRiot APIにのみ送る
+            headers={"X-Riot-Token": API_KEY} if base_url != DDRAGON_BASE_URL else None
+        )
+        _sessions[base_url] = session
+    return session
+
+def _get_limit(base_url: str) -> asyncio.Semaphore:
+    """ホストごとの同時実行数セマフォを取得"""
+    limit = _limits.get(base_url)
+    if limit is None:
+        limit = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        _limits[base_url] = limit
+    return limit
 
-DDRAGON_VERSION = get_latest_version()
+def init_sessions():
+    """キャッシュの保存先を開く（Cogの読み込み時に呼び出す。開いていれば何もしない）"""
+    if CACHE_DB_PATH and cache.backend is None:
+        cache.backend = SQLiteBackend(CACHE_DB_PATH)
 
-def get_summoner_by_riot_id(game_name: str, tag_line: str) -> Optional[Dict]:
+async def close_sessions():
+    """共有セッションをすべて閉じ、キャッシュの未反映の書き込みを反映して保存先を閉じる（Cogのアンロード時に呼び出す）"""
+    for session in _sessions.values():
+        if not session.closed:
+            await session.close()
+    _sessions.clear()
+    _limits.clear()
+    await cache.close()
+
+@contextlib.contextmanager
+def count_requests():
+    """このブロック内（と、ここから開始したタスク）が送ったリクエスト数を数える
+
+    with count_requests() as counter: ... の後、counter[0] がリクエスト数になる。
+    """
+    counter = [0]
+    token = _request_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _request_counter.reset(token)
+
+async def _get_json(region: str, method: str, path: str) -> Optional[Any]:
+    """GETリクエストを送信し、200ならJSON、404などならNoneを返す
+
+    429と5xxはRetry-Afterまたは指数バックオフで再試行し、
+    それでも取得できない場合はRiotAPIErrorを送出する。
+    """
+    base_url = _BASE_URLS[region]
+    throttled = False
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with QUEUE_WAIT_SECONDS.time(method=method):
+                await rate_limiter.acquire(region, method)
+        except RateLimitExceeded as e:
+            raise RiotRateLimitError(str(e)) from e
+        counter = _request_counter.get()
+        if counter is not None:
+            counter[0] += 1
+
+        async with _get_limit(base_url):
+            started = time.perf_counter()
+            status = 'error'
+            try:
+                async with _get_session(base_url).get(path) as response:
+                    status = response.status
+                    rate_limiter.update_from_headers(region, method, response.headers)
+                    if response.status == 200:
+                        return await response.json()
+                    if response.status == 429:
+                        throttled = True
+                        THROTTLED.inc(method=method)
+                        retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                        rate_limiter.penalize(
+                            region, method,
+                            retry_after if retry_after is not None else _backoff(attempt),
+                            response.headers.get('X-Rate-Limit-Type')
+                        )
+                        continue
+                    if response.status in (401, 403):
+                        raise RiotAPIError(f"{method} へのアクセスが拒否されました（{response.status}）。APIキーを確認してください")
+                    if response.status < 500:
+                        return None
+                    logger.warning("Riot APIサーバーエラー", extra={'method': method, 'status': response.status, 'attempt': attempt})
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Riot APIリクエストエラー", extra={'method': method, 'error': repr(e), 'attempt': attempt})
+            finally:
+                REQUEST_SECONDS.observe(time.perf_counter() - started, method=method, status=status)
+
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(_backoff(attempt))
+
+    if throttled:
+        raise RiotRateLimitError(f"{method} がレート制限により取得できませんでした")
+    raise RiotAPIError(f"{method} の取得に失敗しました")
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def _backoff(attempt: int) -> float:
+    """指数バックオフ（ジッター付き）"""
+    return min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """レート制限の待ち行列の長さと待機時間を取得"""
+    return rate_limiter.stats()
+
+def get_cache_stats() -> Dict[str, Any]:
+    """キャッシュのヒット・ミス数を取得"""
+    return cache.stats()
+
+async def _cached_get(namespace: str, key: str, region: str, method: str, path: str) -> Optional[Any]:
+    """キャッシュを確認し、なければAPIから取得して保存（404もNoneとして短時間保存）"""
+    cache_key = f"{namespace}:{key}"
+    value = cache.get(cache_key)
+    if value is not MISSING:
+        CACHE_LOOKUPS.inc(namespace=namespace, result='hit')
+        return value
+
+    task = _inflight.get(cache_key)
+    if task is None:
+        task = asyncio.create_task(_fetch_and_store(cache_key, namespace, region, method, path))
+        _inflight[cache_key] = task
+        task.add_done_callback(lambda t: _finish_inflight(cache_key, t))
+        _coalesce_stats['requests'] += 1
+        CACHE_LOOKUPS.inc(namespace=namespace, result='miss')
+    else:
+        _coalesce_stats['coalesced'] += 1
+        CACHE_LOOKUPS.inc(namespace=namespace, result='coalesced')
+    # 呼び出し元がキャンセルされても共有の取得処理は止めない
+    return await asyncio.shield(task)
+
+async def _fetch_and_store(cache_key: str, namespace: str, region: str, method: str, path: str) -> Optional[Any]:
+    value = await _get_json(region, method, path)
+    cache.set(cache_key, value, CACHE_TTLS[namespace] if value is not None else NEGATIVE_CACHE_TTL)
+    return value
+
+def _finish_inflight(cache_key: str, task: asyncio.Task):
+    if _inflight.get(cache_key) is task:
+        del _inflight[cache_key]
+    if not task.cancelled():
+        task.exception()  # 待機者がいなくなった場合の未取得例外の警告を防ぐ
+
+def get_coalesce_stats() -> Dict[str, int]:
+    """同時に発生した同一リクエストをまとめた回数（coalescedが節約できたAPI呼び出し数）"""
+    return dict(_coalesce_stats, inflight=len(_inflight))
+
+async def get_summoner_by_riot_id(game_name: str, tag_line: str) -> Optional[Dict]:
     """RiotIDからサモナー情報を取得"""
-    url = f"{RIOT_API_BASE_URL}/riot/account/v1/accounts/by-riot-id/{game_name}/{tag_line}"
-    response = requests.get(url, headers={"X-Riot-Token": API_KEY})
-    if response.status_code == 200:
-        return response.json()
-    return None
+    path = f"/riot/account/v1/accounts/by-riot-id/{quote(game_name, safe='')}/{quote(tag_line, safe='')}"
+    # RiotIDは大文字小文字を区別しない
+    key = f"{game_name.lower()}#{tag_line.lower()}"
+    account = await _cached_get('account', key, REGION, 'account-v1.by-riot-id', path)
+    if account:
+        # 募集作成フローではPUUIDから引き直すため、同じ結果をPUUIDでも保存しておく
+        cache.set(f"account:puuid:{account['puuid']}", account, CACHE_TTLS['account'])
+    return account
+
+async def get_account_by_puuid(puuid: str) -> Optional[Dict]:
+    """PUUIDからRiotアカウント（gameName, tagLine）を取得"""
+    path = f"/riot/account/v1/accounts/by-puuid/{puuid}"
+    return await _cached_get('account', f"puuid:{puuid}", REGION, 'account-v1.by-puuid', path)
 
-def get_summoner_by_puuid(puuid: str) -> Optional[Dict]:
+async def get_summoner_by_puuid(puuid: str) -> Optional[Dict]:
     """PUUIDからサモナー情報を取得"""
-    url = f"{RIOT_API_JP_URL}/lol/summoner/v4/summoners/by-puuid/{puuid}"
-    response = requests.get(url, headers={"X-Riot-Token": API_KEY})
-    if response.status_code == 200:
-        return response.json()
-    return None
+    path = f"/lol/summoner/v4/summoners/by-puuid/{puuid}"
+    return await _cached_get('summoner', puuid, GAME_REGION, 'summoner-v4.by-puuid', path)
 
-def get_league_info(summoner_id: str) -> Optional[List[Dict]]:
+async def get_league_info(summoner_id: str) -> Optional[List[Dict]]:
     """サモナーIDからランク情報を取得"""
-    url = f"{RIOT_API_JP_URL}/lol/league/v4/entries/by-summoner/{summoner_id}"
-    response = requests.get(url, headers={"X-Riot-Token": API_KEY})
-    if response.status_code == 200:
-        return response.json()
-    return None
+    path = f"/lol/league/v4/entries/by-summoner/{summoner_id}"
+    return await _cached_get('league', summoner_id, GAME_REGION, 'league-v4.entries', path)
 
-def get_tft_league_info(summoner_id: str) -> Optional[List[Dict]]:
+async def get_tft_league_info(summoner_id: str) -> Optional[List[Dict]]:
     """サモナーIDからTFTのランク情報を取得"""
-    url = f"{RIOT_API_JP_URL}/tft/league/v1/entries/by-summoner/{summoner_id}"
-    response = requests.get(url, headers={"X-Riot-Token": API_KEY})
-    if response.status_code == 200:
-        return response.json()
-    return None
-
-def get_profile_icon_url(icon_id: int) -> str:
-    """プロフィールアイコンのURLを取得"""
-    return f"https://ddragon.leagueoflegends.com/cdn/{DDRAGON_VERSION}/img/profileicon/{icon_id}.png" 
+    path = f"/tft/league/v1/entries/by-summoner/{summoner_id}"
+    return await _cached_get('tft-league', summoner_id, GAME_REGION, 'tft-league-v1.entries', path)
+
+async def get_rank_entry(puuid: str, game_mode: str) -> Optional[Dict]:
+    """ゲームモードに必要なキューのランク情報だけを取得（TFTならTFT、それ以外はソロランク）"""
+    summoner_info = await get_summoner_by_puuid(puuid)
+    if not summoner_info:
+        return None
+    if game_mode == 'tft':
+        entries = await get_tft_league_info(summoner_info['id']) or []
+        return next((q for q in entries if q.get('queueType') == 'RANKED_TFT'), entries[0] if entries else None)
+    entries = await get_league_info(summoner_info['id']) or []
+    return next((q for q in entries if q.get('queueType') == 'RANKED_SOLO_5x5'), None)
+
+async def iter_rank_entries(puuids: Iterable[str], game_mode: str, concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Tuple[str, Optional[Dict]]]:
+    """複数人のランク情報を並行して取得し、取得できた順に (PUUID, ランク情報) を返す
+
+    送信はレート制限の順番待ちを通るため、同時取得数だけを制限する。
+    取得に失敗したPUUIDは返さない（未ランクの場合はNoneを返す）。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(puuid: str):
+        async with semaphore:
+            try:
+                return puuid, await get_rank_entry(puuid, game_mode)
+            except RiotAPIError as e:
+                logger.warning("ランク情報の取得に失敗しました", extra={'puuid': puuid, 'error': str(e)})
+                return None
+
+    tasks = [asyncio.create_task(fetch(puuid)) for puuid in dict.fromkeys(puuids)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            if result is not None:
+                yield result
+    finally:
+        # 途中で打ち切られた場合は残りの取得を止める
+        for task in tasks:
+            task.cancel()
+
+async def get_rank_entries(puuids: Iterable[str], game_mode: str) -> Dict[str, Optional[Dict]]:
+    """複数人のランク情報をまとめて取得（PUUID: ランク情報）"""
+    return {puuid: entry async for puuid, entry in iter_rank_entries(puuids, game_mode)}
@@ -0,0 +1,58 @@
+import time
+from collections import deque
+from typing import Optional, Dict, Set, Deque
+
+
+def shard_id_for(guild_id: int, shard_count: int) -> int:
+    """サーバーIDから担当シャードを求める（Discordの割り当て規則）"""
+    return (guild_id >> 22) % shard_count
+
+
+def local_shard_ids(bot) -> Optional[Set[int]]:
+    """このプロセスが担当するシャードID（シャード分割していなければNone）"""
+    if not bot.shard_count or bot.shard_count <= 1:
+        return None
+    shard_ids = getattr(bot, 'shard_ids', None)
+    if shard_ids is None and bot.shard_id is not None:
+        shard_ids = [bot.shard_id]
+    return set(shard_ids) if shard_ids is not None else None
+
+
+def guild_shard_id(bot, guild_id: int) -> int:
+    if not bot.shard_count or bot.shard_count <= 1:
+        return 0
+    return shard_id_for(guild_id, bot.shard_count)
+
+
+def owns_guild(bot, guild_id: int) -> bool:
+    """このプロセスが担当するサーバーか（複数プロセスでシャードを分けている場合に使う）"""
+    shard_ids = local_shard_ids(bot)
+    return shard_ids is None or guild_shard_id(bot, guild_id) in shard_ids
+
+
+class ShardEventCounter:
+    """シャードごとのイベント数を直近window秒分だけ記録する"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._events: Dict[int, Deque[float]] = {}
+        self.totals: Dict[int, int] = {}
+
+    def record(self, shard_id: int):
+        now = time.monotonic()
+        events = self._events.setdefault(shard_id, deque())
+        events.append(now)
+        self.totals[shard_id] = self.totals.get(shard_id, 0) + 1
+        self._trim(events, now)
+
+    def _trim(self, events: Deque[float], now: float):
+        while events and now - events[0] > self.window:
+            events.popleft()
+
+    def rate(self, shard_id: int) -> float:
+        """直近window秒の1分あたりのイベント数"""
+        events = self._events.get(shard_id)
+        if not events:
+            return 0.0
+        self._trim(events, time.monotonic())
+        return len(events) * 60.0 / self.window
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+from typing import Optional, Dict, List, Tuple
+
+from utils.batch_writer import BatchWriter
+from utils.registry import Recruitment
+
+_COLUMNS = Recruitment.__slots__
+
+
+class RecruitmentStore:
+    """募集状態と募集開始パネルをSQLiteに保存し、再起動後に復元できるようにする
+
+    書き込みはメモリ上にまとめておき、一定間隔でまとめて別スレッドから反映する。
+    同じ募集への複数回の更新は最後の状態だけが書き込まれる。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 2.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS recruitments ("
+            "owner_id INTEGER PRIMARY KEY, guild_id INTEGER, vc_id INTEGER, channel_id INTEGER, message_id INTEGER, "
+            "game_mode TEXT, team_size INTEGER, size_label TEXT, role TEXT, rank TEXT, title TEXT, "
+            "created_at REAL, last_active REAL, filled_at REAL)"
+        )
+        # filled_at列の追加前に作成したデータベース
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(recruitments)")}
+        if 'filled_at' not in columns:
+            self.conn.execute("ALTER TABLE recruitments ADD COLUMN filled_at REAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS panels (channel_id INTEGER PRIMARY KEY, message_id INTEGER NOT NULL)")
+        self.conn.commit()
+        self._lock = threading.Lock()
+        self._pending_recruitments: Dict[int, Optional[Tuple]] = {}  # 作成者ID: 行（Noneなら削除）
+        self._pending_panels: Dict[int, Optional[int]] = {}  # チャンネルID: メッセージID（Noneなら削除）
+        self._batch = BatchWriter(self._take_pending, self._write, flush_interval)
+
+    # --- 読み込み（起動時に1回だけ呼ぶ） ---
+
+    def load_recruitments(self) -> List[Recruitment]:
+        with self._lock:
+            rows = self.conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM recruitments").fetchall()
+        return [Recruitment(**dict(zip(_COLUMNS, row))) for row in rows]
+
+    def load_panels(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self.conn.execute("SELECT channel_id, message_id FROM panels").fetchall())
+
+    # --- 書き込み（まとめて反映） ---
+
+    def save(self, recruitment: Recruitment):
+        self._pending_recruitments[recruitment.owner_id] = tuple(getattr(recruitment, c) for c in _COLUMNS)
+        self._batch.schedule()
+
+    def delete(self, recruitment: Recruitment):
+        self._pending_recruitments[recruitment.owner_id] = None
+        self._batch.schedule()
+
+    def save_panel(self, channel_id: int, message_id: Optional[int]):
+        self._pending_panels[channel_id] = message_id
+        self._batch.schedule()
+
+    def _take_pending(self):
+        recruitments, panels = self._pending_recruitments, self._pending_panels
+        self._pending_recruitments, self._pending_panels = {}, {}
+        return recruitments, panels
+
+    async def flush(self):
+        """溜まっている更新を別スレッドでまとめて書き込む"""
+        await self._batch.flush()
+
+    def _write(self, recruitments: Dict[int, Optional[Tuple]], panels: Dict[int, Optional[int]]):
+        if not recruitments and not panels:
+            return
+        placeholders = ', '.join('?' for _ in _COLUMNS)
+        with self._lock, self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO recruitments ({', '.join(_COLUMNS)}) VALUES ({placeholders})",
+                [row for row in recruitments.values() if row is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM recruitments WHERE owner_id = ?",
+                [(owner_id,) for owner_id, row in recruitments.items() if row is None]
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO panels (channel_id, message_id) VALUES (?, ?)",
+                [(channel_id, message_id) for channel_id, message_id in panels.items() if message_id is not None]
+            )
+            self.conn.executemany(
+                "DELETE FROM panels WHERE channel_id = ?",
+                [(channel_id,) for channel_id, message_id in panels.items() if message_id is None]
+            )
+
+    async def close(self):
+        """未反映の更新を書き込んでから閉じる"""
+        await self._batch.close()
+        self.conn.close()
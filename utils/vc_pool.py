@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import deque
+from typing import Optional, Dict, List, Deque, Iterable, Set
+
+import discord
+
+from utils.write_queue import WriteQueue
+
+logger = logging.getLogger(__name__)
+
+IDLE_VC_NAME = "待機中"
+# Botが作成した募集用VCの名前（"[RANKED] 〇〇のDuo" など）
+RECRUITMENT_VC_NAME = re.compile(r"^\[(RANKED|NORMAL|TFT)\] ")
+
+
+def is_pool_vc_name(name: str) -> bool:
+    """Botが待機用または募集用に作成したVCの名前か（使い終わったVCは募集時の名前のまま待機する）"""
+    return name == IDLE_VC_NAME or RECRUITMENT_VC_NAME.match(name) is not None
+
+
+class VoiceChannelPool:
+    """募集用VCをあらかじめ作成しておき、募集作成時に名前を変えて使い回す
+
+    待機中のVCは@everyoneから非表示にしておく。使い終わったVCは削除せず非表示に戻す。
+    待機数は直近の募集ペースから決め、不足すれば作成し、余れば削除する。
+    DiscordのチャンネルはVC名の変更が10分に2回までのため、名前の変更は使う時だけ行い、
+    変更回数が上限に達しているVCは使わない。
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 5,
+        horizon: float = 300.0,
+        rename_limit: int = 2,
+        rename_window: float = 600.0,
+        writes: Optional[WriteQueue] = None
+    ):
+        self.min_size = min_size
+        self.max_size = max_size  # 0なら無効（常に作成・削除する）
+        self.horizon = horizon  # この秒数の間に使われる見込みの数だけ待機させる
+        self.rename_limit = rename_limit
+        self.rename_window = rename_window
+        self.writes = writes  # 指定すると補充・削除を応答より後回しにする
+        self._idle: Dict[int, List[discord.VoiceChannel]] = {}  # サーバーID: 待機中のVC
+        self._claims: Dict[int, Deque[float]] = {}  # サーバーID: 直近の使用時刻
+        self._renames: Dict[int, Deque[float]] = {}  # VC ID: 名前を変更した時刻
+        self.claiming: Set[int] = set()  # 待機中から取り出し、公開の処理中のVC ID（整合処理の対象外）
+        self._rebalancing: Dict[int, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def idle_count(self, guild_id: int) -> int:
+        return len(self._idle.get(guild_id, ()))
+
+    def is_idle(self, channel_id: int) -> bool:
+        return any(vc.id == channel_id for idle in self._idle.values() for vc in idle)
+
+    def target_size(self, guild_id: int) -> int:
+        """直近のペース（horizon秒あたりの募集数）に合わせた待機数"""
+        claims = self._claims.get(guild_id)
+        now = time.monotonic()
+        window = self.horizon * 2  # ペースは2倍の期間で平均する
+        while claims and now - claims[0] > window:
+            claims.popleft()
+        expected = math.ceil(len(claims) * self.horizon / window) if claims else 0
+        return max(self.min_size, min(self.max_size, expected))
+
+    @staticmethod
+    def hidden_overwrites(guild: discord.Guild) -> Dict:
+        return {
+            guild.default_role: discord.PermissionOverwrite(view_channel=False),
+            guild.me: discord.PermissionOverwrite(view_channel=True, manage_channels=True)
+        }
+
+    def _can_rename(self, channel_id: int, now: float) -> bool:
+        renames = self._renames.get(channel_id)
+        while renames and now - renames[0] > self.rename_window:
+            renames.popleft()
+        return not renames or len(renames) < self.rename_limit
+
+    async def claim(self, guild: discord.Guild, category, name: str, user_limit: Optional[int]) -> Optional[discord.VoiceChannel]:
+        """待機中のVCを募集用に公開して返す（使えるVCがなければNone）"""
+        if not self.enabled:
+            return None
+        self._claims.setdefault(guild.id, deque()).append(time.monotonic())
+        idle = self._idle.get(guild.id, [])
+        now = time.monotonic()
+        vc = None
+        for index, candidate in enumerate(idle):
+            # カテゴリの設定が変わった場合や、管理者が待機中のVCに入っている場合は使わない
+            if candidate.category_id == category.id and not candidate.members and self._can_rename(candidate.id, now):
+                vc = idle.pop(index)
+                break
+        if vc is not None:
+            channel = vc
+            self.claiming.add(channel.id)
+            try:
+                await channel.edit(name=name, user_limit=user_limit or 0, sync_permissions=True)
+                self._renames.setdefault(channel.id, deque()).append(now)
+            except discord.NotFound:
+                self._renames.pop(channel.id, None)
+                vc = None
+            except discord.HTTPException as e:
+                # 失敗した変更は反映されないため、非表示のまま待機に戻す
+                logger.warning("待機中のVCを使えませんでした", extra={'vc_id': channel.id, 'error': str(e)})
+                idle.append(channel)
+                vc = None
+            finally:
+                self.claiming.discard(channel.id)
+        if vc is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self.rebalance(guild, category)
+        return vc
+
+    async def release(self, vc: discord.VoiceChannel) -> bool:
+        """使い終わったVCを非表示にして待機に戻す（待機数が上限の場合や誰かが入っている場合はFalse）
+
+        目標より多く戻った分は次に使われた時の調整で削除する。
+        """
+        if not self.enabled or vc.category_id is None:
+            return False
+        guild = vc.guild
+        if self.idle_count(guild.id) >= self.max_size or vc.members:
+            return False
+        await vc.edit(overwrites=self.hidden_overwrites(guild))
+        self._idle.setdefault(guild.id, []).append(vc)
+        return True
+
+    def discard(self, channel_id: int):
+        """削除されたVCを待機中の一覧から外す"""
+        self._renames.pop(channel_id, None)
+        for idle in self._idle.values():
+            for index, vc in enumerate(idle):
+                if vc.id == channel_id:
+                    del idle[index]
+                    return
+
+    def adopt(self, category, exclude: Iterable[int] = ()):
+        """再起動前に作成した待機中（非表示）のVCを取り込む
+
+        カテゴリ内の運営用などの非表示VCを使い回さないよう、Botが作成した名前のVCだけを対象にする。
+        """
+        if not self.enabled:
+            return
+        excluded = set(exclude)
+        guild = category.guild
+        known = {vc.id for vc in self._idle.get(guild.id, ())}
+        for vc in category.voice_channels:
+            if vc.id in excluded or vc.id in known or vc.members or not is_pool_vc_name(vc.name):
+                continue
+            overwrite = vc.overwrites_for(guild.default_role)
+            if overwrite.view_channel is False:
+                self._idle.setdefault(guild.id, []).append(vc)
+
+    def rebalance(self, guild: discord.Guild, category):
+        """待機数を目標に合わせる処理をバックグラウンドで開始"""
+        if not self.enabled or category is None:
+            return
+        task = self._rebalancing.get(guild.id)
+        if task is None or task.done():
+            self._rebalancing[guild.id] = asyncio.create_task(self._rebalance(guild, category))
+
+    async def _rebalance(self, guild: discord.Guild, category):
+        idle = self._idle.setdefault(guild.id, [])
+        try:
+            while len(idle) < self.target_size(guild.id):
+                # 補充は募集作成を速くするためのものなので、応答中でも後回しにしない
+                vc = await self._write('vc_create', lambda: guild.create_voice_channel(
+                    name=IDLE_VC_NAME,
+                    category=category,
+                    overwrites=self.hidden_overwrites(guild)
+                ), bucket=guild.id, defer=False)
+                idle.append(vc)
+            while len(idle) > self.target_size(guild.id):
+                vc = idle.pop(0)
+                try:
+                    if not await self._write('vc_delete', lambda: self._delete_idle(vc), bucket=vc.id):
+                        idle.append(vc)
+                        break
+                except discord.NotFound:
+                    pass
+        except discord.HTTPException as e:
+            logger.warning("待機中のVCを調整できませんでした", extra={'guild_id': guild.id, 'error': str(e)})
+
+    async def _delete_idle(self, vc: discord.VoiceChannel) -> bool:
+        """余った待機中のVCを削除（実行待ちの間に誰かが入っていれば削除せずFalse）"""
+        if vc.members:
+            return False
+        await vc.delete()
+        self._renames.pop(vc.id, None)
+        return True
+
+    async def _write(self, route: str, job, bucket, defer: bool = True):
+        if self.writes is None:
+            return await job()
+        return await self.writes.submit(route, job, defer=defer, bucket=bucket)
+
+    def stop(self):
+        for task in self._rebalancing.values():
+            task.cancel()
+        self._rebalancing.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'idle': sum(len(idle) for idle in self._idle.values()),
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import random
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+import discord
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+WRITES = metrics.counter('discord_background_writes_total', 'バックグラウンドのDiscord書き込みの結果', ['route', 'result'])
+
+
+class _Write:
+    __slots__ = ('job', 'future', 'defer')
+
+    def __init__(self, job: Callable[[], Awaitable[Any]], future: asyncio.Future, defer: bool):
+        self.job = job
+        self.future = future
+        self.defer = defer
+
+
+def _consume_exception(future: asyncio.Future):
+    # 結果を待たない依頼の失敗で未取得例外の警告を出さない（失敗はWriteQueueがログに出す）
+    if not future.cancelled():
+        future.exception()
+
+
+class WriteQueue:
+    """Discord REST APIへのバックグラウンドの書き込み（VCの削除・メッセージの編集など）を順番に実行する
+
+    インタラクションへの最初の応答（defer・モーダル表示など）の間（foreground）はバックグラウンドの
+    書き込みを始めず、最大max_defer秒待つ（応答に必要な準備の書き込みはdefer=Falseで依頼して待たせない）。
+    書き込みはルート（'message_edit' などの種類）とバケット（チャンネルIDなど、Discordのレート制限の単位）の
+    組ごとに1件ずつ、全体でconcurrency件まで同時に実行する。
+    同じキーの書き込みが実行前に再度依頼された場合は、最後に依頼された内容だけを実行する。
+    失敗した書き込みは指数バックオフで再試行する（404・403は再試行しない）。待機中は同時実行数の枠を空ける。
+    """
+
+    def __init__(self, concurrency: int = 2, max_retries: int = 3, backoff: float = 1.0, max_defer: float = 1.0):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_defer = max_defer
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._pending: Dict[Tuple[str, Hashable], OrderedDict] = {}  # (ルート, バケット): {キー: _Write}（依頼順）
+        self._workers: Dict[Tuple[str, Hashable], asyncio.Task] = {}
+        self._routes: Set[str] = set()  # 依頼されたことのあるルート（実行待ちの数の集計用）
+        self._foreground = 0
+        self._foreground_done = asyncio.Event()
+        self._foreground_done.set()
+        self.coalesced = 0
+
+    def submit(
+        self,
+        route: str,
+        job: Callable[[], Awaitable[Any]],
+        key: Optional[Hashable] = None,
+        defer: bool = True,
+        bucket: Hashable = None
+    ) -> asyncio.Future:
+        """書き込みを依頼し、結果を受け取るFutureを返す（待たなくてもよい）
+
+        bucketには書き込み先のチャンネルIDなどを渡す。バケットが違う書き込みは互いを待たない。
+        """
+        self._routes.add(route)
+        queue = (route, bucket)
+        pending = self._pending.setdefault(queue, OrderedDict())
+        if key is not None and key in pending:
+            write = pending[key]
+            write.job = job
+            self.coalesced += 1
+            WRITES.inc(route=route, result='coalesced')
+            return write.future
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        pending[key if key is not None else object()] = _Write(job, future, defer)
+        worker = self._workers.get(queue)
+        if worker is None or worker.done():
+            self._workers[queue] = asyncio.create_task(self._drain(queue))
+        return future
+
+    @contextmanager
+    def foreground(self):
+        """インタラクションへの最初の応答中であることを示す（この間はバックグラウンドの書き込みを始めない）
+
+        Riot APIの取得やフォローアップまで含めると書き込みが止まり続けるため、応答の呼び出しだけを囲む。
+        """
+        self._foreground += 1
+        self._foreground_done.clear()
+        try:
+            yield
+        finally:
+            self._foreground -= 1
+            if self._foreground == 0:
+                self._foreground_done.set()
+
+    async def _drain(self, queue: Tuple[str, Hashable]):
+        route = queue[0]
+        pending = self._pending[queue]
+        try:
+            while pending:
+                if self._foreground and next(iter(pending.values())).defer:
+                    try:
+                        await asyncio.wait_for(self._foreground_done.wait(), timeout=self.max_defer)
+                    except asyncio.TimeoutError:
+                        pass  # 応答が続いても後回しにし続けない
+                    if not pending:
+                        break
+                _, write = pending.popitem(last=False)
+                if write.future.done():
+                    continue
+                await self._execute(route, write)
+        finally:
+            # 空になったバケットは捨てる（チャンネルごとのバケットが溜まらないように）
+            if not pending and self._pending.get(queue) is pending:
+                del self._pending[queue]
+                self._workers.pop(queue, None)
+
+    async def _execute(self, route: str, write: _Write):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    result = await write.job()
+            except (discord.NotFound, discord.Forbidden) as e:
+                WRITES.inc(route=route, result='error')
+                self._settle(write, exception=e)
+                return
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    WRITES.inc(route=route, result='error')
+                    logger.warning("Discordへの書き込みに失敗しました", extra={'route': route, 'error': repr(e)})
+                    self._settle(write, exception=e)
+                    return
+                WRITES.inc(route=route, result='retry')
+                await asyncio.sleep(self.backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+            else:
+                WRITES.inc(route=route, result='ok')
+                self._settle(write, result=result)
+                return
+
+    @staticmethod
+    def _settle(write: _Write, result: Any = None, exception: Optional[BaseException] = None):
+        # 依頼元が待つのをやめて（キャンセルされて）いても、書き込み自体は実行済み
+        if write.future.done():
+            return
+        if exception is not None:
+            write.future.set_exception(exception)
+        else:
+            write.future.set_result(result)
+
+    def backlog(self) -> Dict[str, int]:
+        """ルートごとの実行待ちの書き込み数（バケットは合計する）"""
+        counts = {route: 0 for route in self._routes}
+        for (route, _), pending in self._pending.items():
+            counts[route] += len(pending)
+        return counts
+
+    async def flush(self, timeout: float = 10.0):
+        """実行待ちの書き込みが終わるまで待つ（応答中でも後回しにしない）"""
+        self.max_defer = 0.0
+        self._foreground_done.set()
+        workers = [worker for worker in self._workers.values() if not worker.done()]
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backlog': sum(len(pending) for pending in self._pending.values()),
+            'coalesced': self.coalesced
+        }